@@ -1,17 +1,129 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Min, QuerySet
+from django.utils import timezone
+from django.utils.functional import cached_property
+
 from .models import Usuario, Departamento, Sensor, Evento, ComandoRemoto
 
+
+# 0. Utilidades para listados de tablas grandes (eventos_acceso con millones de filas)
+def filas_estimadas(modelo, using='default'):
+    """Filas de la tabla según las estadísticas del motor (sin recorrerla). None si no hay."""
+    conexion = connections[using]
+    tabla = modelo._meta.db_table
+    with conexion.cursor() as cursor:
+        if conexion.vendor == 'mysql':
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", [tabla],
+            )
+        elif conexion.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [tabla])
+        else:
+            # SQLite no guarda estadísticas: con PK autoincremental el rango es una buena cota
+            rango = modelo._default_manager.using(using).aggregate(primero=Min('pk'), ultimo=Max('pk'))
+            if rango['primero'] is None:
+                return None
+            return rango['ultimo'] - rango['primero'] + 1
+        fila = cursor.fetchone()
+    return int(fila[0]) if fila and fila[0] is not None else None
+
+
+class ConteoEstimadoPaginator(Paginator):
+    """
+    El COUNT(*) de la lista se corta en ADMIN_CONTEO_MAX filas (cuenta sobre un
+    subquery con LIMIT). Hasta ahí el total es exacto. Más allá, sin filtros se
+    muestra la estimación del motor, y con filtros se muestra el tope.
+    Así el costo no crece con la tabla.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        tope = getattr(settings, 'ADMIN_CONTEO_MAX', 10_000)
+        cantidad = queryset.order_by()[:tope + 1].count()
+        if cantidad <= tope:
+            return cantidad
+        if not queryset.query.where:
+            estimado = filas_estimadas(queryset.model, queryset.db)
+            if estimado is not None:
+                return max(estimado, cantidad)
+        return tope
+
+
+class FechasPorIndiceQuerySet(QuerySet):
+    """
+    datetimes() para el date_hierarchy del admin: en vez de un DISTINCT sobre
+    toda la tabla, prueba cada año/mes/día del rango con un exists(), que es
+    una búsqueda en el índice (fecha_hora, id). Son como máximo 31 consultas cortas.
+    """
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        if kind not in ('year', 'month', 'day'):
+            return super().datetimes(field_name, kind, order, tzinfo)
+        rango = self.aggregate(primero=Min(field_name), ultimo=Max(field_name))
+        if rango['primero'] is None:
+            return []
+        actual = _truncar(timezone.localtime(rango['primero']), kind)
+        ultimo = timezone.localtime(rango['ultimo'])
+        periodos = []
+        while actual <= ultimo:
+            siguiente = _siguiente(actual, kind)
+            if self.filter(**{f'{field_name}__gte': actual, f'{field_name}__lt': siguiente}).exists():
+                periodos.append(actual)
+            actual = siguiente
+        return periodos[::-1] if order == 'DESC' else periodos
+
+
+def _truncar(fecha, kind):
+    return timezone.make_aware(datetime(
+        fecha.year,
+        fecha.month if kind != 'year' else 1,
+        fecha.day if kind == 'day' else 1,
+    ))
+
+
+def _siguiente(fecha, kind):
+    fecha = timezone.localtime(fecha)
+    if kind == 'year':
+        return timezone.make_aware(datetime(fecha.year + 1, 1, 1))
+    if kind == 'month':
+        return timezone.make_aware(datetime(fecha.year + fecha.month // 12, fecha.month % 12 + 1, 1))
+    return timezone.make_aware(datetime.combine(fecha.date() + timedelta(days=1), time.min))
+
+
+class TablaGrandeAdmin(admin.ModelAdmin):
+    """Listado que no recorre la tabla: conteo acotado y sin el segundo COUNT(*) del total."""
+    paginator = ConteoEstimadoPaginator
+    show_full_result_count = False
+    # Los "facets" hacen un COUNT por cada opción de cada filtro
+    show_facets = admin.ShowFacets.NEVER
+
+
 # 1. Configuración avanzada para USUARIOS
 # Heredamos de UserAdmin para mantener la gestión de contraseñas segura
 class CustomUserAdmin(UserAdmin):
     model = Usuario
+    paginator = ConteoEstimadoPaginator
+    show_full_result_count = False
     
     # Columnas que se ven en la lista
     list_display = ('username', 'email', 'rol', 'estado', 'rut', 'departamento')
+    # El departamento viene en el mismo SELECT (no una query por fila)
+    list_select_related = ('departamento',)
     
     # Filtros a la derecha
     list_filter = ('rol', 'estado', 'is_staff')
+    # Buscador (lo usan también los autocompletar de Sensor y Evento)
+    search_fields = ('username', 'rut', 'email', 'nombres', 'apellidos')
+    # Buscador en vez de un <select> con todos los departamentos
+    autocomplete_fields = ('departamento',)
     
     # Campos para agregar al formulario de edición (para ver RUT, Rol, etc.)
     fieldsets = UserAdmin.fieldsets + (
@@ -26,21 +138,34 @@ class DepartamentoAdmin(admin.ModelAdmin):
     search_fields = ('numero', 'torre')
 
 # 3. Configuración para SENSORES
-class SensorAdmin(admin.ModelAdmin):
+class SensorAdmin(TablaGrandeAdmin):
     list_display = ('codigo_sensor', 'tipo', 'estado', 'usuario', 'fecha_alta')
+    list_select_related = ('usuario',)
     list_filter = ('estado', 'tipo')
     search_fields = ('codigo_sensor',)
+    autocomplete_fields = ('usuario', 'departamento')
 
 # 4. Configuración para EVENTOS
-class EventoAdmin(admin.ModelAdmin):
+class EventoAdmin(TablaGrandeAdmin):
     list_display = ('fecha_hora', 'tipo_evento', 'resultado', 'sensor', 'usuario')
+    list_select_related = ('sensor', 'usuario')
     list_filter = ('tipo_evento', 'resultado')
+    # Navegación año > mes > día sobre el índice (fecha_hora, id), ver FechasPorIndiceQuerySet
+    date_hierarchy = 'fecha_hora'
+    autocomplete_fields = ('sensor', 'usuario', 'departamento')
     readonly_fields = ('fecha_hora',) # Para que nadie falsee la fecha
 
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return FechasPorIndiceQuerySet(
+            model=queryset.model, query=queryset.query.chain(), using=queryset._db, hints=queryset._hints,
+        )
+
 # 5. Configuración para COMANDOS
 class ComandoRemotoAdmin(admin.ModelAdmin):
-    list_display = ('comando', 'dispositivo_id', 'fecha_actualizacion')
-    readonly_fields = ('fecha_actualizacion',)
+    list_display = ('comando', 'dispositivo_id', 'estado', 'fecha_creacion', 'fecha_actualizacion')
+    list_filter = ('estado', 'comando')
+    readonly_fields = ('fecha_creacion', 'fecha_reclamo', 'fecha_confirmacion', 'fecha_actualizacion')
 
 # --- REGISTRO DE MODELOS ---
 admin.site.register(Usuario, CustomUserAdmin)
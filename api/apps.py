@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Conectamos las señales (invalidación de cachés en memoria)
+        from . import signals  # noqa: F401
+
+        # Conteo de queries por petición (api/metricas.py)
+        from django.db.backends.signals import connection_created
+        from .metricas import instalar_en_conexion
+        connection_created.connect(instalar_en_conexion, dispatch_uid='api_metricas_bd')
+
+        # Conexiones abiertas por este proceso, para GET /api/ready/ (api/salud.py)
+        from .salud import registrar_conexion
+        connection_created.connect(registrar_conexion, dispatch_uid='api_salud_bd')
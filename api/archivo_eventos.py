@@ -0,0 +1,337 @@
+import gzip
+import hashlib
+import heapq
+import json
+import os
+import threading
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.db import router, transaction
+from django.utils import timezone
+
+from .exportacion import COLUMNAS, iterar_eventos
+from .importacion import en_trozos
+from .models import Evento
+
+CAMPOS = [columna for columna, _ in COLUMNAS]
+I_ID, I_FECHA = CAMPOS.index('id'), CAMPOS.index('fecha_hora')
+# Filtros del historial (api/filtros.py) que se pueden evaluar sobre una fila archivada
+FILTROS_IGUALDAD = {campo: CAMPOS.index(campo) for campo in (
+    'tipo_evento', 'resultado', 'sensor_id', 'usuario_id', 'departamento_id',
+)}
+
+
+# Filas por miembro gzip de un segmento (cada miembro se puede leer por separado)
+FILAS_POR_BLOQUE = 1000
+
+
+def _clave(fila):
+    return fila[I_FECHA], fila[I_ID]
+
+
+# ==============================================================================
+# ARCHIVO DE EVENTOS ANTIGUOS (segmentos NDJSON.gz por día + índice)
+# ==============================================================================
+class ArchivoEventos:
+    """
+    Los Evento más antiguos que EVENTOS_RETENCION_DIAS salen de eventos_acceso a
+    archivos inmutables, uno por día (hora local):
+
+        <EVENTOS_ARCHIVO_DIR>/2025/03/eventos-2025-03-01.ndjson.gz
+        <EVENTOS_ARCHIVO_DIR>/indice.json
+
+    - Cada segmento tiene las columnas de la exportación (COLUMNAS), ordenado de
+      más nuevo a más antiguo, igual que el historial. Nunca se reescribe: si
+      llegan eventos atrasados de un día ya archivado, van a un segmento nuevo
+      (eventos-2025-03-01.2.ndjson.gz).
+    - indice.json lista los segmentos (rango, filas, sha256) para leer sólo los
+      días que pide una consulta.
+    - Cada segmento son varios miembros gzip de FILAS_POR_BLOQUE filas (sigue
+      siendo un .gz normal). Al lado, <segmento>.bloques guarda dónde empieza
+      cada miembro y su primera fila: una página profunda del historial salta
+      directo al bloque que le toca en vez de descomprimir el día desde arriba.
+    - Orden seguro ante caídas: se escribe el segmento, se publica en el índice y
+      recién entonces se borran las filas de la BD. Si algo se corta entre medio
+      hay filas en los dos lados; la lectura las une sin duplicar (mezclar()) y la
+      siguiente ejecución termina el borrado.
+    - El borrado no pasa por las señales: no deja lápidas para la app
+      (api/sincronizacion.py) ni resta de ResumenEventos, así las estadísticas
+      siguen contando los eventos archivados.
+
+    Con varios servidores, EVENTOS_ARCHIVO_DIR debe ser un volumen compartido.
+    """
+    nombre_indice = 'indice.json'
+
+    def __init__(self, directorio=None):
+        self._directorio = directorio
+        self._lock = threading.Lock()
+        self._indice = None
+        self._marca_indice = None
+
+    @property
+    def directorio(self):
+        return Path(self._directorio or settings.EVENTOS_ARCHIVO_DIR)
+
+    # --- Índice ---
+    def segmentos(self):
+        """Segmentos publicados, del día más nuevo al más antiguo (fechas ya parseadas)."""
+        ruta = self.directorio / self.nombre_indice
+        try:
+            marca = ruta.stat().st_mtime_ns
+        except FileNotFoundError:
+            return []
+        with self._lock:
+            if marca != self._marca_indice:
+                with open(ruta, encoding='utf-8') as archivo:
+                    segmentos = json.load(archivo)['segmentos']
+                for segmento in segmentos:
+                    for campo in ('inicio', 'fin', 'fecha_min', 'fecha_max'):
+                        segmento[campo] = datetime.fromisoformat(segmento[campo])
+                segmentos.sort(key=lambda s: (s['inicio'], s['archivo']), reverse=True)
+                self._indice, self._marca_indice = segmentos, marca
+            return self._indice
+
+    def fecha_maxima(self):
+        """fecha_hora del evento archivado más nuevo (None si no hay archivo)."""
+        segmentos = self.segmentos()
+        return max(s['fecha_max'] for s in segmentos) if segmentos else None
+
+    def archivado_hasta(self):
+        """Fin del último día archivado (antes de eso, la BD ya no tiene el historial completo)."""
+        segmentos = self.segmentos()
+        return max(s['fin'] for s in segmentos) if segmentos else None
+
+    def _guardar_indice(self, segmentos):
+        datos = {'segmentos': [
+            {campo: (valor.isoformat() if isinstance(valor, datetime) else valor) for campo, valor in s.items()}
+            for s in sorted(segmentos, key=lambda s: (s['inicio'], s['archivo']))
+        ]}
+        _escribir_atomico(self.directorio / self.nombre_indice, json.dumps(datos, indent=1).encode('utf-8'))
+
+    # --- Escritura (comando archivar_eventos) ---
+    def archivar(self, dias=None, tamano_lote=2000, simular=False):
+        """
+        Mueve al archivo los días completos anteriores a hoy - `dias` (hora local).
+        Devuelve [{'dia', 'archivo', 'filas'}] (con simular=True sólo cuenta).
+        """
+        dias = dias if dias is not None else settings.EVENTOS_RETENCION_DIAS
+        hoy = timezone.localdate()
+        corte = timezone.make_aware(datetime.combine(hoy - timedelta(days=dias), time.min))
+
+        if not simular:
+            self._completar_borrados()
+        reporte = []
+        pendientes = Evento.objects.filter(fecha_hora__lt=corte)
+        while True:
+            mas_antiguo = pendientes.order_by('fecha_hora', 'id').values_list('fecha_hora', flat=True).first()
+            if mas_antiguo is None:
+                return reporte
+            dia = timezone.localtime(mas_antiguo).date()
+            inicio = timezone.make_aware(datetime.combine(dia, time.min))
+            fin = min(timezone.make_aware(datetime.combine(dia + timedelta(days=1), time.min)), corte)
+            eventos_dia = Evento.objects.filter(fecha_hora__gte=inicio, fecha_hora__lt=fin)
+            if simular:
+                reporte.append({'dia': dia.isoformat(), 'archivo': None, 'filas': eventos_dia.count()})
+            else:
+                reporte.append(self._archivar_dia(dia, inicio, fin, eventos_dia, tamano_lote))
+            pendientes = pendientes.filter(fecha_hora__gte=fin)
+
+    def _archivar_dia(self, dia, inicio, fin, eventos_dia, tamano_lote):
+        segmentos = list(self.segmentos())
+        previos = sum(1 for s in segmentos if s['dia'] == dia.isoformat())
+        sufijo = f'.{previos + 1}' if previos else ''
+        relativo = f'{dia:%Y}/{dia:%m}/eventos-{dia.isoformat()}{sufijo}.ndjson.gz'
+        ruta = self.directorio / relativo
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+
+        ids, fecha_min, fecha_max = [], None, None
+        bloques = []   # [posición en bytes, fecha_hora, id] de la primera fila de cada miembro
+        resumen = hashlib.sha256()
+        temporal = ruta.with_name(ruta.name + '.tmp')
+        with open(temporal, 'wb') as crudo:
+            archivo = None
+            for fila in iterar_eventos(eventos_dia, tamano_lote):
+                fila = list(fila)
+                fila[I_FECHA] = fila[I_FECHA].astimezone(dt_timezone.utc).isoformat()
+                if len(ids) % FILAS_POR_BLOQUE == 0:
+                    if archivo is not None:
+                        archivo.close()
+                    bloques.append([crudo.tell(), fila[I_FECHA], fila[I_ID]])
+                    archivo = gzip.GzipFile(fileobj=crudo, mode='wb', mtime=0)
+                linea = json.dumps(dict(zip(CAMPOS, fila)), ensure_ascii=False).encode('utf-8') + b'\n'
+                archivo.write(linea)
+                resumen.update(linea)
+                ids.append(fila[I_ID])
+                fecha_max = fecha_max or fila[I_FECHA]
+                fecha_min = fila[I_FECHA]
+            if archivo is not None:
+                archivo.close()
+            crudo.flush()
+            os.fsync(crudo.fileno())
+        if not ids:
+            # Otro proceso ya archivó o borró ese día
+            temporal.unlink()
+            return {'dia': dia.isoformat(), 'archivo': None, 'filas': 0}
+        _escribir_atomico(_ruta_bloques(ruta), json.dumps(bloques).encode('utf-8'))
+        os.replace(temporal, ruta)
+
+        segmentos.append({
+            'dia': dia.isoformat(),
+            'archivo': relativo,
+            'inicio': inicio,
+            'fin': fin,
+            'fecha_min': datetime.fromisoformat(fecha_min),
+            'fecha_max': datetime.fromisoformat(fecha_max),
+            'id_min': min(ids),
+            'id_max': max(ids),
+            'filas': len(ids),
+            'sha256': resumen.hexdigest(),
+            'borrado': False,
+        })
+        self._guardar_indice(segmentos)
+        self._borrar(segmentos[-1], ids)
+        return {'dia': dia.isoformat(), 'archivo': relativo, 'filas': len(ids)}
+
+    def _borrar(self, segmento, ids):
+        bd = router.db_for_write(Evento)
+        with transaction.atomic(using=bd):
+            for trozo in en_trozos(ids):
+                # _raw_delete: un DELETE ... WHERE id IN (...) sin cargar filas ni
+                # disparar post_delete (sin lápidas ni ajuste de resúmenes)
+                Evento.objects.filter(id__in=trozo)._raw_delete(bd)
+        segmentos = list(self.segmentos())
+        for otro in segmentos:
+            if otro['archivo'] == segmento['archivo']:
+                otro['borrado'] = True
+        self._guardar_indice(segmentos)
+
+    def _completar_borrados(self):
+        """Termina el borrado de segmentos publicados por una ejecución que se cortó."""
+        for segmento in self.segmentos():
+            if not segmento['borrado']:
+                ids = [fila[I_ID] for fila in _leer_segmento(self.directorio / segmento['archivo'])]
+                self._borrar(segmento, ids)
+
+    # --- Lectura (historial y exportación) ---
+    def iterar(self, filtros, posicion=None):
+        """
+        Filas archivadas (tuplas en el orden de COLUMNAS) que cumplen `filtros`
+        (los de leer_filtros_eventos), de la más nueva a la más antigua y, si se
+        da `posicion` = (fecha_hora, id), sólo las anteriores a esa posición.
+        Sólo se abren los segmentos de los días que cruzan el rango pedido.
+        """
+        desde = filtros.get('fecha_hora__gte')
+        hasta = filtros.get('fecha_hora__lt')
+        iguales = [(FILTROS_IGUALDAD[campo], valor) for campo, valor in filtros.items() if campo in FILTROS_IGUALDAD]
+
+        # Las filas con fecha_hora >= hasta también se pueden saltar por bloque
+        inicio = posicion
+        if hasta is not None and (inicio is None or (hasta, 0) < inicio):
+            inicio = (hasta, 0)
+
+        por_dia = {}
+        for segmento in self.segmentos():
+            if desde is not None and segmento['fecha_max'] < desde:
+                continue
+            if hasta is not None and segmento['fecha_min'] >= hasta:
+                continue
+            if posicion is not None and (segmento['fecha_min'], segmento['id_min']) >= posicion:
+                continue
+            por_dia.setdefault(segmento['dia'], []).append(segmento)
+
+        for dia in sorted(por_dia, reverse=True):
+            filas = heapq.merge(
+                *(_leer_segmento(self.directorio / s['archivo'], inicio) for s in por_dia[dia]),
+                key=_clave, reverse=True,
+            )
+            for fila in filas:
+                if posicion is not None and _clave(fila) >= posicion:
+                    continue
+                fecha = fila[I_FECHA]
+                if hasta is not None and fecha >= hasta:
+                    continue
+                if desde is not None and fecha < desde:
+                    break
+                if all(fila[i] == valor for i, valor in iguales):
+                    yield fila
+
+
+def mezclar(*flujos, clave=_clave):
+    """
+    Une flujos ya ordenados de más nuevo a más antiguo (BD y archivo). Una fila
+    que está en los dos (archivado a medias) sale una sola vez.
+    """
+    anterior = None
+    for fila in heapq.merge(*flujos, key=clave, reverse=True):
+        actual = clave(fila)
+        if actual == anterior:
+            continue
+        anterior = actual
+        yield fila
+
+
+def a_evento(fila):
+    """Fila archivada -> Evento sin guardar (para el serializer del historial)."""
+    datos = dict(zip(CAMPOS, fila))
+    return Evento(
+        id=datos['id'],
+        fecha_hora=datos['fecha_hora'],
+        tipo_evento=datos['tipo_evento'],
+        resultado=datos['resultado'],
+        sensor_id=datos['sensor_id'],
+        usuario_id=datos['usuario_id'],
+        departamento_id=datos['departamento_id'],
+        id_externo=datos['id_externo'],
+    )
+
+
+def _leer_segmento(ruta, desde=None):
+    """
+    Filas de un segmento, de la más nueva a la más antigua, leídas a medida que
+    se piden (nunca el día completo en memoria). Con `desde` = (fecha_hora, id)
+    empieza en el bloque que puede tener filas anteriores a esa posición; las
+    filas previas de ese bloque las descarta quien llama.
+    """
+    posicion = 0
+    if desde is not None:
+        for inicio, fecha, pk in _bloques(str(ruta)):
+            if (fecha, pk) < desde:
+                break
+            posicion = inicio
+    with open(ruta, 'rb') as crudo:
+        crudo.seek(posicion)
+        # Desde el inicio de un miembro gzip se lee hasta el final del archivo
+        with gzip.open(crudo, 'rt', encoding='utf-8') as archivo:
+            for linea in archivo:
+                datos = json.loads(linea)
+                datos['fecha_hora'] = datetime.fromisoformat(datos['fecha_hora'])
+                yield tuple(datos[campo] for campo in CAMPOS)
+
+
+def _ruta_bloques(ruta):
+    return ruta.with_name(ruta.name + '.bloques')
+
+
+@lru_cache(maxsize=512)
+def _bloques(ruta):
+    # Los segmentos son inmutables: su tabla de bloques (unas decenas de filas) se puede guardar
+    try:
+        with open(_ruta_bloques(Path(ruta)), encoding='utf-8') as archivo:
+            return [(inicio, datetime.fromisoformat(fecha), pk) for inicio, fecha, pk in json.load(archivo)]
+    except FileNotFoundError:
+        return []   # Segmento de un solo miembro: se lee desde el principio
+
+
+def _escribir_atomico(ruta, contenido):
+    temporal = ruta.with_name(ruta.name + '.tmp')
+    with open(temporal, 'wb') as archivo:
+        archivo.write(contenido)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, ruta)
+
+
+archivo_eventos = ArchivoEventos()
@@ -0,0 +1,98 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import cache_usuarios
+
+
+# ==============================================================================
+# AUTENTICACIÓN JWT SIN QUERY POR PETICIÓN (DRF)
+# ==============================================================================
+class TokenConRolSerializer(TokenObtainPairSerializer):
+    """Agrega rol y estado al token (POST /api/token/) para el modo 'claims'."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['rol'] = user.rol
+        token['estado'] = user.estado
+        return token
+
+
+class JWTAuthenticationCacheada(JWTAuthentication):
+    """
+    Igual que JWTAuthentication, pero sin el SELECT del usuario en cada petición.
+
+    Modo 'cache' (por defecto, API_AUTH_MODO): el Usuario se resuelve desde
+    cache_usuarios (TTL corto, invalidado por las señales de Usuario). Solo la
+    primera petición de cada usuario, o después de un cambio, va a la BD.
+
+    Modo 'claims': si el token trae 'rol' y 'estado' (ver TokenConRolSerializer)
+    no se consulta nada; request.user es un TokenUser con esos datos. Un cambio
+    de rol o estado recién se nota al renovar el token (ACCESS_TOKEN_LIFETIME).
+    """
+
+    def get_user(self, validated_token):
+        usuario = self.usuario_sin_bd(validated_token)
+        if usuario is None:
+            # Validación completa (existe, is_active, revocación por cambio de
+            # contraseña) como la hace simplejwt, y guardamos el resultado
+            usuario = super().get_user(validated_token)
+            cache_usuarios.guardar(usuario)
+        return usuario
+
+    def usuario_sin_bd(self, validated_token):
+        """El usuario desde los claims o el cache, o None si hay que ir a la BD."""
+        modo = getattr(settings, 'API_AUTH_MODO', 'cache')
+        if modo == 'claims' and 'rol' in validated_token and 'estado' in validated_token:
+            if api_settings.USER_ID_CLAIM not in validated_token:
+                raise InvalidToken(_("Token contained no recognizable user identification"))
+            if validated_token['estado'] != 'activo':
+                raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+            return TokenUser(validated_token)
+
+        try:
+            usuario_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        usuario = cache_usuarios.obtener(usuario_id)
+        if usuario is None or api_settings.CHECK_REVOKE_TOKEN:
+            return None
+        if api_settings.CHECK_USER_IS_ACTIVE and not usuario.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return usuario
+
+
+# ==============================================================================
+# AUTENTICACIÓN PARA VISTAS ASYNC (mismas reglas que DRF)
+# ==============================================================================
+_jwt_cacheada = JWTAuthenticationCacheada()
+
+
+async def ausuario_autenticado(request):
+    """
+    Lo mismo que hace JWTAuthenticationCacheada en DRF, para vistas async:
+    valida el token sin BD y resuelve el usuario desde los claims o el cache.
+    Sólo si no está en cache va a la BD (en un hilo). Devuelve el usuario o None.
+    """
+    encabezado = _jwt_cacheada.get_header(request)
+    if encabezado is None:
+        return None
+    token = _jwt_cacheada.get_raw_token(encabezado)
+    if token is None:
+        return None
+    try:
+        validado = _jwt_cacheada.get_validated_token(token)
+        usuario = _jwt_cacheada.usuario_sin_bd(validado)
+        if usuario is None:
+            usuario = await sync_to_async(_jwt_cacheada.get_user)(validado)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    return usuario
@@ -0,0 +1,373 @@
+import http.client
+import json
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .metricas import metricas_rutas
+from .models import Usuario, Departamento, Sensor, Evento, ComandoRemoto
+from .resumenes import recalcular_resumenes
+
+# Credenciales del usuario que siembra sembrar_datos y usa el benchmark
+USUARIO_BENCH = 'bench_admin'
+PASSWORD_BENCH = 'bench-clave-1234'
+PREFIJO_SENSOR = 'BENCH'
+PREFIJO_DISPOSITIVO = 'BENCH-BARRERA-'
+
+
+# ==============================================================================
+# 1. SEMBRADO DE DATOS (python manage.py sembrar_datos)
+# ==============================================================================
+def sembrar(departamentos, usuarios, sensores, eventos, comandos, dispositivos=10,
+            dias=90, semilla=1, tamano_lote=5000, informar=None):
+    """
+    Llena la BD con volúmenes realistas y reproducibles (misma semilla = mismos datos).
+    Todo se inserta con bulk_create; los resúmenes por hora se recalculan al final.
+    Todos los residentes comparten la contraseña PASSWORD_BENCH (se hashea una vez).
+    """
+    rng = random.Random(semilla)
+    informar = informar or (lambda mensaje: None)
+    password = make_password(PASSWORD_BENCH)
+
+    def insertar(modelo, objetos):
+        for inicio in range(0, len(objetos), tamano_lote):
+            modelo.objects.bulk_create(objetos[inicio:inicio + tamano_lote])
+
+    with transaction.atomic():
+        Usuario.objects.create_user(
+            username=USUARIO_BENCH, email='admin@bench.local', password=PASSWORD_BENCH,
+            nombres='Bench', apellidos='Admin', rol='admin',
+        )
+        insertar(Departamento, [
+            Departamento(numero=f'B{i:05d}', torre=f'T{i % 20 + 1}',
+                         condominio=f'Condominio {i % 5 + 1}', piso=i % 25 + 1)
+            for i in range(departamentos)
+        ])
+        ids_depto = list(Departamento.objects.filter(numero__startswith='B').values_list('id', flat=True))
+        informar(f"Departamentos: {len(ids_depto)}")
+
+        insertar(Usuario, [
+            Usuario(
+                username=f'bench{i:06d}', email=f'bench{i}@bench.local', rut=f'{10_000_000 + i}-B',
+                nombres='Residente', apellidos=f'{i}', password=password,
+                departamento_id=rng.choice(ids_depto),
+                estado='activo' if rng.random() < 0.95 else 'inactivo',
+            )
+            for i in range(usuarios)
+        ])
+        residentes = list(
+            Usuario.objects.filter(rut__endswith='-B').values_list('id', 'departamento_id', 'estado')
+        )
+        informar(f"Usuarios: {len(residentes)}")
+
+        filas_sensor = []
+        for i in range(sensores):
+            estado = 'activo' if rng.random() < 0.92 else rng.choice(('perdido', 'bloqueado', 'inactivo'))
+            if residentes and rng.random() < 0.9:
+                usuario_id, depto_id, _ = rng.choice(residentes)
+            else:
+                usuario_id, depto_id = None, rng.choice(ids_depto)
+            filas_sensor.append(Sensor(
+                codigo_sensor=f'{PREFIJO_SENSOR}{i:07d}', estado=estado, tipo=rng.choice(('llavero', 'tarjeta')),
+                usuario_id=usuario_id, departamento_id=depto_id,
+            ))
+        insertar(Sensor, filas_sensor)
+        estado_usuario = {usuario_id: estado for usuario_id, _, estado in residentes}
+        lista_sensores = [
+            (pk, usuario_id, depto_id, estado == 'activo' and estado_usuario.get(usuario_id, 'activo') == 'activo')
+            for pk, usuario_id, depto_id, estado in Sensor.objects.filter(
+                codigo_sensor__startswith=PREFIJO_SENSOR,
+            ).values_list('id', 'usuario_id', 'departamento_id', 'estado')
+        ]
+        informar(f"Sensores: {len(lista_sensores)}")
+
+        insertar(ComandoRemoto, [
+            ComandoRemoto(dispositivo_id=f'{PREFIJO_DISPOSITIVO}{i % dispositivos}',
+                          comando=rng.choice(('ABRIR', 'CERRAR')))
+            for i in range(comandos)
+        ])
+        informar(f"Comandos pendientes: {comandos}")
+
+    # Eventos en transacciones por lote: millones de filas no deben quedar en una sola
+    ahora = timezone.now()
+    segundos = dias * 86400
+    creados = 0
+    while creados < eventos and lista_sensores:
+        lote = []
+        for _ in range(min(tamano_lote, eventos - creados)):
+            sensor_id, usuario_id, depto_id, permitido = rng.choice(lista_sensores)
+            if rng.random() < 0.03:
+                tipo, resultado = 'APERTURA_MANUAL', 'PERMITIDO'
+            elif permitido:
+                tipo, resultado = 'ACCESO_VALIDO', 'PERMITIDO'
+            else:
+                tipo, resultado = 'ACCESO_RECHAZADO', 'DENEGADO'
+            lote.append(Evento(
+                sensor_id=sensor_id, usuario_id=usuario_id, departamento_id=depto_id,
+                tipo_evento=tipo, resultado=resultado,
+                fecha_hora=ahora - timedelta(seconds=rng.randrange(segundos)),
+            ))
+        with transaction.atomic():
+            Evento.objects.bulk_create(lote)
+        creados += len(lote)
+        if creados % (tamano_lote * 20) == 0 or creados == eventos:
+            informar(f"Eventos: {creados}/{eventos}")
+
+    recalcular_resumenes(ahora - timedelta(days=dias + 1), ahora + timedelta(hours=1))
+    informar("Resúmenes por hora recalculados")
+
+
+# ==============================================================================
+# 2. CLIENTES (en proceso o HTTP contra un servidor corriendo)
+# ==============================================================================
+class ClienteLocal:
+    """Llama a la app en el mismo proceso (django.test.Client): no necesita servidor."""
+
+    def __init__(self):
+        from django.test import Client
+        self.cliente = Client()
+
+    def pedir(self, metodo, ruta, cuerpo=None, headers=None):
+        datos = json.dumps(cuerpo) if cuerpo is not None else ''
+        respuesta = self.cliente.generic(
+            metodo, ruta, data=datos, content_type='application/json', headers=headers or {},
+        )
+        contenido = b''.join(respuesta.streaming_content) if respuesta.streaming else respuesta.content
+        return respuesta.status_code, contenido
+
+    def cerrar(self):
+        # Cada hilo abre su conexión: la cerramos al terminar (salvo dentro de un atomic, p.ej. en tests)
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+class ClienteHTTP:
+    """Una conexión keep-alive por hilo contra --url (runserver, gunicorn, uvicorn...)."""
+
+    def __init__(self, url):
+        partes = urlsplit(url)
+        clase = http.client.HTTPSConnection if partes.scheme == 'https' else http.client.HTTPConnection
+        self.conexion = clase(partes.hostname, partes.port, timeout=30)
+        self.base = partes.path.rstrip('/')
+
+    def pedir(self, metodo, ruta, cuerpo=None, headers=None):
+        headers = dict(headers or {})
+        datos = None
+        if cuerpo is not None:
+            datos = json.dumps(cuerpo).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.conexion.request(metodo, self.base + ruta, body=datos, headers=headers)
+            respuesta = self.conexion.getresponse()
+            return respuesta.status, respuesta.read()
+        except (OSError, http.client.HTTPException):
+            self.conexion.close()   # se reconecta en la próxima petición
+            raise
+
+    def cerrar(self):
+        self.conexion.close()
+
+
+# ==============================================================================
+# 3. ESCENARIOS (caminos que usan la barrera y la app)
+# ==============================================================================
+class Contexto:
+    """Datos que los escenarios eligen al azar (cargados una vez desde la BD)."""
+
+    def __init__(self, token, codigos, dispositivos, filas_lote):
+        self.token = token
+        self.codigos = codigos
+        self.dispositivos = dispositivos
+        self.filas_lote = filas_lote
+
+    @classmethod
+    def cargar(cls, token, filas_lote=20):
+        codigos = list(
+            Sensor.objects.filter(codigo_sensor__startswith=PREFIJO_SENSOR).values_list('codigo_sensor', flat=True)[:50_000]
+        ) or ['SIN-SENSORES']
+        dispositivos = sorted(set(
+            ComandoRemoto.objects.filter(dispositivo_id__startswith=PREFIJO_DISPOSITIVO)
+            .values_list('dispositivo_id', flat=True)[:1000]
+        )) or [f'{PREFIJO_DISPOSITIVO}0']
+        return cls(token, codigos, dispositivos, filas_lote)
+
+
+def _token(rng, ctx):
+    return 'POST', '/api/token/', {'username': USUARIO_BENCH, 'password': PASSWORD_BENCH}
+
+
+def _validar(rng, ctx):
+    # 5% de tags desconocidos, como en la barrera real
+    codigo = rng.choice(ctx.codigos) if rng.random() < 0.95 else f'DESCONOCIDO-{rng.randrange(10**6)}'
+    return 'POST', '/api/dispositivos/validar/', {'codigo_sensor': codigo, 'registrar': False}
+
+
+def _lote(rng, ctx):
+    filas = [
+        {
+            'codigo_sensor': rng.choice(ctx.codigos),
+            'tipo_evento': 'ACCESO_VALIDO',
+            'resultado': 'PERMITIDO',
+            'id_externo': f'bench-{rng.getrandbits(96):024x}',
+        }
+        for _ in range(ctx.filas_lote)
+    ]
+    return 'POST', '/api/eventos/lote/', filas
+
+
+def _listar(rng, ctx):
+    return 'GET', '/api/eventos/?page_size=50', None
+
+
+def _reclamar(rng, ctx):
+    return 'POST', f'/api/dispositivos/{rng.choice(ctx.dispositivos)}/comandos/reclamar/', None
+
+
+# nombre -> (generador de la petición, view_name en /api/metrics/)
+ESCENARIOS = {
+    'token': (_token, 'token_obtain_pair'),
+    'validar': (_validar, 'validar_sensor'),
+    'ingesta': (_lote, 'evento-lote'),
+    'listar_eventos': (_listar, 'evento-list'),
+    'reclamar_comando': (_reclamar, 'reclamar_comando'),
+}
+
+
+# ==============================================================================
+# 4. EJECUCIÓN Y REPORTE
+# ==============================================================================
+def percentil(ordenados, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not ordenados:
+        return None
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return ordenados[indice]
+
+
+_LINEA_METRICA = re.compile(r'^(api_db_queries_total|api_request_duration_seconds_count)\{route="([^"]*)",method="([^"]*)"\} (\S+)$')
+
+
+def leer_prometheus(texto):
+    """{(ruta, metodo): [peticiones, queries]} a partir del texto de /api/metrics/."""
+    resumen = {}
+    for linea in texto.splitlines():
+        coincidencia = _LINEA_METRICA.match(linea)
+        if coincidencia:
+            nombre, ruta, metodo, valor = coincidencia.groups()
+            datos = resumen.setdefault((ruta, metodo), [0, 0])
+            datos[0 if nombre.endswith('_count') else 1] = int(float(valor))
+    return resumen
+
+
+def ejecutar_benchmark(nuevo_cliente, leer_metricas, token, escenarios, peticiones, clientes,
+                       calentamiento=20, semilla=1, filas_lote=20):
+    """
+    Corre cada escenario con `clientes` hilos concurrentes y devuelve el reporte
+    (dict serializable a JSON). `nuevo_cliente()` crea un cliente por hilo;
+    `leer_metricas()` devuelve el resumen de /api/metrics/ para calcular queries por petición.
+    """
+    ctx = Contexto.cargar(token, filas_lote=filas_lote)
+    headers = {'Authorization': f'Bearer {token}'}
+    reporte = {}
+
+    for nombre in escenarios:
+        generar, ruta = ESCENARIOS[nombre]
+        por_cliente = [peticiones // clientes + (1 if i < peticiones % clientes else 0) for i in range(clientes)]
+
+        def trabajar(numero, cantidad, medir=True):
+            rng = random.Random(f'{semilla}-{nombre}-{numero}-{medir}')
+            cliente = nuevo_cliente()
+            latencias, errores = [], 0
+            try:
+                for _ in range(cantidad):
+                    metodo, url, cuerpo = generar(rng, ctx)
+                    inicio = time.perf_counter()
+                    try:
+                        codigo, _ = cliente.pedir(metodo, url, cuerpo, headers)
+                    except Exception:
+                        codigo = None
+                    latencias.append(time.perf_counter() - inicio)
+                    if codigo is None or codigo >= 400:
+                        errores += 1
+            finally:
+                cliente.cerrar()
+            return latencias, errores
+
+        if calentamiento:
+            trabajar(-1, calentamiento, medir=False)
+
+        antes = leer_metricas()
+        inicio = time.perf_counter()
+        if clientes == 1:
+            resultados = [trabajar(0, peticiones)]
+        else:
+            with ThreadPoolExecutor(max_workers=clientes) as pool:
+                resultados = list(pool.map(trabajar, range(clientes), por_cliente))
+        duracion = time.perf_counter() - inicio
+        despues = leer_metricas()
+
+        latencias = sorted(l for resultado in resultados for l in resultado[0])
+        errores = sum(resultado[1] for resultado in resultados)
+        metodo = generar(random.Random(0), ctx)[0]
+        previo = antes.get((ruta, metodo), [0, 0])
+        actual = despues.get((ruta, metodo), [0, 0])
+        atendidas = actual[0] - previo[0]
+
+        reporte[nombre] = {
+            "peticiones": len(latencias),
+            "errores": errores,
+            "clientes": clientes,
+            "duracion_s": round(duracion, 3),
+            "rps": round(len(latencias) / duracion, 2) if duracion else None,
+            "p50_ms": _ms(percentil(latencias, 50)),
+            "p95_ms": _ms(percentil(latencias, 95)),
+            "p99_ms": _ms(percentil(latencias, 99)),
+            "max_ms": _ms(latencias[-1] if latencias else None),
+            "queries_por_peticion": round((actual[1] - previo[1]) / atendidas, 2) if atendidas else None,
+        }
+    return reporte
+
+
+def _ms(segundos):
+    return round(segundos * 1000, 3) if segundos is not None else None
+
+
+def comparar(base, actual, umbral):
+    """
+    Compara dos reportes (mismo formato). Devuelve (lineas, regresiones): una línea
+    por escenario/métrica y la lista de escenarios cuyo p95 empeoró más que `umbral` %.
+    """
+    lineas, regresiones = [], []
+    for nombre, datos in actual['escenarios'].items():
+        previo = base.get('escenarios', {}).get(nombre)
+        if not previo:
+            continue
+        for metrica in ('p50_ms', 'p95_ms', 'p99_ms', 'rps', 'queries_por_peticion'):
+            antes, ahora = previo.get(metrica), datos.get(metrica)
+            if not antes or ahora is None:
+                continue
+            cambio = (ahora - antes) / antes * 100
+            lineas.append(f"{nombre:18} {metrica:22} {antes:>10} -> {ahora:>10} ({cambio:+.1f}%)")
+            if metrica == 'p95_ms' and cambio > umbral:
+                regresiones.append(nombre)
+    return lineas, regresiones
+
+
+def metricas_locales():
+    """Mismo resumen que leer_prometheus, leyendo el registro de este proceso."""
+    return {clave: [cuenta, queries] for clave, (cuenta, queries) in metricas_rutas.resumen().items()}
+
+
+def obtener_token(cliente):
+    codigo, cuerpo = cliente.pedir('POST', '/api/token/', {'username': USUARIO_BENCH, 'password': PASSWORD_BENCH})
+    if codigo != 200:
+        raise RuntimeError(f"No se pudo obtener el token de {USUARIO_BENCH} (HTTP {codigo}). ¿Corriste sembrar_datos?")
+    return json.loads(cuerpo)['access']
+
@@ -0,0 +1,306 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from .ingesta import ingerir_eventos
+
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# BUFFER DE EVENTOS (Write-behind: la barrera no espera el INSERT)
+# ==============================================================================
+class BufferEventos:
+    """
+    Cola acotada en memoria + diario en disco para los Evento del camino crítico.
+
+    - agregar()/agregar_varias() escriben las filas en un diario NDJSON propio
+      del proceso (append-only) y las dejan en la cola en memoria. No tocan la BD.
+    - Un hilo escribe la cola con ingerir_eventos (bulk_create) cuando junta
+      `tamano_lote` filas o pasan `intervalo` segundos.
+    - Cada fila lleva un id_externo (uuid), así reescribir desde el diario nunca
+      duplica: ingerir_eventos descarta los ya guardados.
+    - Si la cola está llena o un flush falla, las filas quedan sólo en el diario
+      ("desbordadas") y se reescriben desde ahí cuando la cola se vacía.
+    - Al arrancar se recuperan los diarios de procesos que ya no existen.
+    - Al cerrar el proceso (atexit) se vacía la cola antes de salir.
+    """
+
+    def __init__(self, directorio=None, capacidad=None, tamano_lote=None, intervalo=None, fsync=None):
+        self.directorio = Path(directorio or settings.EVENTOS_BUFFER_DIR)
+        self.capacidad = capacidad or getattr(settings, 'EVENTOS_BUFFER_CAPACIDAD', 10_000)
+        self.tamano_lote = tamano_lote or getattr(settings, 'EVENTOS_BUFFER_LOTE', 500)
+        self.intervalo = intervalo if intervalo is not None else getattr(settings, 'EVENTOS_BUFFER_INTERVALO', 1.0)
+        self.fsync = fsync if fsync is not None else getattr(settings, 'EVENTOS_BUFFER_FSYNC', False)
+
+        self._cola = deque()                 # (encolado_monotonic, fila)
+        self._condicion = threading.Condition()
+        self._escritura = threading.Lock()    # un solo escritor a la vez (hilo o vaciar())
+        self._hilo = None
+        self._detener = False
+        self._diario = None
+        self._pid = None
+        self._segmento = 0
+        self._desbordadas = 0                # filas sólo en el diario actual
+
+        # --- Métricas (contrapresión) ---
+        self.encolados = 0
+        self.escritos = 0
+        self.duplicados = 0
+        self.desbordados = 0
+        self.errores_flush = 0
+        self.ultimo_flush = None             # timestamp del último flush exitoso
+        self.ultimo_flush_ms = None
+
+    # --- Productor (hilo de la petición) ---
+    def agregar(self, fila):
+        """
+        Encola un evento: `fila` son los datos que devuelve validar_fila_evento
+        (mismos campos que una fila de /api/eventos/lote/).
+        Devuelve el id_externo con el que quedará guardado.
+        """
+        return self.agregar_varias([fila])[0]
+
+    def agregar_varias(self, filas):
+        """
+        Encola varios eventos con una sola escritura (y un solo fsync) del diario.
+        Escribe en disco y toma un lock: desde una vista async hay que llamarlo
+        con sync_to_async. Devuelve los id_externo en el mismo orden.
+        """
+        nuevas = []
+        for fila in filas:
+            fila = dict(fila)
+            # Un "id_externo": null explícito también recibe uno: sin él, reescribir
+            # el diario podría duplicar el evento
+            if not fila.get('id_externo'):
+                fila['id_externo'] = uuid.uuid4().hex
+            fecha = fila.get('fecha_hora') or timezone.now()
+            fila['fecha_hora'] = fecha.isoformat() if isinstance(fecha, datetime) else fecha
+            nuevas.append(fila)
+        if not nuevas:
+            return []
+        lineas = ''.join(json.dumps(fila, separators=(',', ':')) + '\n' for fila in nuevas)
+
+        with self._condicion:
+            self._iniciar()
+            self._diario.write(lineas)
+            self._diario.flush()
+            if self.fsync:
+                os.fsync(self._diario.fileno())
+            self.encolados += len(nuevas)
+            ahora = time.monotonic()
+            for fila in nuevas:
+                if len(self._cola) >= self.capacidad:
+                    # Cola llena: la fila queda sólo en disco y se escribirá desde el diario
+                    self._desbordadas += 1
+                    self.desbordados += 1
+                else:
+                    self._cola.append((ahora, fila))
+            if len(self._cola) >= self.tamano_lote:
+                self._condicion.notify()
+        return [fila['id_externo'] for fila in nuevas]
+
+    def metricas(self):
+        with self._condicion:
+            antiguedad = time.monotonic() - self._cola[0][0] if self._cola else 0.0
+            return {
+                "activo": self._hilo is not None and self._hilo.is_alive(),
+                "en_cola": len(self._cola),
+                "capacidad": self.capacidad,
+                "antiguedad_s": round(antiguedad, 3),
+                "desbordadas_pendientes": self._desbordadas,
+                "segmentos_pendientes": len(self._segmentos()),
+                "encolados": self.encolados,
+                "escritos": self.escritos,
+                "duplicados": self.duplicados,
+                "desbordados": self.desbordados,
+                "errores_flush": self.errores_flush,
+                "ultimo_flush": self.ultimo_flush,
+                "ultimo_flush_ms": self.ultimo_flush_ms,
+            }
+
+    # --- Ciclo de vida ---
+    def _iniciar(self):
+        # Se llama con el lock tomado. Tras un fork el hijo abre su propio diario e hilo.
+        if self._hilo is not None and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._cola.clear()
+        self._desbordadas = 0
+        self._detener = False
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self._diario = open(self._ruta_diario(), 'a', encoding='utf-8')
+        self._hilo = threading.Thread(target=self._ejecutar, name='buffer-eventos', daemon=True)
+        self._hilo.start()
+
+    def detener(self, espera=30):
+        """Vacía la cola y termina el hilo (se registra con atexit)."""
+        with self._condicion:
+            if self._hilo is None or self._pid != os.getpid():
+                return
+            self._detener = True
+            self._condicion.notify()
+            hilo = self._hilo
+        hilo.join(espera)
+        with self._condicion:
+            self._hilo = None
+            if self._diario is not None:
+                vacio = self._diario.tell() == 0 and not self._segmentos()
+                self._diario.close()
+                self._diario = None
+                if vacio:
+                    self._ruta_diario().unlink(missing_ok=True)
+
+    def vaciar(self):
+        """Escribe ya todo lo pendiente (cola y diario). Útil en tests y comandos."""
+        with self._escritura:
+            while self._cola and self._escribir_cola():
+                pass
+            self._reescribir_desbordadas()
+
+    # --- Archivos ---
+    def _ruta_diario(self):
+        return self.directorio / f'eventos-{self._pid}.ndjson'
+
+    def _segmentos(self):
+        # Diarios rotados de este proceso, pendientes de reescribir
+        return sorted(self.directorio.glob(f'eventos-{self._pid}.*.pendiente'))
+
+    def _rotar(self):
+        # Con el lock tomado: el diario actual pasa a ser un segmento pendiente
+        self._diario.close()
+        self._segmento += 1
+        destino = self.directorio / f'eventos-{self._pid}.{self._segmento:06d}.pendiente'
+        os.replace(self._ruta_diario(), destino)
+        self._diario = open(self._ruta_diario(), 'a', encoding='utf-8')
+        self._desbordadas = 0
+
+    def _recuperar_huerfanos(self):
+        """Toma los diarios de procesos muertos (p.ej. un worker que se cayó)."""
+        for ruta in sorted(self.directorio.glob('eventos-*')):
+            try:
+                pid = int(ruta.name.split('.')[0].split('-')[1])
+            except (IndexError, ValueError):
+                continue
+            if pid == self._pid or _proceso_vivo(pid):
+                continue
+            with self._condicion:
+                self._segmento += 1
+                destino = self.directorio / f'eventos-{self._pid}.{self._segmento:06d}.pendiente'
+            try:
+                os.replace(ruta, destino)   # atómico: si otro proceso lo tomó primero, falla
+            except OSError:
+                continue
+
+    # --- Consumidor (hilo de fondo) ---
+    def _ejecutar(self):
+        try:
+            with self._escritura:
+                self._recuperar_huerfanos()
+                self._reescribir_desbordadas()
+            while True:
+                with self._condicion:
+                    if not self._detener and len(self._cola) < self.tamano_lote:
+                        self._condicion.wait(self.intervalo)
+                    detener = self._detener
+                with self._escritura:
+                    ok = self._escribir_cola()
+                    self._reescribir_desbordadas()
+                    if detener:
+                        # Drenado final: todo lo que quedó en memoria antes de salir
+                        while self._cola and self._escribir_cola():
+                            pass
+                        return
+                if not ok:
+                    time.sleep(min(self.intervalo, 1.0))   # BD caída: esperar antes de reintentar
+        finally:
+            connection.close()
+
+    def _escribir_cola(self):
+        """Escribe un lote de la cola. Devuelve False si el flush falló."""
+        with self._condicion:
+            lote = [self._cola.popleft()[1] for _ in range(min(len(self._cola), self.tamano_lote))]
+        if not lote:
+            return True
+        if self._ingerir(lote):
+            return True
+        with self._condicion:
+            # Ya están en el diario: se reintentan desde ahí
+            self._desbordadas += len(lote)
+        return False
+
+    def _reescribir_desbordadas(self):
+        with self._condicion:
+            if self._cola:
+                return
+            if self._desbordadas:
+                self._rotar()
+            elif self._diario is not None and self._diario.tell():
+                # Todo lo del diario ya está en la BD
+                self._diario.truncate(0)
+                self._diario.seek(0)
+        for segmento in self._segmentos():
+            if not self._reescribir_segmento(segmento):
+                return
+
+    def _reescribir_segmento(self, ruta):
+        lote = []
+        with open(ruta, encoding='utf-8') as archivo:
+            for linea in archivo:
+                try:
+                    lote.append(json.loads(linea))
+                except ValueError:
+                    continue   # última línea cortada por una caída
+                if len(lote) >= self.tamano_lote:
+                    if not self._ingerir(lote):
+                        return False
+                    lote = []
+        if lote and not self._ingerir(lote):
+            return False
+        ruta.unlink()
+        return True
+
+    def _ingerir(self, filas):
+        inicio = time.perf_counter()
+        close_old_connections()
+        try:
+            # Los rechazos ya se contaron al encolar (validar_sensor / registrar_eventos)
+            reporte = ingerir_eventos(filas, contar_rechazos=False)
+        except Exception:
+            logger.exception("No se pudo escribir un lote de %s eventos del buffer", len(filas))
+            self.errores_flush += 1
+            connection.close()
+            return False
+        for error in reporte['errores']:
+            logger.warning("Evento descartado del buffer: %s", error)
+        self.escritos += reporte['creados']
+        self.duplicados += reporte['duplicados']
+        self.ultimo_flush = time.time()
+        self.ultimo_flush_ms = round((time.perf_counter() - inicio) * 1000, 2)
+        return True
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Instancia única por proceso (sólo se usa con EVENTOS_BUFFER_ACTIVO)
+buffer_eventos = BufferEventos()
+atexit.register(buffer_eventos.detener)
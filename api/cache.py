@@ -0,0 +1,296 @@
+import copy
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Sensor
+
+
+# ==============================================================================
+# 1. ÍNDICE EN MEMORIA DE SENSORES (Decisión de acceso sin ir a la BD)
+# ==============================================================================
+class EntradaSensor(NamedTuple):
+    """Foto de Sensor -> Usuario -> Departamento necesaria para decidir un acceso."""
+    sensor_id: int
+    codigo_sensor: str
+    estado: str
+    usuario_id: Optional[int]
+    usuario_estado: Optional[str]
+    usuario_activo: Optional[bool]
+    departamento_id: Optional[int]
+    departamento_numero: Optional[str]
+
+
+class IndiceSensores:
+    """
+    Índice por proceso codigo_sensor -> EntradaSensor.
+
+    - La primera consulta de un código va a la BD (una sola query con select_related).
+    - Las siguientes se responden desde memoria.
+    - Las señales post_save/post_delete de Sensor, Usuario y Departamento invalidan
+      las entradas afectadas (ver api/signals.py).
+    - Los códigos que no existen también se guardan (como None) para que un tag
+      desconocido no golpee la BD en cada intento.
+    - El TTL acota cuánto puede durar una entrada si el cambio ocurrió en otro proceso.
+    """
+
+    def __init__(self, ttl=None, max_entradas=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'SENSOR_CACHE_TTL', 60)
+        self.max_entradas = max_entradas or getattr(settings, 'SENSOR_CACHE_MAX', 100_000)
+        self._lock = threading.Lock()
+        self._entradas = {}                        # codigo -> (expira, EntradaSensor | None)
+        self._por_sensor = {}                      # sensor_id -> codigo
+        self._por_usuario = defaultdict(set)       # usuario_id -> {codigos}
+        self._por_departamento = defaultdict(set)  # departamento_id -> {codigos}
+        # Se incrementa en cada invalidación: una carga que empezó antes no se guarda
+        self._generacion = 0
+
+    def obtener(self, codigo):
+        """Devuelve la EntradaSensor del código, o None si no está registrado."""
+        ahora = time.monotonic()
+        with self._lock:
+            guardado = self._entradas.get(codigo)
+            if guardado is not None and guardado[0] > ahora:
+                return guardado[1]
+            generacion = self._generacion
+
+        entrada = self._cargar(codigo)
+
+        with self._lock:
+            if generacion == self._generacion:
+                self._guardar(codigo, entrada, ahora + self.ttl)
+        return entrada
+
+    async def aobtener(self, codigo):
+        """Versión async de obtener(): sólo toca la BD si el código no está en memoria."""
+        ahora = time.monotonic()
+        with self._lock:
+            guardado = self._entradas.get(codigo)
+            if guardado is not None and guardado[0] > ahora:
+                return guardado[1]
+            generacion = self._generacion
+
+        sensor = await self._consulta(codigo).afirst()
+        entrada = self._entrada(sensor)
+
+        with self._lock:
+            if generacion == self._generacion:
+                self._guardar(codigo, entrada, ahora + self.ttl)
+        return entrada
+
+    def _consulta(self, codigo):
+        return Sensor.objects.select_related('usuario', 'departamento').filter(codigo_sensor=codigo)
+
+    def _cargar(self, codigo):
+        return self._entrada(self._consulta(codigo).first())
+
+    def _entrada(self, sensor):
+        if sensor is None:
+            return None
+
+        usuario = sensor.usuario
+        # Si el sensor no tiene depto propio, usamos el del habitante
+        departamento = sensor.departamento
+        if departamento is None and usuario is not None:
+            departamento = usuario.departamento
+
+        return EntradaSensor(
+            sensor_id=sensor.pk,
+            codigo_sensor=sensor.codigo_sensor,
+            estado=sensor.estado,
+            usuario_id=usuario.pk if usuario else None,
+            usuario_estado=usuario.estado if usuario else None,
+            usuario_activo=usuario.is_active if usuario else None,
+            departamento_id=departamento.pk if departamento else None,
+            departamento_numero=departamento.numero if departamento else None,
+        )
+
+    def _guardar(self, codigo, entrada, expira):
+        if len(self._entradas) >= self.max_entradas:
+            self._limpiar()
+        self._quitar(codigo)
+        self._entradas[codigo] = (expira, entrada)
+        if entrada is not None:
+            self._por_sensor[entrada.sensor_id] = codigo
+            if entrada.usuario_id is not None:
+                self._por_usuario[entrada.usuario_id].add(codigo)
+            if entrada.departamento_id is not None:
+                self._por_departamento[entrada.departamento_id].add(codigo)
+
+    def _quitar(self, codigo):
+        guardado = self._entradas.pop(codigo, None)
+        if guardado is None or guardado[1] is None:
+            return
+        entrada = guardado[1]
+        self._por_sensor.pop(entrada.sensor_id, None)
+        if entrada.usuario_id is not None:
+            self._por_usuario[entrada.usuario_id].discard(codigo)
+            if not self._por_usuario[entrada.usuario_id]:
+                del self._por_usuario[entrada.usuario_id]
+        if entrada.departamento_id is not None:
+            self._por_departamento[entrada.departamento_id].discard(codigo)
+            if not self._por_departamento[entrada.departamento_id]:
+                del self._por_departamento[entrada.departamento_id]
+
+    def _limpiar(self):
+        self._entradas.clear()
+        self._por_sensor.clear()
+        self._por_usuario.clear()
+        self._por_departamento.clear()
+
+    # --- Invalidación (llamada desde las señales) ---
+    def invalidar_codigo(self, codigo):
+        with self._lock:
+            self._generacion += 1
+            self._quitar(codigo)
+
+    def invalidar_codigos(self, codigos):
+        with self._lock:
+            self._generacion += 1
+            for codigo in codigos:
+                self._quitar(codigo)
+
+    def invalidar_sensor(self, sensor_id, codigo=None):
+        with self._lock:
+            self._generacion += 1
+            codigo_previo = self._por_sensor.get(sensor_id)
+            if codigo_previo is not None:
+                self._quitar(codigo_previo)
+            if codigo is not None:
+                self._quitar(codigo)
+
+    def invalidar_usuario(self, usuario_id):
+        with self._lock:
+            self._generacion += 1
+            for codigo in list(self._por_usuario.get(usuario_id, ())):
+                self._quitar(codigo)
+
+    def invalidar_departamento(self, departamento_id):
+        with self._lock:
+            self._generacion += 1
+            for codigo in list(self._por_departamento.get(departamento_id, ())):
+                self._quitar(codigo)
+
+    def vaciar(self):
+        with self._lock:
+            self._generacion += 1
+            self._limpiar()
+
+
+def evaluar_acceso(entrada):
+    """
+    Regla de acceso de la barrera.
+    Devuelve (permitido, motivo).
+    """
+    if entrada is None:
+        return False, 'sensor_no_registrado'
+    if entrada.estado != 'activo':
+        return False, f'sensor_{entrada.estado}'
+    if entrada.usuario_id is not None:
+        if entrada.usuario_estado != 'activo' or not entrada.usuario_activo:
+            return False, 'usuario_inactivo'
+    return True, 'ok'
+
+
+# Instancia única por proceso
+indice_sensores = IndiceSensores()
+
+
+# ==============================================================================
+# 2. VERSIONES POR MODELO (ETag / Last-Modified)
+# ==============================================================================
+class VersionesModelos:
+    """
+    Una "versión" por modelo guardada en el cache de Django (CACHES).
+    Cada save/delete de ese modelo la cambia (ver api/signals.py), así un listado
+    puede responder 304 comparando el ETag sin ejecutar la query ni el serializer.
+
+    La versión es un token nuevo en cada cambio (no un contador), así dos
+    incrementos simultáneos nunca dejan el mismo valor. Con varios procesos hay
+    que usar un cache compartido (REDIS_URL); el TTL acota el desfase si no.
+    """
+    prefijo = 'api:version:'
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'ETAG_VERSION_TTL', 300)
+
+    def _clave(self, modelo):
+        return self.prefijo + modelo._meta.label_lower
+
+    def _nueva(self):
+        return (uuid.uuid4().hex[:16], time.time())
+
+    def incrementar(self, modelo):
+        cache.set(self._clave(modelo), self._nueva(), self.ttl)
+
+    def obtener(self, *modelos):
+        """Devuelve [(token, timestamp), ...] en el mismo orden de `modelos`."""
+        claves = [self._clave(modelo) for modelo in modelos]
+        guardadas = cache.get_many(claves)
+        faltantes = {}
+        for clave in claves:
+            if clave not in guardadas:
+                faltantes[clave] = guardadas[clave] = self._nueva()
+        if faltantes:
+            cache.set_many(faltantes, self.ttl)
+        return [guardadas[clave] for clave in claves]
+
+
+versiones = VersionesModelos()
+
+
+# ==============================================================================
+# 3. CACHE DE USUARIOS AUTENTICADOS (JWT)
+# ==============================================================================
+class CacheUsuarios:
+    """
+    usuario_id -> Usuario, por proceso y con TTL corto.
+    Evita el SELECT del usuario en cada petición autenticada con JWT.
+    Las señales de Usuario lo invalidan al instante en este proceso; el TTL
+    cubre los cambios hechos desde otros procesos.
+    """
+
+    def __init__(self, ttl=None, max_entradas=10_000):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'AUTH_USUARIO_CACHE_TTL', 30)
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        # str(usuario_id) -> (expira, usuario): simplejwt guarda el user_id del token como texto
+        self._entradas = {}
+
+    def obtener(self, usuario_id):
+        with self._lock:
+            guardado = self._entradas.get(str(usuario_id))
+        if guardado is None or guardado[0] <= time.monotonic():
+            return None
+        return self._copiar(guardado[1])
+
+    def guardar(self, usuario):
+        with self._lock:
+            if len(self._entradas) >= self.max_entradas:
+                self._entradas.clear()
+            self._entradas[str(usuario.pk)] = (time.monotonic() + self.ttl, self._copiar(usuario))
+
+    def invalidar(self, usuario_id):
+        with self._lock:
+            self._entradas.pop(str(usuario_id), None)
+
+    def vaciar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    @staticmethod
+    def _copiar(usuario):
+        # Cada petición recibe su propia copia (incluido el cache de relaciones),
+        # así nada de lo que haga una vista se filtra a otra petición/hilo.
+        copia = copy.copy(usuario)
+        copia._state = copy.copy(usuario._state)
+        copia._state.fields_cache = {}
+        return copia
+
+
+cache_usuarios = CacheUsuarios()
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ComandoRemoto
+
+
+# ==============================================================================
+# PUB/SUB EN MEMORIA PARA COMANDOS REMOTOS
+# ==============================================================================
+class CanalComandos:
+    """
+    Canal por proceso dispositivo_id -> suscriptores.
+
+    Cada conexión en espera (long-poll o SSE) registra su propia asyncio.Queue.
+    Cuando un admin cambia un ComandoRemoto, la señal post_save publica el nuevo
+    comando y se entrega al instante, sin que el dispositivo haga polling a la BD.
+    publicar() puede llamarse desde cualquier hilo (vistas síncronas, admin).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscriptores = defaultdict(set)  # dispositivo_id -> {(loop, cola)}
+
+    def suscribir(self, dispositivo_id):
+        """Registra una cola en el event loop actual. Devuelve la cola."""
+        cola = asyncio.Queue()
+        item = (asyncio.get_running_loop(), cola)
+        with self._lock:
+            self._suscriptores[dispositivo_id].add(item)
+        return cola
+
+    def desuscribir(self, dispositivo_id, cola):
+        with self._lock:
+            suscriptores = self._suscriptores.get(dispositivo_id)
+            if not suscriptores:
+                return
+            suscriptores.difference_update({item for item in suscriptores if item[1] is cola})
+            if not suscriptores:
+                del self._suscriptores[dispositivo_id]
+
+    def publicar(self, dispositivo_id, mensaje):
+        with self._lock:
+            suscriptores = list(self._suscriptores.get(dispositivo_id, ()))
+        for loop, cola in suscriptores:
+            try:
+                loop.call_soon_threadsafe(cola.put_nowait, mensaje)
+            except RuntimeError:
+                # El loop de esa conexión ya se cerró
+                self.desuscribir(dispositivo_id, cola)
+
+    def conectados(self, dispositivo_id=None):
+        with self._lock:
+            if dispositivo_id is not None:
+                return len(self._suscriptores.get(dispositivo_id, ()))
+            return sum(len(s) for s in self._suscriptores.values())
+
+
+def mensaje_comando(comando):
+    """Representación que recibe el dispositivo."""
+    return {
+        "id": comando.pk,
+        "dispositivo_id": comando.dispositivo_id,
+        "comando": comando.comando,
+        "estado": comando.estado,
+        "fecha_actualizacion": comando.fecha_actualizacion.isoformat(),
+    }
+
+
+# Instancia única por proceso
+canal_comandos = CanalComandos()
+
+
+# ==============================================================================
+# COLA DE COMANDOS: RECLAMAR / CONFIRMAR / COMPACTAR
+# ==============================================================================
+def reclamar_comando(dispositivo_id):
+    """
+    Toma el comando pendiente más antiguo del dispositivo y lo marca 'reclamado'.
+    Dos peticiones simultáneas nunca se llevan el mismo comando.
+
+    El reclamo es un préstamo: si la barrera no lo confirma en
+    COMANDOS_RECLAMO_TIMEOUT segundos (se reinició, perdió la respuesta), el
+    comando vuelve a estar disponible y se entrega de nuevo. La barrera puede
+    recibir un comando dos veces, nunca cero.
+    Devuelve el ComandoRemoto reclamado o None si la cola está vacía.
+    """
+    vencido = timezone.now() - timedelta(seconds=getattr(settings, 'COMANDOS_RECLAMO_TIMEOUT', 60))
+    disponible = Q(estado='pendiente') | Q(estado='reclamado', fecha_reclamo__lt=vencido)
+    pendientes = (
+        ComandoRemoto.objects
+        .filter(disponible, dispositivo_id=dispositivo_id)
+        .order_by('id')
+    )
+
+    if connection.features.has_select_for_update_skip_locked:
+        # MySQL 8 / PostgreSQL: bloqueamos SOLO la fila elegida y saltamos las que
+        # otro worker ya tiene tomadas, así nadie espera a nadie.
+        with transaction.atomic():
+            comando = pendientes.select_for_update(skip_locked=True).first()
+            if comando is None:
+                return None
+            comando.estado = 'reclamado'
+            comando.fecha_reclamo = timezone.now()
+            comando.save(update_fields=['estado', 'fecha_reclamo', 'fecha_actualizacion'])
+            return comando
+
+    # SQLite no tiene SELECT ... FOR UPDATE: usamos un UPDATE condicional
+    # (compare-and-set). Si otro proceso lo tomó primero, probamos con el siguiente.
+    for _ in range(5):
+        pk = pendientes.values_list('pk', flat=True).first()
+        if pk is None:
+            return None
+        ahora = timezone.now()
+        # La misma condición que al elegirlo: tras reclamarlo, fecha_reclamo ya no está vencida
+        tomado = ComandoRemoto.objects.filter(disponible, pk=pk).update(
+            estado='reclamado', fecha_reclamo=ahora, fecha_actualizacion=ahora,
+        )
+        if tomado:
+            return ComandoRemoto.objects.get(pk=pk)
+    return None
+
+
+def confirmar_comando(dispositivo_id, pk):
+    """
+    Marca como 'confirmado' un comando reclamado por el dispositivo.
+    Es idempotente: confirmar dos veces no es error.
+    Devuelve el comando o None si no existe / no es de ese dispositivo / no fue reclamado.
+    """
+    ahora = timezone.now()
+    ComandoRemoto.objects.filter(
+        pk=pk, dispositivo_id=dispositivo_id, estado='reclamado',
+    ).update(estado='confirmado', fecha_confirmacion=ahora, fecha_actualizacion=ahora)
+    return ComandoRemoto.objects.filter(
+        pk=pk, dispositivo_id=dispositivo_id, estado='confirmado',
+    ).first()
+
+
+def compactar_comandos(dias=7):
+    """Borra los comandos confirmados hace más de `dias` días. Devuelve cuántos borró."""
+    limite = timezone.now() - timedelta(days=dias)
+    borrados, _ = ComandoRemoto.objects.filter(
+        estado='confirmado', fecha_confirmacion__lt=limite,
+    ).delete()
+    return borrados
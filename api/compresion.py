@@ -0,0 +1,74 @@
+import gzip
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin brotli solo se ofrece gzip
+    brotli = None
+
+_ACEPTA_GZIP = _lazy_re_compile(r'\bgzip\b')
+_ACEPTA_BR = _lazy_re_compile(r'\bbr\b')
+
+
+# ==============================================================================
+# COMPRESIÓN DE RESPUESTAS (gzip / brotli)
+# ==============================================================================
+class CompresionMiddleware:
+    """
+    Comprime las respuestas JSON con brotli (si está instalado y el cliente manda
+    'Accept-Encoding: br') o gzip. No toca:
+    - respuestas streaming (exportaciones, SSE de comandos): ya manejan su propio
+      formato y comprimirlas rompería el envío incremental;
+    - respuestas que ya traen Content-Encoding o son más chicas que COMPRESION_MINIMO.
+
+    Funciona en WSGI y ASGI (las vistas async de la barrera no pasan por un hilo).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.minimo = getattr(settings, 'COMPRESION_MINIMO', 512)
+        self.nivel_gzip = getattr(settings, 'COMPRESION_NIVEL_GZIP', 6)
+        self.nivel_brotli = getattr(settings, 'COMPRESION_NIVEL_BROTLI', 5)
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        return self.comprimir(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.comprimir(request, await self.get_response(request))
+
+    def comprimir(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if len(response.content) < self.minimo:
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        acepta = request.headers.get('Accept-Encoding', '')
+        if brotli is not None and _ACEPTA_BR.search(acepta):
+            cuerpo, codificacion = brotli.compress(response.content, quality=self.nivel_brotli), 'br'
+        elif _ACEPTA_GZIP.search(acepta):
+            cuerpo, codificacion = gzip.compress(response.content, self.nivel_gzip, mtime=0), 'gzip'
+        else:
+            return response
+        if len(cuerpo) >= len(response.content):
+            return response
+
+        # El ETag deja de ser "fuerte" porque cambian los bytes (igual que GZipMiddleware)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response.content = cuerpo
+        response['Content-Length'] = str(len(cuerpo))
+        response['Content-Encoding'] = codificacion
+        return response
@@ -0,0 +1,127 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.db.models import Count, F, Func, OuterRef, Prefetch, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Departamento, Usuario, Sensor
+
+# Filtros de ?condominio=&torre=&piso=
+FILTROS_DIRECTORIO = ('condominio', 'torre', 'piso')
+
+
+# ==============================================================================
+# 1. CONSULTA (número fijo de queries)
+# ==============================================================================
+def directorio_departamentos(filtros):
+    """
+    Departamentos con sus habitantes y conteos, en 2 queries sin importar cuántos
+    departamentos haya:
+    - departamentos + total_habitantes (COUNT) + sensores_activos (subquery)
+    - habitantes de todos esos departamentos (Prefetch) con sus sensores_activos
+
+    Un sensor cuenta para el departamento si es suyo, o si no tiene departamento
+    y su habitante vive ahí (la misma regla del índice de acceso, api/cache.py).
+    """
+    sensores_activos = (
+        Sensor.objects
+        .filter(estado='activo')
+        .filter(
+            Q(departamento=OuterRef('pk'))
+            | Q(departamento__isnull=True, usuario__departamento=OuterRef('pk'))
+        )
+        .order_by()
+        .annotate(cantidad=Func(F('id'), function='COUNT'))
+        .values('cantidad')
+    )
+    habitantes = (
+        Usuario.objects
+        .only('id', 'username', 'nombres', 'apellidos', 'rut', 'rol', 'estado', 'departamento_id')
+        .annotate(sensores_activos=Count('sensores', filter=Q(sensores__estado='activo')))
+        .order_by('apellidos', 'nombres', 'id')
+    )
+    # Siempre desde la primaria: lo que se calcula aquí queda en cache
+    # (una réplica atrasada dejaría guardada una foto vieja)
+    return (
+        Departamento.objects.using(router.db_for_write(Departamento))
+        .filter(**filtros)
+        .annotate(
+            total_habitantes=Count('habitantes'),
+            sensores_activos=Coalesce(Subquery(sensores_activos), Value(0)),
+        )
+        .prefetch_related(Prefetch('habitantes', queryset=habitantes, to_attr='habitantes_directorio'))
+        .order_by('condominio', 'torre', 'piso', 'numero')
+    )
+
+
+# ==============================================================================
+# 2. CACHE POR CONDOMINIO
+# ==============================================================================
+class CacheDirectorio:
+    """
+    Respuesta del directorio guardada en el cache de Django por (condominio,
+    torre, piso). Cada condominio tiene su versión en la clave: las señales de
+    Departamento, Usuario y Sensor la cambian cuando cambia quién vive dónde o
+    sus sensores (ver api/signals.py), y sólo se recalcula ese condominio.
+    - 'todos': versión de las consultas sin ?condominio= (cambia con cualquiera).
+    - 'masiva': la cambian las cargas masivas (bulk_create no dispara señales)
+      y deja viejas todas las claves.
+    """
+    prefijo = 'api:directorio:'
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+
+    @property
+    def ttl(self):
+        return self._ttl if self._ttl is not None else getattr(settings, 'DIRECTORIO_CACHE_TTL', 300)
+
+    def _clave_version(self, nombre):
+        return f'{self.prefijo}v:{nombre}'
+
+    def obtener(self, filtros, calcular):
+        condominio = filtros.get('condominio')
+        claves = [self._clave_version(':masiva'), self._clave_version(condominio or ':todos')]
+        guardadas = cache.get_many(claves)
+        faltantes = {clave: uuid.uuid4().hex[:12] for clave in claves if clave not in guardadas}
+        if faltantes:
+            cache.set_many(faltantes, None)
+            guardadas.update(faltantes)
+
+        clave = self.prefijo + '|'.join(
+            [guardadas[c] for c in claves] + [str(filtros.get(campo, '')) for campo in FILTROS_DIRECTORIO]
+        )
+        datos = cache.get(clave)
+        if datos is None:
+            datos = calcular()
+            cache.set(clave, datos, self.ttl)
+        return datos
+
+    def invalidar(self, condominios):
+        """Nueva versión para esos condominios (y para el listado sin filtro)."""
+        claves = {self._clave_version(c) for c in condominios if c}
+        if claves:
+            claves.add(self._clave_version(':todos'))
+            cache.set_many({clave: uuid.uuid4().hex[:12] for clave in claves}, None)
+
+    def invalidar_todo(self):
+        """Para cambios sin condominio conocido (cargas masivas)."""
+        cache.set(self._clave_version(':masiva'), uuid.uuid4().hex[:12], None)
+
+    def invalidar_departamentos(self, departamentos=(), usuarios=()):
+        """Invalida los condominios de esos departamentos y de los de esos usuarios (1 query)."""
+        departamentos = {pk for pk in departamentos if pk is not None}
+        usuarios = {pk for pk in usuarios if pk is not None}
+        if not departamentos and not usuarios:
+            return
+        condominios = (
+            Departamento.objects
+            .filter(Q(pk__in=departamentos) | Q(habitantes__pk__in=usuarios))
+            .values_list('condominio', flat=True).distinct()
+        )
+        self.invalidar(set(condominios))
+
+
+cache_directorio = CacheDirectorio()
@@ -0,0 +1,103 @@
+import contextvars
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+# Prefijo de los alias de las réplicas en DATABASES (ver ecoapi/settings.py)
+PREFIJO_REPLICA = 'replica_'
+
+# True mientras una petición de lectura puede ir a una réplica
+_leer_de_replica = contextvars.ContextVar('api_leer_de_replica', default=False)
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias.startswith(PREFIJO_REPLICA)]
+
+
+# ==============================================================================
+# 1. ROUTER (DATABASE_ROUTERS)
+# ==============================================================================
+class EnrutadorReplicas:
+    """
+    Lecturas a una réplica sólo cuando la petición lo permitió (ver
+    ReplicaViewSetMixin); todo lo demás (escrituras, comandos, señales, hilos
+    de fondo, dispositivos) va a 'default'.
+    Dentro de una transacción también se lee de 'default', para ver lo propio.
+    """
+
+    def __init__(self):
+        self.replicas = replicas()
+
+    def db_for_read(self, model, **hints):
+        if not self.replicas or not _leer_de_replica.get():
+            return None
+        if connections['default'].in_atomic_block:
+            return None
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las réplicas tienen los mismos datos que 'default'
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # El esquema llega a las réplicas por la replicación, no por migrate
+        return not db.startswith(PREFIJO_REPLICA)
+
+
+# ==============================================================================
+# 2. PRIMARIA "PEGAJOSA" DESPUÉS DE ESCRIBIR
+# ==============================================================================
+# Tras una escritura, las lecturas de ese usuario van a 'default' durante
+# DB_REPLICA_PEGAJOSO segundos: así ve lo que acaba de guardar aunque la
+# réplica venga atrasada.
+#
+# La marca se guarda en dos lados:
+# - en el cache, por usuario: sólo sirve entre workers si el cache es compartido
+#   (REDIS_URL). Con el LocMemCache por defecto cada proceso tiene el suyo y el
+#   GET siguiente, si cae en otro worker, no ve la marca.
+# - en una cookie de la respuesta (COOKIE_PRIMARIA): la devuelven los clientes
+#   que guardan cookies (navegador, admin) y funciona con cualquier cache.
+COOKIE_PRIMARIA = 'bd_primaria'
+
+
+def _clave(usuario_id):
+    return f'api:bd_primaria:{usuario_id}'
+
+
+def _duracion():
+    return getattr(settings, 'DB_REPLICA_PEGAJOSO', 5)
+
+
+def marcar_escritura(usuario_id):
+    if not replicas():
+        return
+    cache.set(_clave(usuario_id), 1, _duracion())
+
+
+def marcar_cookie(response):
+    """Pone la cookie de primaria en la respuesta de una escritura."""
+    if replicas():
+        response.set_cookie(COOKIE_PRIMARIA, '1', max_age=_duracion(), httponly=True, samesite='Lax')
+
+
+def leer_de_primaria(usuario_id):
+    return cache.get(_clave(usuario_id)) is not None
+
+
+def permitir_replica(usuario_id, cookies=None):
+    """Habilita la réplica para lo que queda de la petición. Devuelve el token del contextvar."""
+    permitido = (
+        bool(replicas())
+        and not (cookies and COOKIE_PRIMARIA in cookies)
+        and not (usuario_id is not None and leer_de_primaria(usuario_id))
+    )
+    return _leer_de_replica.set(permitido)
+
+
+def restaurar(token):
+    _leer_de_replica.reset(token)
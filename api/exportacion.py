@@ -0,0 +1,100 @@
+import csv
+import io
+import json
+import zlib
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+# ==============================================================================
+# EXPORTACIÓN EN STREAMING DE EVENTOS (CSV / NDJSON, opcional gzip)
+# ==============================================================================
+# (columna en la BD, nombre en el archivo)
+COLUMNAS = (
+    ('id', 'id'),
+    ('fecha_hora', 'fecha_hora'),
+    ('tipo_evento', 'tipo_evento'),
+    ('resultado', 'resultado'),
+    ('sensor_id', 'sensor'),
+    ('sensor__codigo_sensor', 'codigo_sensor'),
+    ('usuario_id', 'usuario'),
+    ('usuario__username', 'username'),
+    ('departamento_id', 'departamento'),
+    ('departamento__numero', 'departamento_numero'),
+    ('id_externo', 'id_externo'),
+)
+ENCABEZADOS = [nombre for _, nombre in COLUMNAS]
+
+
+def iterar_eventos(queryset, tamano_lote=2000):
+    """
+    Recorre el queryset en lotes keyset sobre (fecha_hora, id), del más nuevo al
+    más antiguo, devolviendo tuplas (values_list).
+
+    No usamos un solo .iterator(): con MySQL el driver igual carga el resultado
+    completo en memoria. Así cada lote es una query acotada que usa los índices
+    (…, fecha_hora, id) y la memoria queda plana sin importar el tamaño.
+    """
+    queryset = queryset.order_by('-fecha_hora', '-id')
+    campos = [columna for columna, _ in COLUMNAS]
+    i_fecha, i_id = campos.index('fecha_hora'), campos.index('id')
+    ultimo = None
+    while True:
+        lote = queryset
+        if ultimo is not None:
+            fecha, pk = ultimo
+            lote = lote.filter(Q(fecha_hora__lt=fecha) | Q(fecha_hora=fecha, id__lt=pk))
+        filas = list(lote.values_list(*campos)[:tamano_lote])
+        if not filas:
+            return
+        yield from filas
+        if len(filas) < tamano_lote:
+            return
+        ultimo = (filas[-1][i_fecha], filas[-1][i_id])
+
+
+def _fecha_local(valor):
+    return timezone.localtime(valor).isoformat() if valor else ''
+
+
+def generar_csv(filas, filas_por_trozo=500):
+    """Genera el CSV en trozos de texto (varias filas por trozo, no una por yield)."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(ENCABEZADOS)
+    i_fecha = ENCABEZADOS.index('fecha_hora')
+    for numero, fila in enumerate(filas, start=1):
+        fila = list(fila)
+        fila[i_fecha] = _fecha_local(fila[i_fecha])
+        escritor.writerow(fila)
+        if numero % filas_por_trozo == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def generar_ndjson(filas, filas_por_trozo=500):
+    """Un objeto JSON por línea."""
+    i_fecha = ENCABEZADOS.index('fecha_hora')
+    lineas = []
+    for fila in filas:
+        fila = list(fila)
+        fila[i_fecha] = _fecha_local(fila[i_fecha])
+        lineas.append(json.dumps(dict(zip(ENCABEZADOS, fila)), ensure_ascii=False))
+        if len(lineas) >= filas_por_trozo:
+            yield '\n'.join(lineas) + '\n'
+            lineas = []
+    if lineas:
+        yield '\n'.join(lineas) + '\n'
+
+
+def comprimir_gzip(trozos):
+    """Comprime al vuelo: cada trozo de texto sale como bytes gzip."""
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> formato gzip
+    for trozo in trozos:
+        datos = compresor.compress(trozo.encode('utf-8'))
+        if datos:
+            yield datos
+    yield compresor.flush()
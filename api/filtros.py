@@ -0,0 +1,73 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+
+# ==============================================================================
+# FILTROS DEL HISTORIAL DE EVENTOS
+# ==============================================================================
+# Filtros de igualdad: parámetro GET -> campo del modelo Evento.
+# Cada uno tiene su índice compuesto (campo, fecha_hora, id) en Evento.Meta.
+FILTROS_IGUALDAD = {
+    'tipo_evento': 'tipo_evento',
+    'resultado': 'resultado',
+    'sensor': 'sensor_id',
+    'usuario': 'usuario_id',
+    'departamento': 'departamento_id',
+}
+FILTROS_NUMERICOS = {'sensor', 'usuario', 'departamento'}
+
+
+def parsear_fecha(valor, parametro, fin_de_dia=False):
+    """
+    Acepta '2025-03-01T10:00:00-03:00' o solo '2025-03-01'.
+    Con una fecha sola y fin_de_dia=True se incluye el día completo.
+    """
+    try:
+        dia = parse_date(valor)
+        fecha = None if dia is not None else parse_datetime(valor)
+    except ValueError:
+        dia = fecha = None
+    if dia is None and fecha is None:
+        raise ValidationError({parametro: ["Formato inválido (usar ISO 8601, p.ej. 2025-03-01)."]})
+    if dia is not None:
+        if fin_de_dia:
+            dia = dia + timedelta(days=1)
+        fecha = datetime.combine(dia, time.min)
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+def leer_filtros_eventos(params):
+    """
+    Traduce los query params a un dict de filtros ya validados:
+    ?desde=&hasta=&tipo_evento=&resultado=&sensor=&usuario=&departamento=
+    'desde' es inclusivo y 'hasta' exclusivo (salvo fecha sola: incluye ese día).
+    """
+    filtros = {}
+    for parametro, campo in FILTROS_IGUALDAD.items():
+        valor = params.get(parametro)
+        if valor in (None, ''):
+            continue
+        if parametro in FILTROS_NUMERICOS:
+            try:
+                valor = int(valor)
+            except ValueError:
+                raise ValidationError({parametro: ["Debe ser un ID numérico."]})
+        filtros[campo] = valor
+
+    desde = params.get('desde')
+    if desde:
+        filtros['fecha_hora__gte'] = parsear_fecha(desde, 'desde')
+    hasta = params.get('hasta')
+    if hasta:
+        filtros['fecha_hora__lt'] = parsear_fecha(hasta, 'hasta', fin_de_dia=True)
+    return filtros
+
+
+def filtrar_eventos(queryset, params):
+    """Aplica los filtros del historial a un queryset de Evento."""
+    return queryset.filter(**leer_filtros_eventos(params))
@@ -0,0 +1,59 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+
+# Este módulo lo importan también los procesos hijos ANTES de cargar Django:
+# no debe importar modelos (api.models) a nivel de módulo.
+
+
+# ==============================================================================
+# HASHEO DE CONTRASEÑAS EN PARALELO (Importaciones masivas)
+# ==============================================================================
+# Con menos contraseñas que esto no vale la pena levantar procesos
+MINIMO_PARA_PROCESOS = 8
+
+_hasher = None
+
+
+def _iniciar_proceso(ruta_hasher):
+    # Los procesos hijos arrancan limpios ("spawn"): cargamos Django y el hasher una vez
+    global _hasher
+    import django
+    from django.utils.module_loading import import_string
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecoapi.settings')
+    django.setup()
+    _hasher = import_string(ruta_hasher)()
+
+
+def _hashear(password):
+    return _hasher.encode(password, _hasher.salt())
+
+
+def hashear_passwords(passwords, procesos=None):
+    """
+    Hashea las contraseñas repartiéndolas entre varios procesos (PBKDF2 es CPU pura:
+    con hilos no se gana nada por el GIL). Mantiene el orden de la entrada.
+    """
+    passwords = list(passwords)
+    if procesos is None:
+        procesos = getattr(settings, 'IMPORTACION_PROCESOS', 0)
+    procesos = min(procesos or os.cpu_count() or 1, len(passwords))
+    if procesos <= 1 or len(passwords) < MINIMO_PARA_PROCESOS:
+        return [make_password(password) for password in passwords]
+
+    # Mismo hasher que usaría make_password en este proceso (PASSWORD_HASHERS[0])
+    hasher = get_hasher('default')
+    ruta_hasher = f'{type(hasher).__module__}.{type(hasher).__qualname__}'
+    # "spawn" y no "fork": el proceso padre puede tener hilos y conexiones abiertas
+    with ProcessPoolExecutor(
+        max_workers=procesos,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_iniciar_proceso,
+        initargs=(ruta_hasher,),
+    ) as pool:
+        trozo = max(1, len(passwords) // (procesos * 4))
+        return list(pool.map(_hashear, passwords, chunksize=trozo))
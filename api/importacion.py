@@ -0,0 +1,352 @@
+import json
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from .cache import indice_sensores, versiones
+from .directorio import cache_directorio
+from .hasheo import hashear_passwords
+from .lista_acceso import registrar_cambios
+from .models import Usuario, Departamento, Sensor
+from .parsers import leer_csv
+
+
+# ==============================================================================
+# 1. IMPORTACIÓN MASIVA DE SENSORES (Alta de una torre completa)
+# ==============================================================================
+ESTADOS_SENSOR = {estado for estado, _ in Sensor.ESTADOS_SENSOR}
+TIPOS_SENSOR = {tipo for tipo, _ in Sensor.TIPOS_SENSOR}
+# Máximo de valores por "IN (...)": SQLite acepta pocos parámetros por query
+TAMANO_IN = 900
+
+
+def en_trozos(valores, tamano=TAMANO_IN):
+    valores = list(valores)
+    for inicio in range(0, len(valores), tamano):
+        yield valores[inicio:inicio + tamano]
+
+
+def valores_existentes(modelo, campo, valores, columnas=None):
+    """
+    {valor: fila} para los `valores` de `campo` que ya existen en la BD,
+    consultando por trozos (una query por cada TAMANO_IN valores).
+    """
+    columnas = columnas or (campo,)
+    encontrados = {}
+    for trozo in en_trozos(valores):
+        for fila in modelo.objects.filter(**{f'{campo}__in': trozo}).values(*columnas):
+            encontrados[fila[campo]] = fila
+    return encontrados
+
+
+def leer_archivo(ruta):
+    """Filas (lista de dicts) de un archivo .json (arreglo) o CSV con encabezados."""
+    with open(ruta, encoding='utf-8-sig') as archivo:
+        texto = archivo.read()
+    if not ruta.lower().endswith('.json'):
+        return leer_csv(texto)
+    filas = json.loads(texto)
+    if not isinstance(filas, list):
+        raise ValueError("El JSON debe ser un arreglo de objetos.")
+    return filas
+
+
+def _entero(valor):
+    if valor in (None, ''):
+        return None
+    return int(valor)
+
+
+def importar_sensores(filas, atomico=False, tamano_lote=1000):
+    """
+    Da de alta muchos sensores de una vez.
+
+    Cada fila: codigo_sensor (obligatorio), estado, tipo y, opcionalmente,
+    departamento (id) o departamento_numero, y usuario (id) o usuario_rut.
+
+    Toda la validación es por conjuntos: duplicados dentro del archivo en memoria,
+    y códigos existentes / departamentos / usuarios con una query por trozo, no
+    por fila. Las filas válidas se insertan con bulk_create en una transacción.
+    Con atomico=True, si alguna fila tiene errores no se inserta ninguna.
+
+    Devuelve {"recibidos", "creados", "errores": [{"indice", "codigo_sensor", "errores"}]}.
+    """
+    errores = {}  # indice -> {campo: [mensajes]}
+
+    def error(indice, campo, mensaje):
+        errores.setdefault(indice, {}).setdefault(campo, []).append(mensaje)
+
+    # --- 1. Formato de cada fila (en memoria) ---
+    normalizadas = []
+    vistos = {}
+    for indice, fila in enumerate(filas):
+        if not isinstance(fila, dict):
+            error(indice, 'non_field_errors', "Cada sensor debe ser un objeto.")
+            normalizadas.append(None)
+            continue
+        codigo = str(fila.get('codigo_sensor') or '').strip()
+        datos = {
+            'codigo_sensor': codigo,
+            'estado': fila.get('estado') or 'activo',
+            'tipo': fila.get('tipo') or 'llavero',
+            'departamento_numero': fila.get('departamento_numero'),
+            'usuario_rut': fila.get('usuario_rut'),
+        }
+        if not codigo:
+            error(indice, 'codigo_sensor', "Este campo es obligatorio.")
+        elif len(codigo) > 50:
+            error(indice, 'codigo_sensor', "Máximo 50 caracteres.")
+        elif codigo in vistos:
+            error(indice, 'codigo_sensor', f"Repetido en el archivo (fila {vistos[codigo]}).")
+        else:
+            vistos[codigo] = indice
+        if datos['estado'] not in ESTADOS_SENSOR:
+            error(indice, 'estado', f"Valor inválido: {datos['estado']!r}.")
+        if datos['tipo'] not in TIPOS_SENSOR:
+            error(indice, 'tipo', f"Valor inválido: {datos['tipo']!r}.")
+        for campo in ('departamento', 'usuario'):
+            try:
+                datos[campo] = _entero(fila.get(campo))
+            except (TypeError, ValueError):
+                datos[campo] = None
+                error(indice, campo, "Debe ser un ID numérico.")
+        normalizadas.append(datos)
+
+    validas = [(i, d) for i, d in enumerate(normalizadas) if d is not None]
+
+    # --- 2. Validación contra la BD, por conjuntos ---
+    existentes = valores_existentes(Sensor, 'codigo_sensor', {d['codigo_sensor'] for _, d in validas if d['codigo_sensor']})
+    deptos_id = valores_existentes(Departamento, 'id', {d['departamento'] for _, d in validas if d['departamento']})
+    deptos_numero = valores_existentes(
+        Departamento, 'numero', {d['departamento_numero'] for _, d in validas if d['departamento_numero']},
+        columnas=('numero', 'id'),
+    )
+    columnas_usuario = ('id', 'rut', 'estado', 'is_active', 'departamento_id')
+    usuarios_id = valores_existentes(Usuario, 'id', {d['usuario'] for _, d in validas if d['usuario']}, columnas_usuario)
+    usuarios_rut = valores_existentes(Usuario, 'rut', {d['usuario_rut'] for _, d in validas if d['usuario_rut']}, columnas_usuario)
+
+    nuevos = []
+    for indice, datos in validas:
+        if datos['codigo_sensor'] in existentes:
+            error(indice, 'codigo_sensor', "Ya existe un sensor con este código.")
+
+        departamento_id = None
+        if datos['departamento']:
+            if datos['departamento'] not in deptos_id:
+                error(indice, 'departamento', f"El departamento {datos['departamento']} no existe.")
+            departamento_id = datos['departamento']
+        elif datos['departamento_numero']:
+            if datos['departamento_numero'] not in deptos_numero:
+                error(indice, 'departamento_numero', f"El departamento {datos['departamento_numero']} no existe.")
+            else:
+                departamento_id = deptos_numero[datos['departamento_numero']]['id']
+
+        usuario = None
+        if datos['usuario']:
+            usuario = usuarios_id.get(datos['usuario'])
+            if usuario is None:
+                error(indice, 'usuario', f"El usuario {datos['usuario']} no existe.")
+        elif datos['usuario_rut']:
+            usuario = usuarios_rut.get(datos['usuario_rut'])
+            if usuario is None:
+                error(indice, 'usuario_rut', f"No hay un usuario con RUT {datos['usuario_rut']}.")
+        if departamento_id is None and usuario is not None:
+            departamento_id = usuario['departamento_id']
+
+        if indice in errores:
+            continue
+        nuevos.append((Sensor(
+            codigo_sensor=datos['codigo_sensor'],
+            estado=datos['estado'],
+            tipo=datos['tipo'],
+            usuario_id=usuario['id'] if usuario else None,
+            departamento_id=departamento_id,
+        ), usuario))
+
+    # --- 3. Inserción ---
+    if errores and atomico:
+        nuevos = []
+    with transaction.atomic():
+        for trozo in en_trozos(nuevos, tamano_lote):
+            Sensor.objects.bulk_create([sensor for sensor, _ in trozo])
+        if nuevos:
+            # bulk_create no dispara señales: avisamos a mano a los cachés y a la lista offline
+            registrar_cambios(
+                (sensor.codigo_sensor, True) for sensor, usuario in nuevos
+                if sensor.estado == 'activo'
+                and (usuario is None or (usuario['estado'] == 'activo' and usuario['is_active']))
+            )
+            codigos = [sensor.codigo_sensor for sensor, _ in nuevos]
+            transaction.on_commit(lambda: notificar_sensores_nuevos(codigos))
+
+    return {
+        "recibidos": len(filas),
+        "creados": len(nuevos),
+        "errores": [
+            {
+                "indice": indice,
+                "codigo_sensor": (normalizadas[indice] or {}).get('codigo_sensor'),
+                "errores": errores[indice],
+            }
+            for indice in sorted(errores)
+        ],
+    }
+
+
+def notificar_sensores_nuevos(codigos):
+    # Un código pudo quedar en el índice como "no registrado" antes de importarlo
+    indice_sensores.invalidar_codigos(codigos)
+    versiones.incrementar(Sensor)
+    cache_directorio.invalidar_todo()
+
+
+# ==============================================================================
+# 2. IMPORTACIÓN MASIVA DE RESIDENTES (Alta de un condominio completo)
+# ==============================================================================
+def importar_residentes(filas, atomico=False, tamano_lote=1000, procesos=None):
+    """
+    Da de alta muchos residentes de una vez.
+
+    Cada fila: rut, nombres, apellidos, email (obligatorios), y opcionalmente
+    username (por defecto el RUT), password, telefono y departamento (id) o
+    departamento_numero. Sin password el usuario queda con una contraseña
+    inutilizable hasta que la defina.
+
+    RUT, email y username se validan contra el archivo en memoria y contra la BD
+    con una query por trozo de valores. Las contraseñas de las filas válidas se
+    hashean en paralelo y todo se inserta con bulk_create en una transacción.
+    Con atomico=True, si alguna fila tiene errores no se inserta ninguna.
+
+    Devuelve {"recibidos", "creados", "errores": [{"indice", "rut", "errores"}]}.
+    """
+    errores = {}
+
+    def error(indice, campo, mensaje):
+        errores.setdefault(indice, {}).setdefault(campo, []).append(mensaje)
+
+    # --- 1. Formato de cada fila (en memoria) ---
+    normalizadas = []
+    vistos = {'rut': {}, 'email': {}, 'username': {}}
+    for indice, fila in enumerate(filas):
+        if not isinstance(fila, dict):
+            error(indice, 'non_field_errors', "Cada residente debe ser un objeto.")
+            normalizadas.append(None)
+            continue
+        datos = {
+            campo: str(fila.get(campo) or '').strip()
+            for campo in ('rut', 'nombres', 'apellidos', 'email', 'username', 'telefono')
+        }
+        datos['email'] = Usuario.objects.normalize_email(datos['email'])
+        datos['username'] = datos['username'] or datos['rut']
+        datos['password'] = fila.get('password') or None
+        datos['departamento_numero'] = fila.get('departamento_numero')
+
+        for campo in ('rut', 'nombres', 'apellidos', 'email'):
+            if not datos[campo]:
+                error(indice, campo, "Este campo es obligatorio.")
+        for campo, maximo in (('rut', 15), ('nombres', 100), ('apellidos', 100),
+                              ('username', 150), ('telefono', 25)):
+            if len(datos[campo]) > maximo:
+                error(indice, campo, f"Máximo {maximo} caracteres.")
+        if datos['email']:
+            try:
+                validate_email(datos['email'])
+            except ValidationError:
+                error(indice, 'email', "Correo inválido.")
+        for campo, valores in vistos.items():
+            if not datos[campo]:
+                continue
+            if datos[campo] in valores:
+                error(indice, campo, f"Repetido en el archivo (fila {valores[datos[campo]]}).")
+            else:
+                valores[datos[campo]] = indice
+        try:
+            datos['departamento'] = _entero(fila.get('departamento'))
+        except (TypeError, ValueError):
+            datos['departamento'] = None
+            error(indice, 'departamento', "Debe ser un ID numérico.")
+        normalizadas.append(datos)
+
+    validas = [(i, d) for i, d in enumerate(normalizadas) if d is not None]
+
+    # --- 2. Unicidad y departamentos contra la BD, por conjuntos ---
+    existentes = {
+        campo: valores_existentes(Usuario, campo, set(vistos[campo]))
+        for campo in ('rut', 'email', 'username')
+    }
+    deptos_id = valores_existentes(Departamento, 'id', {d['departamento'] for _, d in validas if d['departamento']})
+    deptos_numero = valores_existentes(
+        Departamento, 'numero', {d['departamento_numero'] for _, d in validas if d['departamento_numero']},
+        columnas=('numero', 'id'),
+    )
+
+    aceptadas = []
+    for indice, datos in validas:
+        for campo in ('rut', 'email', 'username'):
+            if datos[campo] in existentes[campo]:
+                error(indice, campo, "Ya existe un usuario con este valor.")
+
+        datos['departamento_id'] = None
+        if datos['departamento']:
+            if datos['departamento'] not in deptos_id:
+                error(indice, 'departamento', f"El departamento {datos['departamento']} no existe.")
+            datos['departamento_id'] = datos['departamento']
+        elif datos['departamento_numero']:
+            if datos['departamento_numero'] not in deptos_numero:
+                error(indice, 'departamento_numero', f"El departamento {datos['departamento_numero']} no existe.")
+            else:
+                datos['departamento_id'] = deptos_numero[datos['departamento_numero']]['id']
+
+        if indice not in errores:
+            aceptadas.append(datos)
+
+    if errores and atomico:
+        aceptadas = []
+
+    # --- 3. Contraseñas en paralelo (sólo las filas que se van a insertar) ---
+    con_password = [datos for datos in aceptadas if datos['password']]
+    hashes = hashear_passwords([datos['password'] for datos in con_password], procesos=procesos)
+    for datos, hash_password in zip(con_password, hashes):
+        datos['password'] = hash_password
+
+    nuevos = [
+        Usuario(
+            username=datos['username'],
+            rut=datos['rut'],
+            nombres=datos['nombres'],
+            apellidos=datos['apellidos'],
+            email=datos['email'],
+            telefono=datos['telefono'] or None,
+            departamento_id=datos['departamento_id'],
+            password=datos['password'] or make_password(None),
+        )
+        for datos in aceptadas
+    ]
+
+    # --- 4. Inserción ---
+    with transaction.atomic():
+        for trozo in en_trozos(nuevos, tamano_lote):
+            Usuario.objects.bulk_create(trozo)
+        if nuevos:
+            # bulk_create no dispara señales (ver api/signals.py)
+            transaction.on_commit(notificar_residentes_nuevos)
+
+    return {
+        "recibidos": len(filas),
+        "creados": len(nuevos),
+        "errores": [
+            {
+                "indice": indice,
+                "rut": (normalizadas[indice] or {}).get('rut'),
+                "errores": errores[indice],
+            }
+            for indice in sorted(errores)
+        ],
+    }
+
+
+def notificar_residentes_nuevos():
+    versiones.incrementar(Usuario)
+    cache_directorio.invalidar_todo()
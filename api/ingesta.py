@@ -0,0 +1,236 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Usuario, Sensor, Evento
+from .rechazos import detector_rechazos, bloquear_sensores
+from .resumenes import sumar_eventos
+
+
+# ==============================================================================
+# INGESTA DE EVENTOS POR LOTES
+# ==============================================================================
+TIPOS_VALIDOS = {tipo for tipo, _ in Evento.TIPOS_EVENTO}
+
+
+def validar_fila_evento(fila):
+    """Valida el formato de una fila. Devuelve (datos, errores)."""
+    if not isinstance(fila, dict):
+        return None, {"non_field_errors": ["Cada evento debe ser un objeto JSON."]}
+
+    errores = {}
+    datos = {}
+
+    tipo = fila.get('tipo_evento')
+    # isinstance antes del `in`: una lista o un dict no se pueden buscar en un set
+    if not isinstance(tipo, str) or tipo not in TIPOS_VALIDOS:
+        errores['tipo_evento'] = [f"Valor inválido: {tipo!r}."]
+    datos['tipo_evento'] = tipo
+
+    resultado = fila.get('resultado') or ''
+    if not isinstance(resultado, str) or len(resultado) > 50:
+        errores['resultado'] = ["Debe ser texto de máximo 50 caracteres."]
+    datos['resultado'] = resultado
+
+    id_externo = fila.get('id_externo')
+    if isinstance(id_externo, (list, dict)):
+        errores['id_externo'] = ["Debe ser texto."]
+    elif id_externo is not None:
+        id_externo = str(id_externo)
+        if len(id_externo) > 64:
+            errores['id_externo'] = ["Máximo 64 caracteres."]
+    datos['id_externo'] = id_externo
+
+    fecha = fila.get('fecha_hora')
+    if fecha:
+        try:
+            # parse_datetime lanza ValueError con fechas bien formadas pero imposibles (30 de febrero)
+            fecha = parse_datetime(fecha) if isinstance(fecha, str) else None
+        except ValueError:
+            fecha = None
+        if fecha is None:
+            errores['fecha_hora'] = ["Formato de fecha inválido (usar ISO 8601)."]
+        elif timezone.is_naive(fecha):
+            fecha = timezone.make_aware(fecha)
+    datos['fecha_hora'] = fecha or timezone.now()
+
+    for campo in ('sensor', 'usuario'):
+        valor = fila.get(campo)
+        if valor in (None, ''):
+            datos[campo] = None
+            continue
+        try:
+            datos[campo] = int(valor)
+        except (TypeError, ValueError):
+            errores[campo] = ["Debe ser un ID numérico."]
+    codigo = fila.get('codigo_sensor') or None
+    if codigo is not None and not isinstance(codigo, str):
+        errores['codigo_sensor'] = ["Debe ser texto."]
+    datos['codigo_sensor'] = codigo
+
+    return datos, errores
+
+
+def ingerir_eventos(filas, tamano_lote=None, contar_rechazos=True, dispositivo_id=None):
+    """
+    Inserta una lista de eventos (dicts) con el menor número de queries posible:
+    - Valida cada fila en memoria.
+    - Resuelve los FK de sensor/usuario con UNA query por tabla para todo el lote.
+    - Descarta los id_externo que ya existen (reintentos) con UNA query.
+    - Inserta con bulk_create en trozos de `tamano_lote`.
+    - Suma los ACCESO_RECHAZADO a los contadores de api/rechazos.py, por sensor
+      y por `dispositivo_id` (salvo con contar_rechazos=False: el buffer ya los
+      contó al encolar).
+
+    Devuelve un reporte: {"recibidos", "creados", "duplicados", "errores": [...]}
+    """
+    tamano_lote = tamano_lote or getattr(settings, 'EVENTOS_LOTE_TAMANO', 500)
+    errores = []
+    validas = []  # (indice, datos)
+
+    for indice, fila in enumerate(filas):
+        datos, errores_fila = validar_fila_evento(fila)
+        if errores_fila:
+            errores.append({"indice": indice, "errores": errores_fila})
+        else:
+            validas.append((indice, datos))
+
+    # --- 1. Resolución de FK en bloque ---
+    ids_sensor = {d['sensor'] for _, d in validas if d['sensor'] is not None}
+    codigos = {d['codigo_sensor'] for _, d in validas if d['sensor'] is None and d['codigo_sensor']}
+    sensores_por_id = {}      # pk -> (usuario_id, departamento_id)
+    sensores_por_codigo = {}  # codigo -> (pk, usuario_id, departamento_id)
+    if ids_sensor or codigos:
+        consulta = Sensor.objects.none()
+        if ids_sensor:
+            consulta = consulta | Sensor.objects.filter(pk__in=ids_sensor)
+        if codigos:
+            consulta = consulta | Sensor.objects.filter(codigo_sensor__in=codigos)
+        columnas = ('pk', 'codigo_sensor', 'usuario_id', 'departamento_id', 'usuario__departamento_id')
+        for pk, codigo, usuario_id, depto_sensor, depto_usuario in consulta.values_list(*columnas):
+            departamento_id = depto_sensor if depto_sensor is not None else depto_usuario
+            sensores_por_id[pk] = (usuario_id, departamento_id)
+            sensores_por_codigo[codigo] = (pk, usuario_id, departamento_id)
+
+    ids_usuario = {d['usuario'] for _, d in validas if d['usuario'] is not None}
+    usuarios = dict(
+        Usuario.objects.filter(pk__in=ids_usuario).values_list('pk', 'departamento_id')
+    ) if ids_usuario else {}  # pk -> departamento_id
+
+    # --- 2. Idempotencia: id_externo ya guardados o repetidos en el mismo lote ---
+    ya_guardados = _ya_guardados({d['id_externo'] for _, d in validas if d['id_externo']})
+
+    duplicados = 0
+    vistos = set()
+    nuevos = []
+    for indice, datos in validas:
+        id_externo = datos['id_externo']
+        if id_externo:
+            if id_externo in ya_guardados or id_externo in vistos:
+                duplicados += 1
+                continue
+            vistos.add(id_externo)
+
+        errores_fila = {}
+        sensor_id = datos['sensor']
+        usuario_sensor = departamento_id = None
+        if sensor_id is not None:
+            if sensor_id not in sensores_por_id:
+                errores_fila['sensor'] = [f"El sensor {sensor_id} no existe."]
+            else:
+                usuario_sensor, departamento_id = sensores_por_id[sensor_id]
+        elif datos['codigo_sensor']:
+            # Un tag desconocido también es un evento válido (ACCESO_RECHAZADO)
+            sensor_id, usuario_sensor, departamento_id = sensores_por_codigo.get(
+                datos['codigo_sensor'], (None, None, None)
+            )
+
+        usuario_id = datos['usuario']
+        if usuario_id is not None:
+            if usuario_id not in usuarios:
+                errores_fila['usuario'] = [f"El usuario {usuario_id} no existe."]
+            elif departamento_id is None:
+                departamento_id = usuarios[usuario_id]
+        else:
+            usuario_id = usuario_sensor
+
+        if errores_fila:
+            errores.append({"indice": indice, "errores": errores_fila})
+            continue
+
+        nuevos.append((indice, Evento(
+            sensor_id=sensor_id,
+            usuario_id=usuario_id,
+            departamento_id=departamento_id,
+            tipo_evento=datos['tipo_evento'],
+            resultado=datos['resultado'],
+            fecha_hora=datos['fecha_hora'],
+            id_externo=id_externo,
+        )))
+
+    # --- 3. Inserción en trozos ---
+    insertados = []
+    with transaction.atomic():
+        for inicio in range(0, len(nuevos), tamano_lote):
+            guardados, repetidos, errores_trozo = _insertar(nuevos[inicio:inicio + tamano_lote])
+            insertados.extend(guardados)
+            duplicados += repetidos
+            errores.extend(errores_trozo)
+        # bulk_create no dispara post_save: actualizamos el resumen por hora aquí,
+        # sólo con las filas que de verdad se insertaron
+        sumar_eventos(insertados)
+
+    if contar_rechazos:
+        superados = detector_rechazos.registrar(
+            [evento.sensor_id for evento in insertados if evento.tipo_evento == 'ACCESO_RECHAZADO'],
+            dispositivo_id,
+        )
+        if superados:
+            bloquear_sensores(superados)
+
+    errores.sort(key=lambda e: e['indice'])
+    return {
+        "recibidos": len(filas),
+        "creados": len(insertados),
+        "duplicados": duplicados,
+        "errores": errores,
+    }
+
+
+def _ya_guardados(externos):
+    """id_externo de `externos` que ya están en la BD (1 query)."""
+    if not externos:
+        return set()
+    return set(Evento.objects.filter(id_externo__in=externos).values_list('id_externo', flat=True))
+
+
+def _insertar(trozo):
+    """
+    Inserta un trozo de (indice, Evento) y devuelve (insertados, duplicados, errores).
+
+    Normalmente es un solo INSERT. Si dos reintentos del mismo lote corren a la
+    vez, ambos pasan la verificación de id_externo y el segundo choca con el
+    índice único: entonces se inserta fila por fila para saber cuáles entraron
+    de verdad (y no sumarlas dos veces al resumen).
+    """
+    try:
+        with transaction.atomic():
+            Evento.objects.bulk_create([evento for _, evento in trozo])
+        return [evento for _, evento in trozo], 0, []
+    except IntegrityError:
+        pass
+
+    insertados, duplicados, errores = [], 0, []
+    for indice, evento in trozo:
+        try:
+            with transaction.atomic():
+                Evento.objects.bulk_create([evento])
+            insertados.append(evento)
+        except IntegrityError:
+            if evento.id_externo and Evento.objects.filter(id_externo=evento.id_externo).exists():
+                duplicados += 1
+            else:
+                # Otra restricción (p.ej. el sensor se borró recién)
+                errores.append({"indice": indice, "errores": {"non_field_errors": ["No se pudo guardar el evento."]}})
+    return insertados, duplicados, errores
@@ -0,0 +1,183 @@
+import hashlib
+import math
+import struct
+import threading
+from datetime import timedelta
+
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .models import Sensor, CambioListaAcceso
+
+
+# ==============================================================================
+# LISTA DE ACCESO OFFLINE PARA LA BARRERA
+# ==============================================================================
+# Formato binario del snapshot (big-endian):
+#
+#   Cabecera (18 bytes): magic 'ECOL' | formato u8 (=1) | tipo u8 | version u64 | cantidad u32
+#   tipo 0 (ORDENADO): cantidad x u64 -> hash de cada código, ordenados (búsqueda binaria)
+#   tipo 1 (BLOOM):    m u32 (bits) | k u8 (hashes) | m/8 bytes con los bits
+#
+# hash de un código: blake2b(codigo utf-8, digest_size=16)
+#   - ORDENADO usa los primeros 8 bytes como u64.
+#   - BLOOM usa h1 = bytes[0:8], h2 = bytes[8:16] y bit_i = (h1 + i*h2) mod m, i < k.
+MAGIC = b'ECOL'
+FORMATO = 1
+TIPO_ORDENADO = 0
+TIPO_BLOOM = 1
+CABECERA = struct.Struct('>4sBBQI')
+
+
+def sensores_permitidos():
+    """Queryset con los sensores que hoy abren la barrera (misma regla que evaluar_acceso)."""
+    return Sensor.objects.filter(estado='activo').filter(
+        Q(usuario__isnull=True) | Q(usuario__estado='activo', usuario__is_active=True)
+    )
+
+
+def _digest(codigo):
+    return hashlib.blake2b(codigo.encode('utf-8'), digest_size=16).digest()
+
+
+def hash_codigo(codigo):
+    """Hash u64 con el que la barrera busca un código en el snapshot ORDENADO."""
+    return struct.unpack('>Q', _digest(codigo)[:8])[0]
+
+
+def version_actual():
+    return CambioListaAcceso.objects.aggregate(v=Max('id'))['v'] or 0
+
+
+def registrar_cambios(cambios):
+    """Agrega altas/bajas al registro. `cambios` es un iterable de (codigo, permitido)."""
+    filas = [CambioListaAcceso(codigo_sensor=codigo, permitido=permitido) for codigo, permitido in cambios]
+    if filas:
+        CambioListaAcceso.objects.bulk_create(filas)
+
+
+def compactar_cambios(dias=30):
+    """
+    Borra los cambios de más de `dias` días (LISTA_ACCESO_RETENCION_DIAS).
+    El último cambio nunca se borra: su id es la versión actual de la lista.
+    Una barrera con una versión anterior a lo borrado recibe 409 en el delta y
+    baja el snapshot completo (ver cambios_desde). Devuelve cuántos borró.
+    """
+    limite = timezone.now() - timedelta(days=dias)
+    borrados, _ = CambioListaAcceso.objects.filter(fecha__lt=limite, id__lt=version_actual()).delete()
+    return borrados
+
+
+# --- Construcción del snapshot ---
+def _snapshot_ordenado(version, codigos):
+    hashes = sorted({hash_codigo(codigo) for codigo in codigos})
+    cuerpo = struct.pack(f'>{len(hashes)}Q', *hashes)
+    return CABECERA.pack(MAGIC, FORMATO, TIPO_ORDENADO, version, len(hashes)) + cuerpo
+
+
+def parametros_bloom(cantidad, falsos_positivos):
+    """m (bits, múltiplo de 8) y k óptimos para `cantidad` elementos y la tasa pedida."""
+    cantidad = max(cantidad, 1)
+    m = math.ceil(-cantidad * math.log(falsos_positivos) / (math.log(2) ** 2))
+    m = max(8, (m + 7) // 8 * 8)
+    k = max(1, round(m / cantidad * math.log(2)))
+    return m, k
+
+
+def _snapshot_bloom(version, codigos, falsos_positivos):
+    codigos = set(codigos)
+    m, k = parametros_bloom(len(codigos), falsos_positivos)
+    bits = bytearray(m // 8)
+    for codigo in codigos:
+        digest = _digest(codigo)
+        h1, h2 = struct.unpack('>QQ', digest)
+        for i in range(k):
+            posicion = (h1 + i * h2) % m
+            bits[posicion >> 3] |= 1 << (posicion & 7)
+    cabecera = CABECERA.pack(MAGIC, FORMATO, TIPO_BLOOM, version, len(codigos))
+    return cabecera + struct.pack('>IB', m, k) + bytes(bits)
+
+
+# Tasas de falsos positivos que se sirven: la pedida se lleva a la más cercana
+# igual o más estricta, así los clientes no pueden forzar un rearmado por cada valor.
+TASAS_FALSOS_POSITIVOS = (0.1, 0.01, 0.001, 0.0001, 0.00001)
+
+
+def tasa_falsos_positivos(pedida):
+    for tasa in TASAS_FALSOS_POSITIVOS:
+        if tasa <= pedida:
+            return tasa
+    return TASAS_FALSOS_POSITIVOS[-1]
+
+
+class CacheSnapshot:
+    """
+    Un snapshot armado por (tipo, fp), de la versión actual de la lista: se rearma
+    sólo si cambió la lista. Al ver una versión nueva se descartan los anteriores.
+    Como fp se cuantiza (TASAS_FALSOS_POSITIVOS), hay a lo más 1 + len(TASAS) entradas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._guardado = {}   # (tipo, fp) -> (version, datos)
+
+    def obtener(self, tipo, falsos_positivos=0.001):
+        # La versión se lee ANTES que la lista: si algo cambia entre medio, el
+        # snapshot ya lo incluye y el delta desde esa versión lo vuelve a aplicar
+        # (altas/bajas son idempotentes en la barrera).
+        version = version_actual()
+        falsos_positivos = tasa_falsos_positivos(falsos_positivos) if tipo == TIPO_BLOOM else None
+        clave = (tipo, falsos_positivos)
+        with self._lock:
+            guardado = self._guardado.get(clave)
+            if guardado is not None and guardado[0] == version:
+                return guardado
+
+        codigos = sensores_permitidos().values_list('codigo_sensor', flat=True).iterator(chunk_size=5000)
+        if tipo == TIPO_BLOOM:
+            datos = _snapshot_bloom(version, codigos, falsos_positivos)
+        else:
+            datos = _snapshot_ordenado(version, codigos)
+
+        with self._lock:
+            # Sólo se descartan los de versiones anteriores (otro hilo pudo guardar una más nueva)
+            self._guardado = {otra: par for otra, par in self._guardado.items() if par[0] >= version}
+            actual = self._guardado.get(clave)
+            if actual is None or actual[0] <= version:
+                self._guardado[clave] = (version, datos)
+        return version, datos
+
+
+cache_snapshot = CacheSnapshot()
+
+
+# --- Delta ---
+def cambios_desde(version, maximo=10000):
+    """
+    Altas y bajas (hashes u64 en hex) posteriores a `version`, colapsadas al
+    último estado de cada código. Devuelve None si el dispositivo debe bajar un
+    snapshot completo (versión desconocida, anterior a lo ya compactado o
+    demasiados cambios).
+    """
+    extremos = CambioListaAcceso.objects.aggregate(actual=Max('id'), primero=Min('id'))
+    actual = extremos['actual'] or 0
+    if version > actual:
+        return None
+    if extremos['primero'] is not None and version < extremos['primero'] - 1:
+        # Los cambios entre `version` y el más antiguo que queda ya se compactaron
+        return None
+    filas = list(
+        CambioListaAcceso.objects
+        .filter(id__gt=version)
+        .order_by('id')
+        .values_list('codigo_sensor', 'permitido')[:maximo + 1]
+    )
+    if len(filas) > maximo:
+        return None
+
+    # El último cambio de cada código gana. Hashes en hex: un u64 no cabe
+    # exacto en un número JSON (doble precisión)
+    ultimo_estado = dict(filas)
+    altas = sorted(f'{hash_codigo(c):016x}' for c, permitido in ultimo_estado.items() if permitido)
+    bajas = sorted(f'{hash_codigo(c):016x}' for c, permitido in ultimo_estado.items() if not permitido)
+    return {"version": actual, "altas": altas, "bajas": bajas}
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.archivo_eventos import archivo_eventos
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve los eventos con más de --dias días (EVENTOS_RETENCION_DIAS) de "
+        "eventos_acceso a segmentos .ndjson.gz por día en EVENTOS_ARCHIVO_DIR. "
+        "El historial y la exportación los siguen mostrando."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.EVENTOS_RETENCION_DIAS,
+                            help="Días que se quedan en la BD (por defecto EVENTOS_RETENCION_DIAS).")
+        parser.add_argument('--lote', type=int, default=2000,
+                            help="Filas por SELECT al leer cada día.")
+        parser.add_argument('--simular', action='store_true',
+                            help="Solo muestra qué días y cuántos eventos se archivarían.")
+
+    def handle(self, *args, **options):
+        reporte = archivo_eventos.archivar(
+            dias=options['dias'], tamano_lote=options['lote'], simular=options['simular'],
+        )
+        for segmento in reporte:
+            self.stdout.write(f"{segmento['dia']}: {segmento['filas']} eventos -> {segmento['archivo'] or '-'}")
+        total = sum(segmento['filas'] for segmento in reporte)
+        accion = "Se archivarían" if options['simular'] else "Archivados"
+        self.stdout.write(self.style.SUCCESS(f"{accion}: {total} eventos en {len(reporte)} días"))
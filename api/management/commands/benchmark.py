@@ -0,0 +1,115 @@
+import json
+import platform
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api.benchmark import (
+    ESCENARIOS, ClienteHTTP, ClienteLocal, comparar, ejecutar_benchmark,
+    leer_prometheus, metricas_locales, obtener_token,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide latencia (p50/p95/p99), throughput y queries por petición de los caminos "
+        "de la barrera y la app con clientes concurrentes, y escribe un reporte JSON "
+        "comparable entre corridas. Requiere datos de sembrar_datos. Sin --url llama a "
+        "la app en el mismo proceso; con --url, a un servidor ya corriendo. "
+        "Ingesta y reclamo modifican la BD: para comparar exacto, volver a sembrar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Servidor a medir (p.ej. http://127.0.0.1:8000). Sin esto: en proceso.")
+        parser.add_argument('--escenarios', default=','.join(ESCENARIOS),
+                            help=f"Separados por coma. Disponibles: {', '.join(ESCENARIOS)}")
+        parser.add_argument('--peticiones', type=int, default=500, help="Peticiones medidas por escenario.")
+        parser.add_argument('--clientes', type=int, default=8, help="Clientes concurrentes (hilos).")
+        parser.add_argument('--calentamiento', type=int, default=20, help="Peticiones previas sin medir.")
+        parser.add_argument('--filas-lote', type=int, default=20, help="Eventos por POST en 'ingesta'.")
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--salida', help="Archivo donde guardar el reporte JSON (por defecto, stdout).")
+        parser.add_argument('--comparar', help="Reporte JSON anterior contra el cual comparar.")
+        parser.add_argument('--umbral', type=float, default=10.0,
+                            help="Falla si el p95 de algún escenario empeora más que este %% respecto de --comparar.")
+
+    def handle(self, *args, **options):
+        escenarios = [nombre.strip() for nombre in options['escenarios'].split(',') if nombre.strip()]
+        desconocidos = [nombre for nombre in escenarios if nombre not in ESCENARIOS]
+        if desconocidos:
+            raise CommandError(f"Escenarios desconocidos: {', '.join(desconocidos)}")
+        if options['clientes'] < 1 or options['peticiones'] < 1:
+            raise CommandError("--clientes y --peticiones deben ser mayores que 0.")
+
+        if options['url']:
+            url = options['url']
+            nuevo_cliente = lambda: ClienteHTTP(url)
+
+            def leer_metricas():
+                cliente = ClienteHTTP(url)
+                headers = {}
+                if getattr(settings, 'METRICAS_TOKEN', ''):
+                    headers['Authorization'] = f'Bearer {settings.METRICAS_TOKEN}'
+                try:
+                    codigo, cuerpo = cliente.pedir('GET', '/api/metrics/', headers=headers)
+                finally:
+                    cliente.cerrar()
+                return leer_prometheus(cuerpo.decode('utf-8')) if codigo == 200 else {}
+        else:
+            if 'testserver' not in settings.ALLOWED_HOSTS and '*' not in settings.ALLOWED_HOSTS:
+                settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+            nuevo_cliente = ClienteLocal
+            leer_metricas = metricas_locales
+
+        cliente = nuevo_cliente()
+        try:
+            token = obtener_token(cliente)
+        except (RuntimeError, OSError) as exc:
+            raise CommandError(str(exc))
+        finally:
+            cliente.cerrar()
+
+        resultados = ejecutar_benchmark(
+            nuevo_cliente, leer_metricas, token, escenarios,
+            peticiones=options['peticiones'],
+            clientes=options['clientes'],
+            calentamiento=options['calentamiento'],
+            semilla=options['semilla'],
+            filas_lote=options['filas_lote'],
+        )
+        reporte = {
+            "fecha": timezone.now().isoformat(),
+            "modo": "http" if options['url'] else "en_proceso",
+            "url": options['url'],
+            "bd": connection.vendor,
+            "python": platform.python_version(),
+            "config": {
+                clave: options[clave]
+                for clave in ('peticiones', 'clientes', 'calentamiento', 'filas_lote', 'semilla')
+            },
+            "escenarios": resultados,
+        }
+
+        texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(texto + '\n')
+            self.stderr.write(f"Reporte guardado en {options['salida']}")
+        else:
+            self.stdout.write(texto)
+
+        if options['comparar']:
+            try:
+                with open(options['comparar'], encoding='utf-8') as archivo:
+                    base = json.load(archivo)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"No se pudo leer {options['comparar']}: {exc}")
+            lineas, regresiones = comparar(base, reporte, options['umbral'])
+            for linea in lineas:
+                self.stderr.write(linea)
+            if regresiones:
+                raise CommandError(
+                    f"Regresión de p95 > {options['umbral']}% en: {', '.join(regresiones)}"
+                )
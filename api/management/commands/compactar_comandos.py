@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.comandos import compactar_comandos
+
+
+class Command(BaseCommand):
+    help = "Borra los comandos remotos ya confirmados más antiguos que N días."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int, default=getattr(settings, 'COMANDOS_RETENCION_DIAS', 7),
+            help="Antigüedad mínima (en días) de los comandos confirmados a borrar.",
+        )
+
+    def handle(self, *args, **options):
+        borrados = compactar_comandos(options['dias'])
+        self.stdout.write(self.style.SUCCESS(f"Comandos confirmados borrados: {borrados}"))
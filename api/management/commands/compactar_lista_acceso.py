@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.lista_acceso import compactar_cambios
+
+
+class Command(BaseCommand):
+    help = "Borra los cambios de la lista de acceso offline más antiguos que N días."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int, default=getattr(settings, 'LISTA_ACCESO_RETENCION_DIAS', 30),
+            help="Antigüedad mínima (en días) de los cambios a borrar. Las barreras más "
+                 "atrasadas que eso bajan el snapshot completo.",
+        )
+
+    def handle(self, *args, **options):
+        borrados = compactar_cambios(options['dias'])
+        self.stdout.write(self.style.SUCCESS(f"Cambios de lista de acceso borrados: {borrados}"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importacion import importar_sensores, leer_archivo
+
+
+class Command(BaseCommand):
+    help = (
+        "Alta masiva de sensores desde un archivo CSV (con encabezados) o JSON "
+        "(arreglo de objetos). Columnas: codigo_sensor, estado, tipo, departamento "
+        "o departamento_numero, usuario o usuario_rut."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo .csv o .json")
+        parser.add_argument('--atomico', action='store_true',
+                            help="No insertar nada si alguna fila tiene errores.")
+        parser.add_argument('--lote', type=int, default=1000,
+                            help="Filas por INSERT (bulk_create).")
+
+    def handle(self, *args, **options):
+        try:
+            filas = leer_archivo(options['archivo'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"No se pudo leer {options['archivo']}: {exc}")
+
+        reporte = importar_sensores(filas, atomico=options['atomico'], tamano_lote=options['lote'])
+
+        for fila in reporte['errores']:
+            self.stderr.write(f"Fila {fila['indice']} ({fila['codigo_sensor']}): {fila['errores']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Recibidos: {reporte['recibidos']}  Creados: {reporte['creados']}  "
+            f"Con errores: {len(reporte['errores'])}"
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api.filtros import parsear_fecha
+from api.resumenes import recalcular_resumenes
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye el resumen por hora de eventos (resumen_eventos_hora) a partir "
+        "de eventos_acceso. Sin fechas recalcula todo el historial."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help="Fecha/hora inicial (ISO 8601), inclusiva.")
+        parser.add_argument('--hasta', help="Fecha/hora final (ISO 8601), exclusiva.")
+
+    def handle(self, *args, **options):
+        desde = parsear_fecha(options['desde'], 'desde') if options['desde'] else None
+        hasta = parsear_fecha(options['hasta'], 'hasta') if options['hasta'] else None
+        escritos = recalcular_resumenes(desde, hasta)
+        self.stdout.write(self.style.SUCCESS(f"Buckets escritos: {escritos}"))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.benchmark import sembrar, USUARIO_BENCH, PASSWORD_BENCH
+from api.models import Usuario
+
+
+class Command(BaseCommand):
+    help = (
+        "Llena la BD local con volúmenes realistas para el benchmark: departamentos, "
+        "residentes, sensores, millones de eventos y comandos pendientes. "
+        "Con la misma --semilla genera los mismos datos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--departamentos', type=int, default=2_000)
+        parser.add_argument('--usuarios', type=int, default=20_000)
+        parser.add_argument('--sensores', type=int, default=30_000)
+        parser.add_argument('--eventos', type=int, default=1_000_000)
+        parser.add_argument('--comandos', type=int, default=1_000, help="Comandos pendientes a repartir.")
+        parser.add_argument('--dispositivos', type=int, default=10, help="Barreras entre las que se reparten.")
+        parser.add_argument('--dias', type=int, default=90, help="Días hacia atrás de los eventos.")
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--lote', type=int, default=5_000, help="Filas por INSERT.")
+        parser.add_argument('--forzar', action='store_true',
+                            help="Permitir sembrar en una BD que no sea SQLite (¡nunca en producción!).")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite' and not options['forzar']:
+            raise CommandError(
+                f"La BD configurada es {connection.vendor}, no SQLite. "
+                "Usa una BD local (sin DB_HOST en .env) o --forzar."
+            )
+        if Usuario.objects.filter(username=USUARIO_BENCH).exists():
+            raise CommandError("La BD ya tiene datos del benchmark: empieza desde una BD nueva (migrate).")
+
+        sembrar(
+            departamentos=options['departamentos'],
+            usuarios=options['usuarios'],
+            sensores=options['sensores'],
+            eventos=options['eventos'],
+            comandos=options['comandos'],
+            dispositivos=options['dispositivos'],
+            dias=options['dias'],
+            semilla=options['semilla'],
+            tamano_lote=options['lote'],
+            informar=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Listo. Usuario del benchmark: {USUARIO_BENCH} / {PASSWORD_BENCH}"
+        ))
@@ -0,0 +1,223 @@
+import contextvars
+import hmac
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+logger = logging.getLogger('api.lentas')
+
+# Límites (segundos) de los buckets del histograma de latencia
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Máximo de sentencias SQL que se guardan por petición para el log de lentas
+MAX_SQL_LENTAS = 50
+
+
+# ==============================================================================
+# 1. REGISTRO DE MÉTRICAS POR RUTA
+# ==============================================================================
+class Medicion:
+    """Lo que van sumando las queries de UNA petición (vive en un contextvar)."""
+    __slots__ = ('queries', 'tiempo_bd', 'sql')
+
+    def __init__(self, capturar_sql):
+        self.queries = 0
+        self.tiempo_bd = 0.0
+        self.sql = [] if capturar_sql else None
+
+
+class MetricasRutas:
+    """
+    Acumuladores por (ruta, método): histograma de latencia, peticiones por
+    código de estado, cantidad de queries y tiempo en la BD. Son contadores
+    del proceso (con varios workers, Prometheus suma las instancias).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rutas = {}  # (ruta, metodo) -> [buckets, suma, cuenta, queries, tiempo_bd, {estado: n}]
+
+    def registrar(self, ruta, metodo, estado, duracion, medicion):
+        clase = f'{estado // 100}xx'
+        indice = bisect_left(BUCKETS, duracion)
+        with self._lock:
+            datos = self._rutas.get((ruta, metodo))
+            if datos is None:
+                datos = self._rutas[(ruta, metodo)] = [[0] * (len(BUCKETS) + 1), 0.0, 0, 0, 0.0, {}]
+            datos[0][indice] += 1
+            datos[1] += duracion
+            datos[2] += 1
+            datos[3] += medicion.queries
+            datos[4] += medicion.tiempo_bd
+            datos[5][clase] = datos[5].get(clase, 0) + 1
+
+    def vaciar(self):
+        with self._lock:
+            self._rutas.clear()
+
+    def resumen(self):
+        """{(ruta, metodo): (peticiones, queries)} (lo usa el benchmark)."""
+        with self._lock:
+            return {clave: (datos[2], datos[3]) for clave, datos in self._rutas.items()}
+
+    def exportar(self):
+        """Texto en formato de exposición de Prometheus (text/plain; version=0.0.4)."""
+        with self._lock:
+            rutas = {clave: [list(d[0]), d[1], d[2], d[3], d[4], dict(d[5])] for clave, d in self._rutas.items()}
+
+        lineas = [
+            '# HELP api_request_duration_seconds Latencia de las peticiones por ruta.',
+            '# TYPE api_request_duration_seconds histogram',
+        ]
+        for (ruta, metodo), (buckets, suma, cuenta, _, _, _) in sorted(rutas.items()):
+            etiquetas = f'route="{ruta}",method="{metodo}"'
+            acumulado = 0
+            for limite, n in zip(BUCKETS + ('+Inf',), buckets):
+                acumulado += n
+                lineas.append(f'api_request_duration_seconds_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+            lineas.append(f'api_request_duration_seconds_sum{{{etiquetas}}} {suma:.6f}')
+            lineas.append(f'api_request_duration_seconds_count{{{etiquetas}}} {cuenta}')
+
+        lineas += [
+            '# HELP api_requests_total Peticiones por ruta y clase de estado HTTP.',
+            '# TYPE api_requests_total counter',
+        ]
+        for (ruta, metodo), datos in sorted(rutas.items()):
+            for clase, n in sorted(datos[5].items()):
+                lineas.append(f'api_requests_total{{route="{ruta}",method="{metodo}",status="{clase}"}} {n}')
+
+        lineas += [
+            '# HELP api_db_queries_total Queries SQL ejecutadas por ruta.',
+            '# TYPE api_db_queries_total counter',
+        ]
+        for (ruta, metodo), datos in sorted(rutas.items()):
+            lineas.append(f'api_db_queries_total{{route="{ruta}",method="{metodo}"}} {datos[3]}')
+
+        lineas += [
+            '# HELP api_db_duration_seconds_total Tiempo en la BD por ruta.',
+            '# TYPE api_db_duration_seconds_total counter',
+        ]
+        for (ruta, metodo), datos in sorted(rutas.items()):
+            lineas.append(f'api_db_duration_seconds_total{{route="{ruta}",method="{metodo}"}} {datos[4]:.6f}')
+
+        return '\n'.join(lineas) + '\n'
+
+
+metricas_rutas = MetricasRutas()
+_medicion = contextvars.ContextVar('api_medicion', default=None)
+
+
+# ==============================================================================
+# 2. CONTEO DE QUERIES (execute_wrapper en cada conexión)
+# ==============================================================================
+def medir_query(execute, sql, params, many, context):
+    medicion = _medicion.get()
+    if medicion is None:
+        # Fuera de una petición (comandos, hilos de fondo): sin costo extra
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracion = time.perf_counter() - inicio
+        medicion.queries += 1
+        medicion.tiempo_bd += duracion
+        if medicion.sql is not None and len(medicion.sql) < MAX_SQL_LENTAS:
+            medicion.sql.append((round(duracion * 1000, 3), sql))
+
+
+def instalar_en_conexion(sender, connection, **kwargs):
+    """Receptor de connection_created: cada conexión nueva pasa por medir_query."""
+    if medir_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(medir_query)
+
+
+# ==============================================================================
+# 3. MIDDLEWARE
+# ==============================================================================
+class MetricasMiddleware:
+    """
+    Mide cada petición: latencia, queries y tiempo en BD, agrupado por el nombre
+    de la ruta (view_name: 'evento-list', 'validar_sensor', ...), no por la URL,
+    para que /api/sensores/15/ y /api/sensores/16/ cuenten como la misma ruta.
+
+    Con METRICAS_LENTO_MS > 0, las peticiones más lentas que eso se escriben en el
+    logger 'api.lentas' con las SQL capturadas.
+
+    Funciona en WSGI y ASGI (el contextvar sigue a la petición entre hilos).
+    En respuestas streaming mide hasta que se devuelven los headers.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.activo = getattr(settings, 'METRICAS_ACTIVAS', True)
+        self.lento = getattr(settings, 'METRICAS_LENTO_MS', 0) / 1000
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        if not self.activo:
+            return self.get_response(request)
+        medicion = Medicion(capturar_sql=self.lento > 0)
+        token = _medicion.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        self._registrar(request, response, time.perf_counter() - inicio, medicion)
+        return response
+
+    async def __acall__(self, request):
+        if not self.activo:
+            return await self.get_response(request)
+        medicion = Medicion(capturar_sql=self.lento > 0)
+        token = _medicion.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        self._registrar(request, response, time.perf_counter() - inicio, medicion)
+        return response
+
+    def _registrar(self, request, response, duracion, medicion):
+        coincidencia = getattr(request, 'resolver_match', None)
+        ruta = coincidencia.view_name if coincidencia is not None else 'sin_ruta'
+        metricas_rutas.registrar(ruta, request.method, response.status_code, duracion, medicion)
+        if self.lento and duracion >= self.lento:
+            logger.warning(
+                "Petición lenta %s %s (%s) %.1f ms, %s queries, %.1f ms en BD\n%s",
+                request.method, request.path, ruta, duracion * 1000,
+                medicion.queries, medicion.tiempo_bd * 1000,
+                '\n'.join(f'  [{ms} ms] {sql}' for ms, sql in medicion.sql),
+            )
+
+
+# ==============================================================================
+# 4. ENDPOINT PROMETHEUS
+# ==============================================================================
+@require_GET
+def vista_metricas(request):
+    """
+    GET /api/metrics/ (formato de texto de Prometheus).
+    Exige 'Authorization: Bearer <METRICAS_TOKEN>'. Sin token configurado sólo
+    responde con DEBUG (las rutas y sus tiempos no son públicos en producción).
+    """
+    token = getattr(settings, 'METRICAS_TOKEN', '')
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponse(status=403)
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    return HttpResponse(metricas_rutas.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
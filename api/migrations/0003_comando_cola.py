@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_evento_id_externo'),
+    ]
+
+    operations = [
+        # Las filas que ya existían son el "último comando" del modelo anterior:
+        # las marcamos como confirmadas para que ninguna barrera las vuelva a ejecutar.
+        migrations.AddField(
+            model_name='comandoremoto',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('reclamado', 'Reclamado'), ('confirmado', 'Confirmado')], default='confirmado', max_length=20),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='comandoremoto',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('reclamado', 'Reclamado'), ('confirmado', 'Confirmado')], default='pendiente', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='comandoremoto',
+            name='fecha_creacion',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='comandoremoto',
+            name='fecha_reclamo',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='comandoremoto',
+            name='fecha_confirmacion',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='comandoremoto',
+            index=models.Index(fields=['dispositivo_id', 'estado', 'id'], name='cmd_disp_estado_idx'),
+        ),
+    ]
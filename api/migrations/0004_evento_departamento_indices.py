@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def copiar_departamento(apps, schema_editor):
+    """Rellena Evento.departamento en los eventos existentes (sensor o, si no, usuario)."""
+    Evento = apps.get_model('api', 'Evento')
+    Sensor = apps.get_model('api', 'Sensor')
+    Usuario = apps.get_model('api', 'Usuario')
+    Evento.objects.filter(departamento__isnull=True).update(
+        departamento_id=Coalesce(
+            Subquery(Sensor.objects.filter(pk=OuterRef('sensor_id')).values('departamento_id')[:1]),
+            Subquery(Usuario.objects.filter(pk=OuterRef('usuario_id')).values('departamento_id')[:1]),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_comando_cola'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='evento',
+            options={'ordering': ['-fecha_hora', '-id']},
+        ),
+        migrations.AddField(
+            model_name='evento',
+            name='departamento',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.departamento'),
+        ),
+        migrations.RunPython(copiar_departamento, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(fields=['fecha_hora', 'id'], name='evt_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(fields=['tipo_evento', 'fecha_hora', 'id'], name='evt_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(fields=['resultado', 'fecha_hora', 'id'], name='evt_resultado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(fields=['sensor', 'fecha_hora', 'id'], name='evt_sensor_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(fields=['usuario', 'fecha_hora', 'id'], name='evt_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(fields=['departamento', 'fecha_hora', 'id'], name='evt_depto_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_evento_departamento_indices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenEventos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora', models.DateTimeField()),
+                ('tipo_evento', models.CharField(max_length=50)),
+                ('resultado', models.CharField(max_length=50)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('clave', models.CharField(max_length=160, unique=True)),
+                ('departamento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.departamento')),
+            ],
+            options={
+                'verbose_name': 'Resumen de eventos por hora',
+                'verbose_name_plural': 'Resúmenes de eventos por hora',
+                'db_table': 'resumen_eventos_hora',
+                'indexes': [models.Index(fields=['hora'], name='resumen_hora_idx'), models.Index(fields=['departamento', 'hora'], name='resumen_depto_hora_idx')],
+            },
+        ),
+    ]
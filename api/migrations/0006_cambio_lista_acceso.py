@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_resumen_eventos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioListaAcceso',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo_sensor', models.CharField(max_length=50)),
+                ('permitido', models.BooleanField()),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Cambio de lista de acceso',
+                'verbose_name_plural': 'Cambios de lista de acceso',
+                'db_table': 'lista_acceso_cambios',
+            },
+        ),
+    ]
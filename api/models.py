@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 # ==============================================================================
 # 1. MODELO DEPARTAMENTO (Tabla 'departamentos')
@@ -9,6 +10,8 @@ class Departamento(models.Model):
     torre = models.CharField(max_length=50, null=True, blank=True)
     condominio = models.CharField(max_length=100, default="Principal")
     piso = models.IntegerField(null=True, blank=True)
+    # Última modificación: la sincronización de la app pide lo cambiado desde aquí
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Depto {self.numero} (Torre {self.torre})"
@@ -18,6 +21,9 @@ class Departamento(models.Model):
         db_table = 'departamentos'  
         verbose_name = "Departamento"
         verbose_name_plural = "Departamentos"
+        indexes = [
+            models.Index(fields=['fecha_actualizacion', 'id'], name='depto_actualizacion_idx'),
+        ]
 
 
 # ==============================================================================
@@ -63,6 +69,8 @@ class Usuario(AbstractUser):
     
     codigo_verificacion = models.CharField(max_length=10, null=True, blank=True)
     fecha_codigo = models.DateTimeField(null=True, blank=True)
+    # Última modificación (sincronización de la app)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     # --- C. Configuración de Login ---
     USERNAME_FIELD = 'username' 
@@ -73,6 +81,9 @@ class Usuario(AbstractUser):
 
     class Meta:
         db_table = 'usuarios' # Tu tabla existente
+        indexes = [
+            models.Index(fields=['fecha_actualizacion', 'id'], name='usuario_actualizacion_idx'),
+        ]
 
 
 # ==============================================================================
@@ -95,6 +106,8 @@ class Sensor(models.Model):
 
     fecha_alta = models.DateTimeField(auto_now_add=True)
     fecha_baja = models.DateTimeField(null=True, blank=True)
+    # Última modificación (sincronización de la app)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.codigo_sensor} - {self.estado}"
@@ -102,6 +115,9 @@ class Sensor(models.Model):
     class Meta:
         db_table = 'sensores' # Aseguramos que lea la tabla correcta
         verbose_name = "Sensor RFID"
+        indexes = [
+            models.Index(fields=['fecha_actualizacion', 'id'], name='sensor_actualizacion_idx'),
+        ]
 
 
 # ==============================================================================
@@ -112,14 +128,41 @@ class Evento(models.Model):
 
     sensor = models.ForeignKey(Sensor, on_delete=models.SET_NULL, null=True, blank=True)
     usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True)
+    # Depto al momento del evento (copiado del sensor o del usuario al guardar).
+    # Así el historial se filtra por depto con un índice, sin JOIN.
+    departamento = models.ForeignKey(Departamento, on_delete=models.SET_NULL, null=True, blank=True)
     
     tipo_evento = models.CharField(max_length=50, choices=TIPOS_EVENTO)
     resultado = models.CharField(max_length=50)
-    fecha_hora = models.DateTimeField(auto_now_add=True)
+    # No editable desde la API normal (nadie falsea la fecha), pero la ingesta por
+    # lotes puede conservar la hora real del evento que la barrera tenía en buffer.
+    fecha_hora = models.DateTimeField(default=timezone.now, editable=False)
+
+    # ID generado por el dispositivo: si reenvía el mismo evento no se duplica
+    id_externo = models.CharField(max_length=64, unique=True, null=True, blank=True)
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.departamento_id is None:
+            if self.sensor_id is not None and self.sensor.departamento_id is not None:
+                self.departamento_id = self.sensor.departamento_id
+            elif self.usuario_id is not None:
+                self.departamento_id = self.usuario.departamento_id
+        super().save(*args, **kwargs)
 
     class Meta:
         db_table = 'eventos_acceso' # Ajusta si tu tabla se llama diferente
-        ordering = ['-fecha_hora']
+        # El id desempata eventos del mismo instante (paginación por cursor estable)
+        ordering = ['-fecha_hora', '-id']
+        indexes = [
+            # Un índice compuesto por cada filtro del historial, terminando en
+            # (fecha_hora, id) para que cada página se lea directo del índice.
+            models.Index(fields=['fecha_hora', 'id'], name='evt_fecha_id_idx'),
+            models.Index(fields=['tipo_evento', 'fecha_hora', 'id'], name='evt_tipo_fecha_idx'),
+            models.Index(fields=['resultado', 'fecha_hora', 'id'], name='evt_resultado_fecha_idx'),
+            models.Index(fields=['sensor', 'fecha_hora', 'id'], name='evt_sensor_fecha_idx'),
+            models.Index(fields=['usuario', 'fecha_hora', 'id'], name='evt_usuario_fecha_idx'),
+            models.Index(fields=['departamento', 'fecha_hora', 'id'], name='evt_depto_fecha_idx'),
+        ]
 
 
 # ==============================================================================
@@ -127,10 +170,87 @@ class Evento(models.Model):
 # ==============================================================================
 class ComandoRemoto(models.Model):
     COMANDOS = (('ABRIR', 'ABRIR'), ('CERRAR', 'CERRAR'), ('NINGUNO', 'NINGUNO'))
+    # Cola por dispositivo: cada comando se agrega como fila nueva, la barrera lo
+    # reclama (pendiente -> reclamado) y luego confirma que lo ejecutó.
+    ESTADOS = (('pendiente', 'Pendiente'), ('reclamado', 'Reclamado'), ('confirmado', 'Confirmado'))
 
     dispositivo_id = models.CharField(max_length=50, default="BARRERA_PRINCIPAL")
     comando = models.CharField(max_length=20, choices=COMANDOS, default='NINGUNO')
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_reclamo = models.DateTimeField(null=True, blank=True)
+    fecha_confirmacion = models.DateTimeField(null=True, blank=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     class Meta:
-        db_table = 'comandos_remotos' # Ajusta nombre
\ No newline at end of file
+        db_table = 'comandos_remotos' # Ajusta nombre
+        indexes = [
+            # "Próximo pendiente de este dispositivo" sin recorrer la tabla
+            models.Index(fields=['dispositivo_id', 'estado', 'id'], name='cmd_disp_estado_idx'),
+        ]
+
+
+# ==============================================================================
+# 6. RESUMEN DE EVENTOS POR HORA (Tabla 'resumen_eventos_hora')
+# ==============================================================================
+class ResumenEventos(models.Model):
+    """
+    Conteo de eventos por hora x departamento x tipo_evento x resultado.
+    Se actualiza al escribir cada evento (api/resumenes.py), así los dashboards
+    suman unas pocas filas por hora en vez de recorrer eventos_acceso.
+    """
+    hora = models.DateTimeField()  # Inicio de la hora (UTC)
+    departamento = models.ForeignKey(Departamento, on_delete=models.SET_NULL, null=True, blank=True)
+    tipo_evento = models.CharField(max_length=50)
+    resultado = models.CharField(max_length=50)
+    total = models.PositiveIntegerField(default=0)
+    # hora|depto|tipo|resultado: única también cuando departamento es NULL
+    # (un UNIQUE sobre columnas NULL no evita duplicados en MySQL/SQLite)
+    clave = models.CharField(max_length=160, unique=True)
+
+    class Meta:
+        db_table = 'resumen_eventos_hora'
+        verbose_name = "Resumen de eventos por hora"
+        verbose_name_plural = "Resúmenes de eventos por hora"
+        indexes = [
+            models.Index(fields=['hora'], name='resumen_hora_idx'),
+            models.Index(fields=['departamento', 'hora'], name='resumen_depto_hora_idx'),
+        ]
+
+
+
+# ==============================================================================
+# 7. CAMBIOS DE LA LISTA DE ACCESO OFFLINE (Tabla 'lista_acceso_cambios')
+# ==============================================================================
+class CambioListaAcceso(models.Model):
+    """
+    Registro de altas/bajas de códigos permitidos. El id es la "versión" de la
+    lista: la barrera guarda la última versión que aplicó y pide solo los cambios
+    posteriores (ver api/lista_acceso.py).
+    """
+    codigo_sensor = models.CharField(max_length=50)
+    permitido = models.BooleanField()
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'lista_acceso_cambios'
+        verbose_name = "Cambio de lista de acceso"
+        verbose_name_plural = "Cambios de lista de acceso"
+
+
+# ==============================================================================
+# 8. ELIMINACIONES (Tabla 'eliminaciones')
+# ==============================================================================
+class Eliminacion(models.Model):
+    """
+    "Lápida" de cada fila borrada de los modelos que sincroniza la app, para que
+    pueda quitarla de su cache offline (ver api/sincronizacion.py).
+    """
+    modelo = models.CharField(max_length=30)  # 'departamentos', 'usuarios', 'sensores', 'eventos'
+    objeto_id = models.BigIntegerField()
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'eliminaciones'
+        verbose_name = "Eliminación"
+        verbose_name_plural = "Eliminaciones"
@@ -0,0 +1,129 @@
+import base64
+from collections import OrderedDict
+from itertools import islice
+
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .archivo_eventos import archivo_eventos, a_evento, mezclar
+
+
+# ==============================================================================
+# PAGINACIÓN POR CURSOR (KEYSET) PARA EL HISTORIAL DE EVENTOS
+# ==============================================================================
+class CursorEventosPagination(BasePagination):
+    """
+    Paginación keyset sobre (fecha_hora, id), de más nuevo a más antiguo.
+
+    En vez de OFFSET (que recorre todas las filas anteriores), cada página pide
+    "los N eventos anteriores a (fecha_hora, id) del último que vi". Con el
+    índice (…, fecha_hora, id) eso cuesta lo mismo en la página 1 que en la 10.000.
+
+    Respuesta: {"next": <url o null>, "results": [...]}
+    Parámetros: ?cursor=<opaco>&page_size=<1..500>
+
+    Si la vista define filtros_archivo(), la página sigue con los eventos ya
+    movidos a archivo (api/archivo_eventos.py) cuando la BD no alcanza a llenarla.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 500
+    invalid_cursor_message = 'Cursor inválido.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by('-fecha_hora', '-id')
+        posicion = self.decode_cursor(request)
+        if posicion is not None:
+            fecha, pk = posicion
+            queryset = queryset.filter(Q(fecha_hora__lt=fecha) | Q(fecha_hora=fecha, id__lt=pk))
+
+        # Pedimos uno extra para saber si hay página siguiente sin hacer COUNT(*)
+        resultados = list(queryset[:self.page_size + 1])
+        if view is not None and hasattr(view, 'filtros_archivo'):
+            resultados = self.completar_con_archivo(resultados, queryset, view.filtros_archivo(), posicion)
+        self.has_next = len(resultados) > self.page_size
+        self.page = resultados[:self.page_size]
+        return self.page
+
+    def completar_con_archivo(self, resultados, queryset, filtros, posicion):
+        fecha_maxima = archivo_eventos.fecha_maxima()
+        if fecha_maxima is None:
+            return resultados
+        # La BD llenó la página con eventos más nuevos que todo el archivo
+        if len(resultados) > self.page_size and resultados[-1].fecha_hora > fecha_maxima:
+            return resultados
+
+        archivados = (a_evento(fila) for fila in archivo_eventos.iterar(filtros, posicion))
+        resultados = list(islice(
+            mezclar(resultados, archivados, clave=lambda evento: (evento.fecha_hora, evento.pk)),
+            self.page_size + 1,
+        ))
+        # Las relaciones de ?expand= (select_related en la BD) se cargan en bloque
+        relaciones = queryset.query.select_related
+        sin_cargar = [evento for evento in resultados if evento._state.adding]
+        if sin_cargar and isinstance(relaciones, dict):
+            prefetch_related_objects(sin_cargar, *relaciones)
+        return resultados
+
+    def get_page_size(self, request):
+        try:
+            tamano = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(tamano, self.max_page_size))
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            texto = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('ascii')
+            fecha, pk = texto.rsplit('|', 1)
+            fecha = parse_datetime(fecha)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            fecha = None
+        if fecha is None:
+            # 400 y no 404: el cursor viene del cliente (alterado o de otra versión)
+            raise ValidationError({self.cursor_query_param: [self.invalid_cursor_message]})
+        if timezone.is_naive(fecha):
+            # Se compara con fechas con zona (BD y archivo)
+            fecha = timezone.make_aware(fecha)
+        return fecha, pk
+
+    def encode_cursor(self, fecha, pk):
+        texto = f"{fecha.isoformat()}|{pk}"
+        return base64.urlsafe_b64encode(texto.encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        ultimo = self.page[-1]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(ultimo.fecha_hora, ultimo.pk))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
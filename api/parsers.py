@@ -0,0 +1,62 @@
+import csv
+import io
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+# ==============================================================================
+# PARSER NDJSON (un objeto JSON por línea)
+# ==============================================================================
+class NDJSONParser(BaseParser):
+    """
+    Content-Type: application/x-ndjson
+    Lo usan las barreras para reenviar los eventos que guardaron sin conexión:
+    pueden escribir línea por línea sin armar un arreglo JSON gigante.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        filas = []
+        if stream is None:
+            return filas
+        for numero, linea in enumerate(stream, start=1):
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                filas.append(json.loads(linea))
+            except ValueError as exc:
+                raise ParseError(f"NDJSON inválido en la línea {numero}: {exc}")
+        return filas
+
+
+# ==============================================================================
+# PARSER CSV (importaciones masivas)
+# ==============================================================================
+class CSVParser(BaseParser):
+    """
+    Content-Type: text/csv
+    La primera fila son los nombres de columna; devuelve una lista de dicts.
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return []
+        try:
+            texto = stream.read().decode('utf-8-sig')  # utf-8-sig: tolera el BOM de Excel
+        except UnicodeDecodeError as exc:
+            raise ParseError(f"El CSV debe estar en UTF-8: {exc}")
+        return leer_csv(texto)
+
+
+def leer_csv(texto):
+    """Lista de dicts a partir del texto CSV (celdas vacías -> None)."""
+    lector = csv.DictReader(io.StringIO(texto))
+    return [
+        {clave.strip(): (valor.strip() or None) if isinstance(valor, str) else valor
+         for clave, valor in fila.items() if clave}
+        for fila in lector
+    ]
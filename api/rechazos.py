@@ -0,0 +1,182 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from .models import Sensor
+
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# 1. CONTADORES EN VENTANA DESLIZANTE (anillo de buckets por clave)
+# ==============================================================================
+class VentanaDeslizante:
+    """
+    Cuántas veces ocurrió algo por clave en los últimos `ventana` segundos.
+
+    Cada clave tiene un anillo de `buckets` contadores de ventana/buckets
+    segundos y el total de la ventana. Sumar sólo limpia los buckets vencidos
+    desde la última vez, así que cuesta O(1) (como máximo `buckets` pasos).
+    No hace falta ninguna query a eventos_acceso.
+
+    La memoria está acotada: las claves se guardan en orden de uso (LRU) y al
+    pasar `max_claves` se descartan las menos usadas. Esas claves llevan
+    inactivas más que las demás, y una clave inactiva por una ventana entera
+    ya vale 0.
+    """
+
+    def __init__(self, ventana=60, buckets=12, max_claves=50_000):
+        self.buckets = buckets
+        self.ancho = ventana / buckets
+        self.max_claves = max_claves
+        self._lock = threading.Lock()
+        self._claves = OrderedDict()   # clave -> [anillo, ultimo_tick, total]
+
+    def sumar(self, clave, cantidad=1, ahora=None):
+        """Suma `cantidad` a la clave y devuelve su total en la ventana."""
+        tick = int((ahora if ahora is not None else time.monotonic()) // self.ancho)
+        with self._lock:
+            estado = self._claves.get(clave)
+            if estado is None:
+                estado = self._claves[clave] = [[0] * self.buckets, tick, 0]
+                while len(self._claves) > self.max_claves:
+                    self._claves.popitem(last=False)
+            else:
+                self._claves.move_to_end(clave)
+                self._avanzar(estado, tick)
+            estado[0][tick % self.buckets] += cantidad
+            estado[2] += cantidad
+            return estado[2]
+
+    def total(self, clave, ahora=None):
+        tick = int((ahora if ahora is not None else time.monotonic()) // self.ancho)
+        with self._lock:
+            estado = self._claves.get(clave)
+            if estado is None:
+                return 0
+            self._avanzar(estado, tick)
+            return estado[2]
+
+    def reiniciar(self, clave):
+        with self._lock:
+            self._claves.pop(clave, None)
+
+    def vaciar(self):
+        with self._lock:
+            self._claves.clear()
+
+    def __len__(self):
+        return len(self._claves)
+
+    def _avanzar(self, estado, tick):
+        anillo, ultimo, _ = estado
+        if tick - ultimo >= self.buckets:
+            # Pasó una ventana entera sin actividad
+            anillo[:] = [0] * self.buckets
+            estado[2] = 0
+        else:
+            for vencido in range(ultimo + 1, tick + 1):
+                estado[2] -= anillo[vencido % self.buckets]
+                anillo[vencido % self.buckets] = 0
+        estado[1] = max(ultimo, tick)
+
+
+# ==============================================================================
+# 2. DETECTOR DE RÁFAGAS DE ACCESOS RECHAZADOS
+# ==============================================================================
+class DetectorRechazos:
+    """
+    Cuenta los ACCESO_RECHAZADO por sensor y por dispositivo (barrera) a medida
+    que se escriben los eventos (validar_sensor, ingerir_eventos, buffer).
+
+    - Un sensor con RECHAZOS_UMBRAL_SENSOR rechazos en RECHAZOS_VENTANA segundos
+      pasa a estado 'bloqueado' con save(), así las señales invalidan el índice,
+      la lista offline y la sincronización de la app.
+    - Un dispositivo con RECHAZOS_UMBRAL_DISPOSITIVO rechazos en la ventana
+      recibe 429 en las rutas de dispositivos hasta que la ventana se enfríe
+      (ver ThrottleRechazosDispositivo).
+
+    Los contadores son por proceso: con varios workers cada uno cuenta lo suyo.
+    Un umbral en 0 desactiva esa regla.
+    """
+
+    def __init__(self):
+        self._sensores = None
+        self._dispositivos = None
+
+    def _ventanas(self):
+        if self._sensores is None:
+            ventana = getattr(settings, 'RECHAZOS_VENTANA', 60)
+            max_claves = getattr(settings, 'RECHAZOS_MAX_CLAVES', 50_000)
+            self._sensores = VentanaDeslizante(ventana, max_claves=max_claves)
+            self._dispositivos = VentanaDeslizante(ventana, max_claves=max_claves)
+        return self._sensores, self._dispositivos
+
+    def registrar(self, sensores, dispositivo_id=None):
+        """
+        Suma rechazos: `sensores` tiene un sensor_id por evento rechazado (None
+        si el tag no está registrado: cuenta sólo para el dispositivo).
+        Devuelve los sensor_id que acaban de pasar el umbral (hay que bloquearlos
+        con bloquear_sensores(), que toca la BD).
+        """
+        por_sensor, por_dispositivo = self._ventanas()
+        umbral = getattr(settings, 'RECHAZOS_UMBRAL_SENSOR', 10)
+        cantidad, superados = 0, []
+        for sensor_id in sensores:
+            cantidad += 1
+            if sensor_id is None or not umbral:
+                continue
+            if por_sensor.sumar(sensor_id) >= umbral:
+                # Se reinicia: el siguiente aviso requiere otra ráfaga completa
+                por_sensor.reiniciar(sensor_id)
+                superados.append(sensor_id)
+        if dispositivo_id and cantidad:
+            por_dispositivo.sumar(dispositivo_id, cantidad)
+        return superados
+
+    def dispositivo_bloqueado(self, dispositivo_id):
+        umbral = getattr(settings, 'RECHAZOS_UMBRAL_DISPOSITIVO', 30)
+        if not umbral or not dispositivo_id:
+            return False
+        return self._ventanas()[1].total(dispositivo_id) >= umbral
+
+    def vaciar(self):
+        self._sensores = self._dispositivos = None
+
+
+def bloquear_sensores(ids):
+    """Pasa a 'bloqueado' los sensores activos de `ids`. Devuelve cuántos cambió."""
+    bloqueados = 0
+    for sensor in Sensor.objects.filter(pk__in=set(ids), estado='activo'):
+        sensor.estado = 'bloqueado'
+        sensor.save(update_fields=['estado', 'fecha_actualizacion'])
+        logger.warning("Sensor %s bloqueado por ráfaga de accesos rechazados", sensor.codigo_sensor)
+        bloqueados += 1
+    return bloqueados
+
+
+# Instancia única por proceso
+detector_rechazos = DetectorRechazos()
+
+
+# ==============================================================================
+# 3. THROTTLE DE DISPOSITIVOS
+# ==============================================================================
+class ThrottleRechazosDispositivo(BaseThrottle):
+    """
+    Throttle de DRF para las rutas de dispositivos: 429 mientras la barrera
+    supere RECHAZOS_UMBRAL_DISPOSITIVO rechazos en la ventana. El dispositivo
+    sale de la URL (<dispositivo_id>) o del header X-Dispositivo-Id.
+    Las vistas async de dispositivos hacen la misma consulta a mano.
+    """
+
+    def allow_request(self, request, view):
+        dispositivo_id = view.kwargs.get('dispositivo_id') or request.headers.get('X-Dispositivo-Id')
+        return not detector_rechazos.dispositivo_bloqueado(dispositivo_id)
+
+    def wait(self):
+        return getattr(settings, 'RECHAZOS_VENTANA', 60)
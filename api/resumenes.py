@@ -0,0 +1,186 @@
+from collections import Counter
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from rest_framework.exceptions import ValidationError
+
+from .archivo_eventos import archivo_eventos
+from .models import Evento, ResumenEventos
+
+
+# ==============================================================================
+# 1. MANTENCIÓN INCREMENTAL DEL RESUMEN POR HORA
+# ==============================================================================
+def inicio_de_hora(fecha):
+    """Trunca a la hora en UTC (Chile tiene offsets de horas completas, así que
+    las horas UTC calzan con las horas locales)."""
+    return fecha.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def clave_resumen(hora, departamento_id, tipo_evento, resultado):
+    return f"{hora:%Y%m%d%H}|{departamento_id or 0}|{tipo_evento}|{resultado}"
+
+
+def sumar_eventos(eventos):
+    """
+    Suma una lista de Evento (recién insertados) a sus buckets de ResumenEventos.
+    Hace un UPDATE ... total = total + n por bucket distinto (no por evento).
+    """
+    conteos = Counter(
+        (inicio_de_hora(e.fecha_hora), e.departamento_id, e.tipo_evento, e.resultado)
+        for e in eventos
+    )
+    for (hora, departamento_id, tipo_evento, resultado), cantidad in conteos.items():
+        _sumar_bucket(hora, departamento_id, tipo_evento, resultado, cantidad)
+
+
+def restar_eventos(eventos):
+    """
+    Descuenta de sus buckets eventos que se borraron o cambiaron (API, admin).
+    Un bucket que queda en 0 se borra. Si el bucket ya no tiene esos eventos
+    (desfase previo) queda en 0: recalcular_resumenes lo corrige.
+    """
+    conteos = Counter(
+        (inicio_de_hora(e.fecha_hora), e.departamento_id, e.tipo_evento, e.resultado)
+        for e in eventos
+    )
+    for (hora, departamento_id, tipo_evento, resultado), cantidad in conteos.items():
+        clave = clave_resumen(hora, departamento_id, tipo_evento, resultado)
+        buckets = ResumenEventos.objects.filter(clave=clave)
+        if not buckets.filter(total__gte=cantidad).update(total=F('total') - cantidad):
+            buckets.update(total=0)
+        buckets.filter(total=0).delete()
+
+
+def _sumar_bucket(hora, departamento_id, tipo_evento, resultado, cantidad):
+    clave = clave_resumen(hora, departamento_id, tipo_evento, resultado)
+    if ResumenEventos.objects.filter(clave=clave).update(total=F('total') + cantidad):
+        return
+    try:
+        with transaction.atomic():
+            ResumenEventos.objects.create(
+                clave=clave, hora=hora, departamento_id=departamento_id,
+                tipo_evento=tipo_evento, resultado=resultado, total=cantidad,
+            )
+    except IntegrityError:
+        # Otro proceso creó el bucket entre el UPDATE y el INSERT
+        ResumenEventos.objects.filter(clave=clave).update(total=F('total') + cantidad)
+
+
+def recalcular_resumenes(desde=None, hasta=None, tamano_lote=1000):
+    """
+    Reconstruye los buckets de [desde, hasta) a partir de eventos_acceso con un
+    GROUP BY en la BD. Sirve para el backfill inicial o para corregir desfases.
+    Las horas ya archivadas (api/archivo_eventos.py) no se tocan: sus eventos
+    ya no están en la BD. Devuelve la cantidad de buckets escritos.
+    """
+    archivado_hasta = archivo_eventos.archivado_hasta()
+    if archivado_hasta is not None and (desde is None or desde < archivado_hasta):
+        desde = archivado_hasta
+    eventos = Evento.objects.all()
+    resumenes = ResumenEventos.objects.all()
+    if desde is not None:
+        desde = inicio_de_hora(desde)
+        eventos = eventos.filter(fecha_hora__gte=desde)
+        resumenes = resumenes.filter(hora__gte=desde)
+    if hasta is not None:
+        hasta = inicio_de_hora(hasta)
+        eventos = eventos.filter(fecha_hora__lt=hasta)
+        resumenes = resumenes.filter(hora__lt=hasta)
+
+    filas = (
+        eventos
+        .order_by()
+        .annotate(bucket=TruncHour('fecha_hora', tzinfo=dt_timezone.utc))
+        .values('bucket', 'departamento_id', 'tipo_evento', 'resultado')
+        .annotate(cantidad=Count('id'))
+    )
+
+    escritos = 0
+    with transaction.atomic():
+        resumenes.delete()
+        lote = []
+        for fila in filas.iterator(chunk_size=tamano_lote):
+            lote.append(ResumenEventos(
+                clave=clave_resumen(fila['bucket'], fila['departamento_id'], fila['tipo_evento'], fila['resultado']),
+                hora=fila['bucket'],
+                departamento_id=fila['departamento_id'],
+                tipo_evento=fila['tipo_evento'],
+                resultado=fila['resultado'],
+                total=fila['cantidad'],
+            ))
+            if len(lote) >= tamano_lote:
+                ResumenEventos.objects.bulk_create(lote)
+                escritos += len(lote)
+                lote = []
+        ResumenEventos.objects.bulk_create(lote)
+        escritos += len(lote)
+    return escritos
+
+
+# ==============================================================================
+# 2. CONSULTAS PARA EL DASHBOARD
+# ==============================================================================
+# ?agrupar= -> expresión sobre ResumenEventos
+AGRUPACIONES = {
+    'hora': F('hora'),
+    'dia': TruncDate('hora'),  # Día en la zona horaria local (TIME_ZONE)
+    'departamento': F('departamento__numero'),
+    'torre': F('departamento__torre'),
+    'condominio': F('departamento__condominio'),
+    'tipo_evento': F('tipo_evento'),
+    'resultado': F('resultado'),
+}
+# ?<filtro>= -> campo de ResumenEventos
+FILTROS_RESUMEN = {
+    'departamento': 'departamento_id',
+    'torre': 'departamento__torre',
+    'condominio': 'departamento__condominio',
+    'tipo_evento': 'tipo_evento',
+    'resultado': 'resultado',
+}
+FILTROS_RESUMEN_NUMERICOS = {'departamento'}
+
+
+def estadisticas(desde, hasta, agrupar=(), filtros=None):
+    """
+    Totales de eventos en [desde, hasta) agrupados por `agrupar`.
+    Lee solo ResumenEventos: el costo depende de la cantidad de buckets, no de
+    eventos. El rango se ajusta a horas completas (la resolución del resumen).
+    """
+    desconocidos = set(agrupar) - set(AGRUPACIONES)
+    if desconocidos:
+        raise ValidationError({"agrupar": [f"Valores permitidos: {', '.join(AGRUPACIONES)}."]})
+
+    desde = inicio_de_hora(desde)
+    if inicio_de_hora(hasta) != hasta:
+        hasta = inicio_de_hora(hasta) + timedelta(hours=1)
+
+    consulta = ResumenEventos.objects.filter(hora__gte=desde, hora__lt=hasta)
+    for parametro, valor in (filtros or {}).items():
+        if parametro in FILTROS_RESUMEN_NUMERICOS:
+            try:
+                valor = int(valor)
+            except ValueError:
+                raise ValidationError({parametro: ["Debe ser un ID numérico."]})
+        consulta = consulta.filter(**{FILTROS_RESUMEN[parametro]: valor})
+
+    if agrupar:
+        # Alias con prefijo: 'hora', 'departamento', etc. chocan con campos del modelo
+        alias = {f'g_{nombre}': AGRUPACIONES[nombre] for nombre in agrupar}
+        consulta = (
+            consulta
+            .values(**alias)
+            .annotate(total=Sum('total'))
+            .order_by(*alias)
+        )
+        resultados = [
+            {**{nombre: fila[f'g_{nombre}'] for nombre in agrupar}, "total": fila['total']}
+            for fila in consulta
+        ]
+    else:
+        resultados = [{"total": consulta.aggregate(total=Sum('total'))['total'] or 0}]
+
+    return {"desde": desde, "hasta": hasta, "resultados": resultados}
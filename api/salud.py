@@ -0,0 +1,126 @@
+import threading
+import time
+import weakref
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from .buffer_eventos import buffer_eventos
+
+
+# ==============================================================================
+# 1. CONEXIONES DE ESTE PROCESO
+# ==============================================================================
+# Django no tiene pool para MySQL: cada hilo tiene su conexión (CONN_MAX_AGE).
+# El "pool" del proceso son esas conexiones; las seguimos con connection_created.
+_lock = threading.Lock()
+_conexiones = weakref.WeakSet()     # DatabaseWrapper (uno por hilo y alias) que abrió una conexión
+_aperturas = Counter()              # alias -> conexiones abiertas desde que arrancó el proceso
+
+
+def registrar_conexion(sender, connection, **kwargs):
+    """Receptor de connection_created (se conecta en api/apps.py)."""
+    with _lock:
+        _conexiones.add(connection)
+        _aperturas[connection.alias] += 1
+
+
+def conexiones_proceso(alias):
+    """
+    - abiertas: conexiones a `alias` que los hilos de este proceso tienen abiertas.
+    - en_transaccion: de ésas, cuántas están dentro de un atomic() ahora mismo.
+    - aperturas: cuántas veces se abrió una conexión; si crece con cada petición,
+      no se están reutilizando (CONN_MAX_AGE=0 o ASGI).
+    """
+    with _lock:
+        vivas = [conexion for conexion in _conexiones
+                 if conexion.alias == alias and conexion.connection is not None]
+        aperturas = _aperturas[alias]
+    return {
+        'abiertas': len(vivas),
+        'en_transaccion': sum(1 for conexion in vivas if conexion.in_atomic_block),
+        'aperturas': aperturas,
+    }
+
+
+# ==============================================================================
+# 2. BASE DE DATOS (ida y vuelta + uso de conexiones)
+# ==============================================================================
+def revisar_bd(alias):
+    """
+    SELECT 1 contra `alias` con la conexión de este hilo.
+    - reutilizada: la conexión ya estaba abierta (CONN_MAX_AGE funcionando);
+      si no, conexion_ms es lo que costó abrirla.
+    - proceso: conexiones de este worker (ver conexiones_proceso).
+    - conexiones/max_conexiones (sólo MySQL): cuántas conexiones tiene el
+      servidor ocupadas de su máximo, sumando todos los workers.
+    """
+    conexion = connections[alias]
+    datos = {
+        'motor': conexion.vendor,
+        'conn_max_age': conexion.settings_dict.get('CONN_MAX_AGE'),
+        'reutilizada': conexion.connection is not None,
+    }
+    try:
+        inicio = time.perf_counter()
+        conexion.ensure_connection()
+        datos['conexion_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+
+        with conexion.cursor() as cursor:
+            inicio = time.perf_counter()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            datos['ping_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+
+            if conexion.vendor == 'mysql':
+                cursor.execute("SHOW GLOBAL STATUS LIKE 'Threads_connected'")
+                datos['conexiones'] = int(cursor.fetchone()[1])
+                cursor.execute('SELECT @@max_connections')
+                datos['max_conexiones'] = int(cursor.fetchone()[0])
+                datos['uso'] = round(datos['conexiones'] / datos['max_conexiones'], 3)
+    except DatabaseError as error:
+        datos['error'] = str(error)
+    datos['proceso'] = conexiones_proceso(alias)
+    return datos
+
+
+# ==============================================================================
+# 3. PREPARACIÓN DEL WORKER (GET /api/ready/)
+# ==============================================================================
+def estado_preparacion():
+    """
+    Revisa todas las BD configuradas (primaria y réplicas) y el buffer de eventos.
+    Devuelve (listo, datos): listo es False si algo pasa los umbrales SALUD_*
+    (un umbral en 0 desactiva esa regla), y datos['problemas'] dice qué.
+    """
+    problemas = []
+    bd = {}
+    ping_max = getattr(settings, 'SALUD_BD_PING_MAX_MS', 250)
+    uso_max = getattr(settings, 'SALUD_BD_USO_MAX', 0.9)
+    for alias in settings.DATABASES:
+        bd[alias] = datos = revisar_bd(alias)
+        if 'error' in datos:
+            problemas.append(f'{alias}: sin conexión')
+        elif ping_max and datos['ping_ms'] > ping_max:
+            problemas.append(f'{alias}: ping {datos["ping_ms"]} ms > {ping_max} ms')
+        elif uso_max and datos.get('uso', 0) > uso_max:
+            problemas.append(f'{alias}: {datos["conexiones"]}/{datos["max_conexiones"]} conexiones ocupadas')
+
+    buffer = {'habilitado': settings.EVENTOS_BUFFER_ACTIVO}
+    if settings.EVENTOS_BUFFER_ACTIVO:
+        metricas = buffer_eventos.metricas()
+        buffer.update({campo: metricas[campo] for campo in (
+            'en_cola', 'capacidad', 'antiguedad_s', 'desbordadas_pendientes', 'errores_flush',
+        )})
+        buffer['uso'] = round(metricas['en_cola'] / metricas['capacidad'], 3) if metricas['capacidad'] else 0
+        cola_max = getattr(settings, 'SALUD_BUFFER_USO_MAX', 0.8)
+        antiguedad_max = getattr(settings, 'SALUD_BUFFER_ANTIGUEDAD_MAX', 30)
+        if cola_max and buffer['uso'] > cola_max:
+            problemas.append(f'buffer: cola al {buffer["uso"]:.0%}')
+        if antiguedad_max and metricas['antiguedad_s'] > antiguedad_max:
+            problemas.append(f'buffer: evento más viejo en cola de {metricas["antiguedad_s"]} s')
+        if metricas['desbordadas_pendientes']:
+            problemas.append(f'buffer: {metricas["desbordadas_pendientes"]} eventos desbordados a disco')
+
+    return not problemas, {'bd': bd, 'buffer': buffer, 'problemas': problemas}
@@ -1,14 +1,89 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from .models import Usuario, Departamento, Sensor, Evento, ComandoRemoto
 
+
+# 0. EXPANSIÓN OPCIONAL DE RELACIONES (?expand=usuario,departamento)
+def campos_expandidos(request, permitidos):
+    """Devuelve qué relaciones de `permitidos` pidió el cliente en ?expand=."""
+    if request is None or request.method not in SAFE_METHODS:
+        return set()
+    pedidos = request.query_params.get('expand', '')
+    return {campo.strip() for campo in pedidos.split(',')} & set(permitidos)
+
+
+class ExpandibleMixin:
+    """
+    Por defecto las FK salen como id. Con ?expand=<campo> (solo en GET) se
+    reemplazan por el objeto anidado definido en `expandibles`.
+    El viewset debe hacer select_related de esas mismas relaciones (ver
+    ExpandibleViewSetMixin) para que no haya una query por fila.
+    """
+    expandibles = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for campo in campos_expandidos(self.context.get('request'), self.expandibles):
+            self.fields[campo] = self.expandibles[campo](read_only=True)
+
+
+# 0b. CAMPOS A PEDIDO (?fields=id,numero / ?omit=groups,user_permissions)
+def campos_pedidos(request):
+    """(fields, omit) pedidos en la URL (solo en GET). fields=None significa todos."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None, set()
+    params = request.query_params
+    fields = {campo.strip() for campo in params.get('fields', '').split(',') if campo.strip()}
+    omit = {campo.strip() for campo in params.get('omit', '').split(',') if campo.strip()}
+    return fields or None, omit
+
+
+def campos_visibles(nombres, request):
+    """Los `nombres` que quedan en la respuesta después de ?fields= y ?omit=."""
+    fields, omit = campos_pedidos(request)
+    return {nombre for nombre in nombres if (fields is None or nombre in fields) and nombre not in omit}
+
+
+class CamposDinamicosMixin:
+    """
+    Con ?fields=a,b el JSON trae solo esos campos; con ?omit=c,d trae todos menos esos.
+    Solo aplica al serializer principal (no a los anidados de ?expand=).
+    El viewset carga solo esas columnas con .only() (ver CamposViewSetMixin).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields, omit = campos_pedidos(self.context.get('request'))
+        if fields is None and not omit:
+            return
+        for nombre in list(self.fields):
+            if (fields is not None and nombre not in fields) or nombre in omit:
+                self.fields.pop(nombre)
+
+
+# Versiones resumidas para anidar (sin datos sensibles ni relaciones M2M)
+class UsuarioResumenSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Usuario
+        fields = ['id', 'username', 'nombres', 'apellidos', 'rut', 'rol', 'estado', 'departamento']
+
+
+class SensorResumenSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Sensor
+        fields = ['id', 'codigo_sensor', 'estado', 'tipo']
+
+
 # 1. Serializador de DEPARTAMENTOS
-class DepartamentoSerializer(serializers.ModelSerializer):
+class DepartamentoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Departamento
         fields = '__all__'
 
 # 2. Serializador de USUARIOS
-class UsuarioSerializer(serializers.ModelSerializer):
+class UsuarioSerializer(CamposDinamicosMixin, ExpandibleMixin, serializers.ModelSerializer):
+    expandibles = {'departamento': DepartamentoSerializer}
+
     class Meta:
         model = Usuario
         # Listamos los campos que queremos ver en el JSON
@@ -23,19 +98,55 @@ class UsuarioSerializer(serializers.ModelSerializer):
         return user
 
 # 3. Serializador de SENSORES
-class SensorSerializer(serializers.ModelSerializer):
+class SensorSerializer(CamposDinamicosMixin, ExpandibleMixin, serializers.ModelSerializer):
+    expandibles = {'usuario': UsuarioResumenSerializer, 'departamento': DepartamentoSerializer}
+
     class Meta:
         model = Sensor
         fields = '__all__'
 
 # 4. Serializador de EVENTOS
-class EventoSerializer(serializers.ModelSerializer):
+class EventoSerializer(CamposDinamicosMixin, ExpandibleMixin, serializers.ModelSerializer):
+    expandibles = {
+        'sensor': SensorResumenSerializer,
+        'usuario': UsuarioResumenSerializer,
+        'departamento': DepartamentoSerializer,
+    }
+
     class Meta:
         model = Evento
         fields = '__all__'
 
 # 5. Serializador de COMANDOS REMOTOS
-class ComandoRemotoSerializer(serializers.ModelSerializer):
+class ComandoRemotoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = ComandoRemoto
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        # El estado lo mueve la barrera al reclamar/confirmar, no la app
+        read_only_fields = ('estado', 'fecha_reclamo', 'fecha_confirmacion')
+
+# 6. Serializador de VALIDACIÓN DE TAG (lo que envía la barrera)
+class ValidarSensorSerializer(serializers.Serializer):
+    codigo_sensor = serializers.CharField(max_length=50)
+    dispositivo_id = serializers.CharField(max_length=50, required=False, default="BARRERA_PRINCIPAL")
+    # Si es True, el intento queda registrado como Evento en la misma llamada
+    registrar = serializers.BooleanField(required=False, default=True)
+
+# 7. Serializador del DIRECTORIO DE DEPARTAMENTOS (vista de edificio de la app)
+# Lee las anotaciones y el Prefetch de api/directorio.py: no hace queries propias.
+class HabitanteDirectorioSerializer(serializers.ModelSerializer):
+    sensores_activos = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Usuario
+        fields = ('id', 'username', 'nombres', 'apellidos', 'rut', 'rol', 'estado', 'sensores_activos')
+
+
+class DirectorioDepartamentoSerializer(serializers.ModelSerializer):
+    total_habitantes = serializers.IntegerField(read_only=True)
+    sensores_activos = serializers.IntegerField(read_only=True)
+    habitantes = HabitanteDirectorioSerializer(source='habitantes_directorio', many=True, read_only=True)
+
+    class Meta:
+        model = Departamento
+        fields = ('id', 'numero', 'torre', 'condominio', 'piso', 'total_habitantes', 'sensores_activos', 'habitantes')
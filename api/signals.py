@@ -0,0 +1,268 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Usuario, Departamento, Sensor, Evento, ComandoRemoto
+from .cache import indice_sensores, versiones, cache_usuarios
+from .comandos import canal_comandos, mensaje_comando
+from .lista_acceso import registrar_cambios
+from .resumenes import sumar_eventos, restar_eventos
+from .sincronizacion import registrar_eliminacion
+from .directorio import cache_directorio
+
+# Campos de Usuario que muestra el directorio de departamentos (sección 7)
+CAMPOS_DIRECTORIO_USUARIO = ('departamento_id', 'username', 'nombres', 'apellidos', 'rut', 'rol', 'estado')
+# Campos que comparan la lista de acceso (sección 4) y el directorio (sección 7)
+CAMPOS_PREVIO_SENSOR = {'codigo_sensor', 'estado', 'usuario', 'usuario_id', 'departamento', 'departamento_id'}
+CAMPOS_PREVIO_USUARIO = {'estado', 'is_active', 'departamento', *CAMPOS_DIRECTORIO_USUARIO}
+
+
+def _toca(update_fields, campos):
+    """False si el save() solo escribe otros campos (p.ej. last_login al hacer login)."""
+    return update_fields is None or bool(campos & set(update_fields))
+
+
+# ==============================================================================
+# 1. INVALIDACIÓN DEL ÍNDICE DE SENSORES
+# ==============================================================================
+@receiver([post_save, post_delete], sender=Sensor)
+def invalidar_sensor(sender, instance, **kwargs):
+    # Quitamos tanto el código que tenía en caché como el actual (por si se renombró)
+    indice_sensores.invalidar_sensor(instance.pk, instance.codigo_sensor)
+
+
+@receiver([post_save, post_delete], sender=Usuario)
+def invalidar_usuario(sender, instance, **kwargs):
+    indice_sensores.invalidar_usuario(instance.pk)
+    # Usuario autenticado en cache (api/autenticacion.py)
+    cache_usuarios.invalidar(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Departamento)
+def invalidar_departamento(sender, instance, **kwargs):
+    indice_sensores.invalidar_departamento(instance.pk)
+
+
+# ==============================================================================
+# 2. AVISO EN VIVO DE COMANDOS REMOTOS
+# ==============================================================================
+@receiver(post_save, sender=ComandoRemoto)
+def publicar_comando(sender, instance, created, **kwargs):
+    # Solo avisamos comandos nuevos en la cola (reclamar/confirmar también guardan).
+    # Publicamos recién cuando la transacción confirma, para no avisar algo que
+    # después se revierte.
+    if not created:
+        return
+    mensaje = mensaje_comando(instance)
+    transaction.on_commit(lambda: canal_comandos.publicar(instance.dispositivo_id, mensaje))
+
+
+# ==============================================================================
+# 3. RESUMEN POR HORA DE EVENTOS (Dashboard)
+# ==============================================================================
+# Campos de Evento que definen su bucket en ResumenEventos
+CAMPOS_RESUMEN_EVENTO = ('fecha_hora', 'departamento_id', 'tipo_evento', 'resultado')
+
+
+@receiver(pre_save, sender=Evento)
+def guardar_evento_previo(sender, instance, update_fields=None, **kwargs):
+    instance._resumen_previo = None
+    if instance.pk is None or instance._state.adding:
+        return
+    if not _toca(update_fields, {'departamento', *CAMPOS_RESUMEN_EVENTO}):
+        return
+    instance._resumen_previo = Evento.objects.filter(pk=instance.pk).only(*CAMPOS_RESUMEN_EVENTO).first()
+
+
+@receiver(post_save, sender=Evento)
+def sumar_evento_a_resumen(sender, instance, created, **kwargs):
+    # Los lotes (bulk_create) no disparan señales: api/ingesta.py suma por su cuenta
+    if created:
+        sumar_eventos([instance])
+        return
+    # Un PATCH que cambia tipo_evento/resultado/departamento mueve el evento de bucket
+    previo = getattr(instance, '_resumen_previo', None)
+    if previo is not None and any(
+        getattr(previo, campo) != getattr(instance, campo) for campo in CAMPOS_RESUMEN_EVENTO
+    ):
+        restar_eventos([previo])
+        sumar_eventos([instance])
+
+
+@receiver(post_delete, sender=Evento)
+def restar_evento_de_resumen(sender, instance, **kwargs):
+    # El archivo de eventos borra con _raw_delete (sin señales): esos siguen contando
+    restar_eventos([instance])
+
+
+# ==============================================================================
+# 4. VERSIÓN DE LA LISTA DE ACCESO OFFLINE
+# ==============================================================================
+# En pre_save guardamos los valores anteriores para registrar un cambio solo si
+# de verdad cambió algo que afecte el acceso (un login no debe mover la versión).
+@receiver(pre_save, sender=Sensor)
+def guardar_sensor_previo(sender, instance, update_fields=None, **kwargs):
+    instance._lista_previo = instance._directorio_previo = None
+    if instance.pk is not None and not _toca(update_fields, CAMPOS_PREVIO_SENSOR):
+        # Esos campos no se escriben: quedan como están, sin SELECT
+        instance._lista_previo = (instance.codigo_sensor, instance.estado, instance.usuario_id)
+        instance._directorio_previo = (instance.estado, instance.usuario_id, instance.departamento_id)
+    elif instance.pk is not None:
+        # La misma query sirve para el directorio de departamentos (sección 7)
+        fila = (
+            Sensor.objects.filter(pk=instance.pk)
+            .values_list('codigo_sensor', 'estado', 'usuario_id', 'departamento_id').first()
+        )
+        if fila is not None:
+            instance._lista_previo = fila[:3]
+            instance._directorio_previo = fila[1:]
+
+
+def _sensor_permitido(sensor):
+    if sensor.estado != 'activo':
+        return False
+    if sensor.usuario_id is None:
+        return True
+    return sensor.usuario.estado == 'activo' and sensor.usuario.is_active
+
+
+@receiver(post_save, sender=Sensor)
+def registrar_cambio_sensor(sender, instance, created, **kwargs):
+    previo = getattr(instance, '_lista_previo', None)
+    actual = (instance.codigo_sensor, instance.estado, instance.usuario_id)
+    if not created and previo == actual:
+        return
+    cambios = []
+    if previo is not None and previo[0] != instance.codigo_sensor:
+        cambios.append((previo[0], False))  # Se renombró: el código viejo deja de valer
+    permitido = _sensor_permitido(instance)
+    if permitido or not created:
+        cambios.append((instance.codigo_sensor, permitido))
+    registrar_cambios(cambios)
+
+
+@receiver(post_delete, sender=Sensor)
+def registrar_baja_sensor(sender, instance, **kwargs):
+    registrar_cambios([(instance.codigo_sensor, False)])
+
+
+@receiver(pre_save, sender=Usuario)
+def guardar_usuario_previo(sender, instance, update_fields=None, **kwargs):
+    instance._lista_previo = instance._directorio_previo = None
+    if instance.pk is not None and not _toca(update_fields, CAMPOS_PREVIO_USUARIO):
+        # Un login solo escribe last_login: nada que comparar, sin SELECT
+        instance._lista_previo = (instance.estado, instance.is_active)
+        instance._directorio_previo = tuple(getattr(instance, campo) for campo in CAMPOS_DIRECTORIO_USUARIO)
+    elif instance.pk is not None:
+        fila = (
+            Usuario.objects.filter(pk=instance.pk)
+            .values_list('estado', 'is_active', *CAMPOS_DIRECTORIO_USUARIO).first()
+        )
+        if fila is not None:
+            instance._lista_previo = fila[:2]
+            instance._directorio_previo = fila[2:]
+
+
+@receiver(post_save, sender=Usuario)
+def registrar_cambio_usuario(sender, instance, created, **kwargs):
+    previo = getattr(instance, '_lista_previo', None)
+    if created or previo is None or previo == (instance.estado, instance.is_active):
+        return
+    permitido = instance.estado == 'activo' and instance.is_active
+    codigos = instance.sensores.filter(estado='activo').values_list('codigo_sensor', flat=True)
+    registrar_cambios((codigo, permitido) for codigo in codigos)
+
+
+# ==============================================================================
+# 5. VERSIONES PARA ETag (listados de la app)
+# ==============================================================================
+@receiver([post_save, post_delete], sender=Departamento)
+@receiver([post_save, post_delete], sender=Sensor)
+@receiver([post_save, post_delete], sender=Usuario)
+def incrementar_version(sender, **kwargs):
+    versiones.incrementar(sender)
+
+
+@receiver(m2m_changed, sender=Usuario.groups.through)
+@receiver(m2m_changed, sender=Usuario.user_permissions.through)
+def incrementar_version_usuario_m2m(sender, **kwargs):
+    # groups/user_permissions salen en el JSON de usuarios
+    versiones.incrementar(Usuario)
+
+
+# ==============================================================================
+# 6. SINCRONIZACIÓN DE LA APP (lápidas y fecha_actualizacion)
+# ==============================================================================
+@receiver(post_delete, sender=Departamento)
+@receiver(post_delete, sender=Sensor)
+@receiver(post_delete, sender=Usuario)
+@receiver(post_delete, sender=Evento)
+def registrar_lapida(sender, instance, **kwargs):
+    registrar_eliminacion(instance)
+
+
+@receiver(m2m_changed, sender=Usuario.groups.through)
+@receiver(m2m_changed, sender=Usuario.user_permissions.through)
+def tocar_usuario_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    # groups/user_permissions no cambian la fila del usuario, pero sí su JSON
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        if not pk_set:
+            return
+        usuarios = Usuario.objects.filter(pk__in=pk_set)
+    else:
+        usuarios = Usuario.objects.filter(pk=instance.pk)
+    usuarios.update(fecha_actualizacion=timezone.now())
+
+
+# ==============================================================================
+# 7. CACHE DEL DIRECTORIO DE DEPARTAMENTOS (por condominio)
+# ==============================================================================
+# Solo se invalida si cambió algo que el directorio muestra (un login no cuenta).
+@receiver(pre_save, sender=Departamento)
+def guardar_departamento_previo(sender, instance, **kwargs):
+    instance._directorio_previo = None
+    if instance.pk is not None:
+        instance._directorio_previo = (
+            Departamento.objects.filter(pk=instance.pk).values_list('condominio', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Departamento)
+@receiver(post_delete, sender=Departamento)
+def invalidar_directorio_departamento(sender, instance, **kwargs):
+    cache_directorio.invalidar({instance.condominio, getattr(instance, '_directorio_previo', None)})
+
+
+@receiver(post_save, sender=Usuario)
+def invalidar_directorio_usuario(sender, instance, created, **kwargs):
+    previo = getattr(instance, '_directorio_previo', None)
+    actual = tuple(getattr(instance, campo) for campo in CAMPOS_DIRECTORIO_USUARIO)
+    if previo == actual or (created and instance.departamento_id is None):
+        return
+    cache_directorio.invalidar_departamentos([instance.departamento_id, previo[0] if previo else None])
+
+
+@receiver(post_delete, sender=Usuario)
+def invalidar_directorio_usuario_borrado(sender, instance, **kwargs):
+    cache_directorio.invalidar_departamentos([instance.departamento_id])
+
+
+@receiver(post_save, sender=Sensor)
+def invalidar_directorio_sensor(sender, instance, created, **kwargs):
+    previo = getattr(instance, '_directorio_previo', None)
+    if not created and previo == (instance.estado, instance.usuario_id, instance.departamento_id):
+        return
+    previo = previo or (None, None, None)
+    cache_directorio.invalidar_departamentos(
+        departamentos=[instance.departamento_id, previo[2]],
+        usuarios=[instance.usuario_id, previo[1]],
+    )
+
+
+@receiver(post_delete, sender=Sensor)
+def invalidar_directorio_sensor_borrado(sender, instance, **kwargs):
+    cache_directorio.invalidar_departamentos([instance.departamento_id], [instance.usuario_id])
+
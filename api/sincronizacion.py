@@ -0,0 +1,217 @@
+import base64
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Usuario, Departamento, Sensor, Evento, Eliminacion
+from .serializers import UsuarioSerializer, DepartamentoSerializer, SensorSerializer, EventoSerializer
+
+
+# ==============================================================================
+# SINCRONIZACIÓN INCREMENTAL DE LA APP (GET /api/sync/?token=)
+# ==============================================================================
+# Colecciones que se actualizan in situ: se siguen por (fecha_actualizacion, id)
+COLECCIONES = {
+    'departamentos': (Departamento, DepartamentoSerializer, ()),
+    'usuarios': (Usuario, UsuarioSerializer, ('groups', 'user_permissions')),
+    'sensores': (Sensor, SensorSerializer, ()),
+}
+# Nombre de cada modelo en las lápidas (Eliminacion.modelo)
+NOMBRES = {Departamento: 'departamentos', Usuario: 'usuarios', Sensor: 'sensores', Evento: 'eventos'}
+# Colecciones que solo se agregan: se siguen por id (ver _seguir_por_id)
+POR_ID = ('eventos', 'eliminaciones')
+# Máximo de rangos de ids pendientes por colección en el token
+HUECOS_MAX = 50
+
+
+class TokenInvalido(ValueError):
+    pass
+
+
+def codificar_token(estado):
+    texto = json.dumps(estado, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_token(token):
+    try:
+        relleno = '=' * (-len(token) % 4)
+        estado = json.loads(base64.urlsafe_b64decode(token + relleno))
+        if estado.get('v') not in (1, 2):
+            raise ValueError
+        for nombre in COLECCIONES:
+            fecha, pk = estado['m'][nombre]
+            estado['m'][nombre] = (parse_datetime(fecha) if fecha else None, int(pk))
+            if fecha and estado['m'][nombre][0] is None:
+                raise ValueError
+        for nombre in POR_ID:
+            if estado['v'] == 1:
+                # Tokens anteriores: solo el último id, sin huecos
+                estado[nombre] = {'id': estado[nombre], 'huecos': []}
+            estado[nombre] = {
+                'id': int(estado[nombre]['id']),
+                'huecos': [[int(t), int(desde), int(hasta)] for t, desde, hasta in estado[nombre]['huecos']],
+            }
+        estado['v'] = 2
+    except (ValueError, TypeError, KeyError, AttributeError, json.JSONDecodeError):
+        raise TokenInvalido("Token de sincronización inválido: sincroniza desde cero (sin token).")
+    return estado
+
+
+def estado_inicial():
+    """Sin token: todas las colecciones y los eventos de los últimos SYNC_EVENTOS_DIAS días."""
+    dias = getattr(settings, 'SYNC_EVENTOS_DIAS', 7)
+    desde = timezone.now() - timedelta(days=dias)
+    primero = (
+        Evento.objects.filter(fecha_hora__gte=desde).order_by('fecha_hora', 'id')
+        .values_list('id', flat=True).first()
+    )
+    ultimo_evento = Evento.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    ultima_lapida = Eliminacion.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    return {
+        'v': 2,
+        'm': {nombre: (None, 0) for nombre in COLECCIONES},
+        'eventos': {'id': (primero - 1) if primero is not None else ultimo_evento, 'huecos': []},
+        # Un cliente nuevo no tiene nada que borrar: arranca desde la última lápida
+        'eliminaciones': {'id': ultima_lapida, 'huecos': []},
+    }
+
+
+def _seguir_por_id(queryset, seguimiento, limite, ahora, margen):
+    """
+    Filas nuevas de una colección que solo se agrega (eventos, lápidas).
+
+    Un id autoincremental se asigna al insertar, no al confirmar: una transacción
+    lenta (p.ej. un lote grande mientras el buffer escribe) puede confirmar el id
+    10 después de que ya se entregó el 11. Por eso, además del último id
+    entregado, el token guarda los huecos vistos entre ids entregados
+    ([momento, desde, hasta]). Cada sincronización revisa esos rangos (por
+    clave primaria, casi siempre vacíos) hasta que tienen más de `margen`
+    segundos: ahí lo que no apareció fue un rollback o un borrado, no una
+    transacción en vuelo.
+
+    Devuelve (filas, lleno) y actualiza `seguimiento` en el lugar.
+    """
+    huecos = seguimiento['huecos']
+    tardias = []
+    if huecos:
+        en_huecos = Q()
+        for _, desde, hasta in huecos:
+            en_huecos |= Q(id__range=(desde, hasta))
+        tardias = list(queryset.filter(en_huecos).order_by('id'))
+    nuevas = list(queryset.filter(id__gt=seguimiento['id']).order_by('id')[:limite])
+
+    # Los huecos ya revisados con margen suficiente se olvidan; lo que apareció se quita
+    huecos = _quitar_ids([h for h in huecos if h[0] > ahora - margen], [fila.pk for fila in tardias])
+    anterior = seguimiento['id']
+    for fila in nuevas:
+        if fila.pk > anterior + 1:
+            huecos.append([ahora, anterior + 1, fila.pk - 1])
+        anterior = fila.pk
+    seguimiento['id'] = anterior
+    seguimiento['huecos'] = _acotar_huecos(huecos)
+    return tardias + nuevas, len(nuevas) == limite
+
+
+def _quitar_ids(huecos, ids):
+    for pk in ids:
+        partidos = []
+        for momento, desde, hasta in huecos:
+            if desde <= pk <= hasta:
+                if desde < pk:
+                    partidos.append([momento, desde, pk - 1])
+                if pk < hasta:
+                    partidos.append([momento, pk + 1, hasta])
+            else:
+                partidos.append([momento, desde, hasta])
+        huecos = partidos
+    return huecos
+
+
+def _acotar_huecos(huecos):
+    """
+    Máximo HUECOS_MAX rangos (el token viaja en cada petición): se unen los dos
+    más cercanos. Las filas que quedan dentro se reenvían una vez (el cliente
+    aplica por id, no duplica).
+    """
+    huecos = sorted(huecos, key=lambda h: h[1])
+    while len(huecos) > HUECOS_MAX:
+        i = min(range(len(huecos) - 1), key=lambda i: huecos[i + 1][1] - huecos[i][2])
+        (momento, desde, _), (otro, _, hasta) = huecos[i], huecos[i + 1]
+        huecos[i:i + 2] = [[max(momento, otro), desde, hasta]]
+    return huecos
+
+
+def sincronizar(token, limite, contexto):
+    """
+    Cambios desde `token` (None = primera sincronización).
+
+    - departamentos/usuarios/sensores: filas con (fecha_actualizacion, id) posterior
+      a la marca del token, en orden, con el índice (fecha_actualizacion, id).
+    - eventos: solo se agregan, se siguen por id (con los huecos de _seguir_por_id).
+    - eliminados: ids de las lápidas (Eliminacion) posteriores al token, igual que eventos.
+
+    Cada colección trae como máximo `limite` filas; si alguna se llenó, 'mas' es
+    True y el cliente debe volver a llamar con el token nuevo. El costo depende de
+    cuántas filas cambiaron, no del tamaño de las tablas.
+
+    Margen de seguridad: una transacción larga puede confirmar una fila con una
+    fecha_actualizacion anterior a otra ya entregada. Por eso la marca nunca avanza
+    más allá de ahora - SYNC_MARGEN_SEGUNDOS (salvo con 'mas'): esas filas recientes
+    pueden llegar dos veces, nunca cero (el cliente las aplica como upsert).
+    """
+    estado = decodificar_token(token) if token else estado_inicial()
+    margen = timezone.now() - timedelta(seconds=getattr(settings, 'SYNC_MARGEN_SEGUNDOS', 5))
+    cambios, eliminados, mas = {}, {}, False
+
+    for nombre, (modelo, serializer, prefetch) in COLECCIONES.items():
+        fecha, pk = estado['m'][nombre]
+        queryset = modelo.objects.order_by('fecha_actualizacion', 'id')
+        if fecha is not None:
+            queryset = queryset.filter(
+                Q(fecha_actualizacion__gt=fecha) | Q(fecha_actualizacion=fecha, id__gt=pk)
+            )
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        filas = list(queryset[:limite])
+        cambios[nombre] = serializer(filas, many=True, context=contexto).data
+
+        lleno = len(filas) == limite
+        mas = mas or lleno
+        if filas:
+            fecha, pk = filas[-1].fecha_actualizacion, filas[-1].pk
+        if not lleno and fecha is not None and fecha > margen:
+            fecha, pk = margen, 0
+        estado['m'][nombre] = (fecha, pk)
+
+    ahora = int(timezone.now().timestamp())
+    segundos = getattr(settings, 'SYNC_MARGEN_SEGUNDOS', 5)
+    eventos, lleno = _seguir_por_id(Evento.objects.all(), estado['eventos'], limite, ahora, segundos)
+    cambios['eventos'] = EventoSerializer(eventos, many=True, context=contexto).data
+    mas = mas or lleno
+
+    lapidas, lleno = _seguir_por_id(
+        Eliminacion.objects.only('id', 'modelo', 'objeto_id'), estado['eliminaciones'], limite, ahora, segundos,
+    )
+    for lapida in lapidas:
+        eliminados.setdefault(lapida.modelo, []).append(lapida.objeto_id)
+    mas = mas or lleno
+
+    estado['m'] = {
+        nombre: (fecha.isoformat() if fecha else None, pk) for nombre, (fecha, pk) in estado['m'].items()
+    }
+    return {
+        "cambios": cambios,
+        "eliminados": eliminados,
+        "token": codificar_token(estado),
+        "mas": mas,
+    }
+
+
+def registrar_eliminacion(instancia):
+    """Lápida para una fila borrada (la llaman las señales post_delete)."""
+    Eliminacion.objects.create(modelo=NOMBRES[type(instancia)], objeto_id=instancia.pk)
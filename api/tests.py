@@ -1,3 +1,1134 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import check_password
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .archivo_eventos import archivo_eventos
+from .buffer_eventos import BufferEventos, _proceso_vivo
+from .cache import indice_sensores
+from .comandos import reclamar_comando, confirmar_comando
+from .enrutador_bd import COOKIE_PRIMARIA, EnrutadorReplicas, marcar_escritura, permitir_replica, restaurar
+from .hasheo import MINIMO_PARA_PROCESOS, hashear_passwords
+from .lista_acceso import (
+    CacheSnapshot, TASAS_FALSOS_POSITIVOS, TIPO_BLOOM, TIPO_ORDENADO, _snapshot_bloom, _snapshot_ordenado,
+    cambios_desde, compactar_cambios, tasa_falsos_positivos, version_actual,
+)
+from .models import Usuario, Departamento, Sensor, Evento, ResumenEventos, ComandoRemoto, CambioListaAcceso
+from .rechazos import DetectorRechazos, VentanaDeslizante, bloquear_sensores
+from .renderers import JSONRapidoRenderer
+
+
+# ==============================================================================
+# PRESUPUESTO DE QUERIES DE LOS LISTADOS
+# ==============================================================================
+# Cada listado debe costar el mismo número de queries con 2 filas que con 20:
+# si alguien agrega una relación sin select_related/prefetch_related, estos
+# tests fallan con el detalle de las queries extra.
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PresupuestoQueriesTests(TestCase):
+
+    def setUp(self):
+        self.admin = Usuario.objects.create_user(
+            username='admin', email='admin@test.cl', password='clave-segura-123',
+            nombres='Admin', apellidos='Test', rol='admin',
+        )
+        self.client = APIClient()
+        # force_authenticate evita la query de autenticación JWT
+        self.client.force_authenticate(self.admin)
+
+    def crear_filas(self, cantidad, desde=0):
+        for i in range(desde, desde + cantidad):
+            depto = Departamento.objects.create(numero=f'{i}', torre='A', piso=1)
+            usuario = Usuario.objects.create_user(
+                username=f'vecino{i}', email=f'vecino{i}@test.cl', password='clave-segura-123',
+                nombres='Vecino', apellidos=f'{i}', departamento=depto,
+            )
+            sensor = Sensor.objects.create(codigo_sensor=f'TAG{i}', usuario=usuario, departamento=depto)
+            Evento.objects.create(sensor=sensor, usuario=usuario, tipo_evento='ACCESO_VALIDO', resultado='PERMITIDO')
+
+    def assertQueriesFijas(self, url, esperadas):
+        self.crear_filas(2)
+        with self.assertNumQueries(esperadas):
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+
+        self.crear_filas(18, desde=2)
+        with self.assertNumQueries(esperadas):
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta
+
+    def test_departamentos(self):
+        self.assertQueriesFijas('/api/departamentos/', 1)
+
+    def test_usuarios_con_departamento_expandido(self):
+        # 1 listado + 2 prefetch (groups, user_permissions)
+        respuesta = self.assertQueriesFijas('/api/usuarios/?expand=departamento', 3)
+        vecino = next(u for u in respuesta.json() if u['username'] == 'vecino0')
+        self.assertEqual(vecino['departamento']['numero'], '0')
+
+    def test_sensores_expandidos(self):
+        respuesta = self.assertQueriesFijas('/api/sensores/?expand=usuario,departamento', 1)
+        sensor = respuesta.json()[0]
+        self.assertIn('username', sensor['usuario'])
+        self.assertIn('numero', sensor['departamento'])
+
+    def test_sensores_sin_expandir_devuelven_ids(self):
+        respuesta = self.assertQueriesFijas('/api/sensores/', 1)
+        self.assertIsInstance(respuesta.json()[0]['usuario'], int)
+
+    def test_eventos_expandidos(self):
+        respuesta = self.assertQueriesFijas('/api/eventos/?expand=sensor,usuario,departamento&page_size=100', 1)
+        evento = respuesta.json()['results'][0]
+        self.assertIn('codigo_sensor', evento['sensor'])
+        self.assertIn('username', evento['usuario'])
+        self.assertIn('numero', evento['departamento'])
+
+    def test_directorio(self):
+        # 1 departamentos con conteos + 1 prefetch de habitantes; las filas nuevas
+        # invalidan el cache (señales), así que la segunda vuelta también consulta
+        respuesta = self.assertQueriesFijas('/api/departamentos/directorio/', 2)
+        depto = respuesta.json()[0]
+        self.assertEqual(depto['total_habitantes'], len(depto['habitantes']))
+        self.assertEqual(depto['sensores_activos'], 1)
+
+
+# ==============================================================================
+# GET CONDICIONAL (ETag / If-None-Match en los listados)
+# ==============================================================================
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ETagTests(TestCase):
+
+    def setUp(self):
+        self.admin = Usuario.objects.create_user(
+            username='admin', email='admin@test.cl', password='clave-segura-123',
+            nombres='Admin', apellidos='Test', rol='admin',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        Departamento.objects.create(numero='101', torre='A', piso=1)
+
+    def test_304_sin_queries_y_nueva_version_al_escribir(self):
+        etag = self.client.get('/api/departamentos/')['ETag']
+
+        with self.assertNumQueries(0):
+            respuesta = self.client.get('/api/departamentos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta['ETag'], etag)
+        # El ETag débil que devuelve la compresión también vale
+        self.assertEqual(self.client.get('/api/departamentos/', HTTP_IF_NONE_MATCH=f'W/{etag}').status_code, 304)
+
+        self.client.post('/api/departamentos/', {'numero': '102', 'torre': 'A', 'piso': 1}, format='json')
+        respuesta = self.client.get('/api/departamentos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertEqual(len(respuesta.json()), 2)
+
+    def test_cambio_de_un_modelo_relacionado_invalida(self):
+        # Los sensores muestran datos del usuario: editar el usuario cambia su ETag
+        etag = self.client.get('/api/sensores/')['ETag']
+        self.admin.nombres = 'Otro'
+        self.admin.save()
+        self.assertEqual(self.client.get('/api/sensores/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+# ==============================================================================
+# FORMATO DE RESPUESTAS (?fields=/?omit=, orjson y compresión)
+# ==============================================================================
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], COMPRESION_MINIMO=512)
+class FormatoRespuestasTests(TestCase):
+
+    def setUp(self):
+        self.admin = Usuario.objects.create_user(
+            username='admin', email='admin@test.cl', password='clave-segura-123',
+            nombres='Admin', apellidos='Test', rol='admin',
+        )
+        for i in range(5):
+            Usuario.objects.create_user(
+                username=f'vecino{i}', email=f'vecino{i}@test.cl', password='clave-segura-123',
+                nombres='Vecino', apellidos='Test',
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def select_de_usuarios(self, parametros):
+        with CaptureQueriesContext(connection) as contexto:
+            respuesta = self.client.get('/api/usuarios/', parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        sql = [query['sql'] for query in contexto.captured_queries if query['sql'].startswith('SELECT "usuarios"')]
+        return respuesta.json(), sql[-1]
+
+    def test_fields_recorta_el_json_y_las_columnas(self):
+        filas, sql = self.select_de_usuarios({'fields': 'id,username'})
+        self.assertEqual(len(filas), 6)
+        self.assertEqual({tuple(fila) for fila in filas}, {('id', 'username')})
+        self.assertIn('"usuarios"."username"', sql)
+        self.assertNotIn('"usuarios"."email"', sql)
+        self.assertNotIn('"usuarios"."password"', sql)
+
+    def test_omit_quita_campos(self):
+        completos, _ = self.select_de_usuarios({})
+        filas, sql = self.select_de_usuarios({'omit': 'email,telefono'})
+        self.assertEqual(set(filas[0]), set(completos[0]) - {'email', 'telefono'})
+        self.assertNotIn('"usuarios"."email"', sql)
+
+    def test_campos_desconocidos_se_ignoran(self):
+        filas, _ = self.select_de_usuarios({'fields': 'id,no_existe'})
+        self.assertEqual(set(filas[0]), {'id'})
+        completos, _ = self.select_de_usuarios({})
+        filas, _ = self.select_de_usuarios({'omit': 'no_existe'})
+        self.assertEqual(set(filas[0]), set(completos[0]))
+
+    def test_orjson_igual_que_el_renderer_de_drf(self):
+        datos = {
+            'utc': datetime(2025, 3, 1, 10, 0, 0, 123456, tzinfo=dt_timezone.utc),
+            'local': timezone.localtime(datetime(2025, 3, 1, 10, tzinfo=dt_timezone.utc)),
+            'naive': datetime(2025, 3, 1, 10),
+            'decimal': Decimal('12.50'),
+            'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'lista': [Decimal('1'), None, True],
+            7: 'clave numérica',
+        }
+        self.assertEqual(
+            json.loads(JSONRapidoRenderer().render(datos)),
+            json.loads(JSONRenderer().render(datos)),
+        )
+
+    def test_compresion_gzip_y_brotli_con_vary(self):
+        original = self.client.get('/api/usuarios/')
+        self.assertEqual(original['Vary'].count('Accept-Encoding'), 1)
+        self.assertNotIn('Content-Encoding', original)
+
+        respuesta = self.client.get('/api/usuarios/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(respuesta['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', respuesta['Vary'])
+        self.assertEqual(gzip.decompress(respuesta.content), original.content)
+
+        # brotli es opcional: con el paquete instalado se prefiere a gzip
+        falso = mock.Mock(compress=lambda datos, quality: b'br' + zlib.compress(datos))
+        with mock.patch('api.compresion.brotli', falso):
+            respuesta = self.client.get('/api/usuarios/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(respuesta['Content-Encoding'], 'br')
+        self.assertIn('Accept-Encoding', respuesta['Vary'])
+        self.assertEqual(zlib.decompress(respuesta.content[2:]), original.content)
+
+
+# ==============================================================================
+# HISTORIAL PAGINADO POR CURSOR (GET /api/eventos/)
+# ==============================================================================
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CursorEventosTests(TestCase):
+
+    def setUp(self):
+        usuario = Usuario.objects.create_user(
+            username='vecino', email='vecino@test.cl', password='clave-segura-123',
+            nombres='Vecino', apellidos='Test',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(usuario)
+        instante = timezone.now() - timedelta(hours=1)
+        # 5 eventos en el mismo instante (empate en fecha_hora) y 2 más antiguos
+        eventos = [Evento.objects.create(tipo_evento='ACCESO_VALIDO', resultado='X', fecha_hora=instante) for _ in range(5)]
+        eventos += [
+            Evento.objects.create(tipo_evento='ACCESO_VALIDO', resultado='X', fecha_hora=instante - timedelta(minutes=i))
+            for i in (1, 2)
+        ]
+        self.orden = [e.pk for e in sorted(eventos, key=lambda e: (e.fecha_hora, e.pk), reverse=True)]
+
+    def test_empates_y_paginas_estables(self):
+        primera = self.client.get('/api/eventos/?page_size=2').json()
+        # Un evento nuevo entre páginas no corre las siguientes
+        Evento.objects.create(tipo_evento='ACCESO_VALIDO', resultado='X')
+
+        ids, url = [e['id'] for e in primera['results']], primera['next']
+        while url:
+            datos = self.client.get(url).json()
+            ids += [e['id'] for e in datos['results']]
+            url = datos['next']
+        self.assertEqual(ids, self.orden)
+
+    def test_cursor_invalido_es_400(self):
+        for cursor in ('no-es-base64!', 'bWFsbw==', 'MjAyNC0wMi0zMFQxMDowMDowMHwx'):   # 'malo', fecha imposible
+            respuesta = self.client.get('/api/eventos/', {'cursor': cursor})
+            self.assertEqual(respuesta.status_code, 400, cursor)
+            self.assertIn('cursor', respuesta.json())
+
+
+# ==============================================================================
+# INGESTA POR LOTES (POST /api/eventos/lote/)
+# ==============================================================================
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class IngestaLoteTests(TestCase):
+
+    def setUp(self):
+        self.admin = Usuario.objects.create_user(
+            username='admin', email='admin@test.cl', password='clave-segura-123',
+            nombres='Admin', apellidos='Test', rol='admin',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.sensor = Sensor.objects.create(codigo_sensor='TAG1', usuario=self.admin)
+        self.lote = [
+            {'sensor': self.sensor.pk, 'tipo_evento': 'ACCESO_VALIDO', 'resultado': 'PERMITIDO',
+             'fecha_hora': '2025-03-01T10:00:00', 'id_externo': f'ev-{i}'}
+            for i in range(3)
+        ]
+
+    def total_resumen(self):
+        return ResumenEventos.objects.aggregate(total=Sum('total'))['total']
+
+    def test_filas_malformadas_son_errores_por_fila(self):
+        respuesta = self.client.post('/api/eventos/lote/', [
+            {'tipo_evento': 'ACCESO_VALIDO', 'fecha_hora': '2024-02-30T10:00:00'},
+            {'tipo_evento': ['ACCESO_VALIDO']},
+            {'tipo_evento': 'ACCESO_RECHAZADO', 'codigo_sensor': {'a': 1}},
+            {'tipo_evento': 'ACCESO_VALIDO', 'fecha_hora': 20240101},
+        ], format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        errores = {e['indice']: e['errores'] for e in respuesta.json()['errores']}
+        self.assertIn('fecha_hora', errores[0])
+        self.assertIn('tipo_evento', errores[1])
+        self.assertIn('codigo_sensor', errores[2])
+        self.assertIn('fecha_hora', errores[3])
+        self.assertEqual(respuesta.json()['creados'], 0)
+
+    def test_reenviar_el_lote_no_duplica(self):
+        primero = self.client.post('/api/eventos/lote/', self.lote, format='json').json()
+        segundo = self.client.post('/api/eventos/lote/', self.lote, format='json').json()
+        self.assertEqual((primero['creados'], primero['duplicados']), (3, 0))
+        self.assertEqual((segundo['creados'], segundo['duplicados']), (0, 3))
+        self.assertEqual(Evento.objects.count(), 3)
+        self.assertEqual(self.total_resumen(), 3)
+
+    def test_reintentos_simultaneos_no_suman_dos_veces(self):
+        self.client.post('/api/eventos/lote/', self.lote[:2], format='json')
+        # Otro reintento ya pasó la verificación de id_externo sin ver estas filas
+        with mock.patch('api.ingesta._ya_guardados', return_value=set()):
+            reporte = self.client.post('/api/eventos/lote/', self.lote, format='json').json()
+        self.assertEqual((reporte['creados'], reporte['duplicados']), (1, 2))
+        self.assertEqual(Evento.objects.count(), 3)
+        self.assertEqual(self.total_resumen(), 3)
+
+
+# ==============================================================================
+# IMPORTACIÓN MASIVA (POST /api/sensores/importar/ y /api/usuarios/importar/)
+# ==============================================================================
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportacionTests(TestCase):
+
+    def setUp(self):
+        self.admin = Usuario.objects.create_user(
+            username='admin', email='admin@test.cl', password='clave-segura-123',
+            nombres='Admin', apellidos='Test', rut='1-9', rol='admin',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.depto = Departamento.objects.create(numero='101')
+        Sensor.objects.create(codigo_sensor='TAG-VIEJO')
+
+    def test_sensores_errores_por_fila_y_duplicados(self):
+        respuesta = self.client.post('/api/sensores/importar/', [
+            {'codigo_sensor': 'TAG1', 'departamento_numero': '101'},
+            {'codigo_sensor': 'TAG1'},                               # repetido en el archivo
+            {'codigo_sensor': 'TAG-VIEJO'},                          # ya existe en la BD
+            {'codigo_sensor': 'TAG2', 'estado': 'roto', 'departamento': 'x'},
+            {'codigo_sensor': 'TAG3', 'departamento_numero': '999'},
+            'no-es-objeto',
+        ], format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        reporte = respuesta.json()
+        self.assertEqual((reporte['recibidos'], reporte['creados']), (6, 1))
+        errores = {e['indice']: e['errores'] for e in reporte['errores']}
+        self.assertEqual(sorted(errores), [1, 2, 3, 4, 5])
+        self.assertIn('fila 0', errores[1]['codigo_sensor'][0])
+        self.assertIn('Ya existe', errores[2]['codigo_sensor'][0])
+        self.assertEqual(set(errores[3]), {'estado', 'departamento'})
+        self.assertIn('departamento_numero', errores[4])
+        self.assertIn('non_field_errors', errores[5])
+        self.assertEqual(Sensor.objects.get(codigo_sensor='TAG1').departamento, self.depto)
+
+    def test_sensores_atomico_no_inserta_nada(self):
+        respuesta = self.client.post('/api/sensores/importar/?atomico=1', [
+            {'codigo_sensor': 'TAG1'}, {'codigo_sensor': 'TAG-VIEJO'},
+        ], format='json')
+        self.assertEqual((respuesta.status_code, respuesta.json()['creados']), (200, 0))
+        self.assertFalse(Sensor.objects.filter(codigo_sensor='TAG1').exists())
+
+    def test_importar_invalida_el_indice_de_sensores(self):
+        # Un lector preguntó por el tag antes del alta: quedó en el índice como no registrado
+        indice_sensores.vaciar()
+        self.assertIsNone(indice_sensores.obtener('TAG-NUEVO'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/sensores/importar/', [{'codigo_sensor': 'TAG-NUEVO'}], format='json')
+        self.assertEqual(indice_sensores.obtener('TAG-NUEVO').codigo_sensor, 'TAG-NUEVO')
+
+    def test_residentes_duplicados_en_el_archivo_y_en_la_bd(self):
+        base = {'nombres': 'Ana', 'apellidos': 'Pérez', 'password': 'clave-segura-123'}
+        respuesta = self.client.post('/api/usuarios/importar/', [
+            {**base, 'rut': '2-7', 'email': 'ana@test.cl', 'departamento_numero': '101'},
+            {**base, 'rut': '2-7', 'email': 'otra@test.cl'},         # RUT repetido en el archivo
+            {**base, 'rut': '1-9', 'email': 'admin@test.cl'},        # RUT y email ya en la BD
+            {**base, 'rut': '3-5', 'email': 'no-es-correo', 'nombres': ''},
+        ], format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        reporte = respuesta.json()
+        self.assertEqual(reporte['creados'], 1)
+        errores = {e['indice']: e['errores'] for e in reporte['errores']}
+        self.assertIn('rut', errores[1])
+        self.assertIn('rut', errores[2])
+        self.assertEqual(set(errores[3]), {'email', 'nombres'})
+        nuevo = Usuario.objects.get(rut='2-7')
+        self.assertEqual((nuevo.username, nuevo.departamento), ('2-7', self.depto))
+        self.assertTrue(nuevo.check_password('clave-segura-123'))
+
+
+# ==============================================================================
+# HASHEO DE CONTRASEÑAS EN PARALELO
+# ==============================================================================
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class HasheoTests(TestCase):
+
+    def passwords(self, cantidad):
+        return [f'clave-{i}' for i in range(cantidad)]
+
+    def test_hashes_del_pool_se_verifican(self):
+        passwords = self.passwords(MINIMO_PARA_PROCESOS)
+        hashes = hashear_passwords(passwords, procesos=2)
+        # Mismo orden que la entrada y mismo hasher que make_password en este proceso
+        self.assertEqual(len(hashes), len(passwords))
+        for password, hash_password in zip(passwords, hashes):
+            self.assertTrue(hash_password.startswith('md5$'))
+            self.assertTrue(check_password(password, hash_password))
+
+    def test_sin_procesos_hashea_en_este_proceso(self):
+        with mock.patch('api.hasheo.ProcessPoolExecutor', side_effect=AssertionError('no debía usar procesos')):
+            for passwords, procesos in ((self.passwords(MINIMO_PARA_PROCESOS), 1),
+                                        (self.passwords(MINIMO_PARA_PROCESOS - 1), 4),
+                                        ([], None)):
+                hashes = hashear_passwords(passwords, procesos=procesos)
+                self.assertEqual(len(hashes), len(passwords))
+                for password, hash_password in zip(passwords, hashes):
+                    self.assertTrue(check_password(password, hash_password))
+
+
+# ==============================================================================
+# RESUMEN POR HORA (GET /api/eventos/estadisticas/)
+# ==============================================================================
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class EstadisticasTests(TestCase):
+
+    def setUp(self):
+        self.admin = Usuario.objects.create_user(
+            username='admin', email='admin@test.cl', password='clave-segura-123',
+            nombres='Admin', apellidos='Test', rol='admin',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def por_tipo(self):
+        respuesta = self.client.get('/api/eventos/estadisticas/?agrupar=tipo_evento')
+        self.assertEqual(respuesta.status_code, 200)
+        return {fila['tipo_evento']: fila['total'] for fila in respuesta.json()['resultados']}
+
+    def test_filtro_invalido_es_400(self):
+        respuesta = self.client.get('/api/eventos/estadisticas/?departamento=abc')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('departamento', respuesta.json())
+
+    def test_editar_y_borrar_ajustan_el_resumen(self):
+        evento = Evento.objects.create(tipo_evento='ACCESO_VALIDO', resultado='PERMITIDO')
+        self.assertEqual(self.por_tipo(), {'ACCESO_VALIDO': 1})
+
+        respuesta = self.client.patch(f'/api/eventos/{evento.pk}/', {'tipo_evento': 'ACCESO_RECHAZADO'}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.por_tipo(), {'ACCESO_RECHAZADO': 1})
+
+        self.assertEqual(self.client.delete(f'/api/eventos/{evento.pk}/').status_code, 204)
+        self.assertEqual(self.por_tipo(), {})
+
+
+# ==============================================================================
+# BUFFER DE EVENTOS (write-behind con diario en disco)
+# ==============================================================================
+# TransactionTestCase: el hilo del buffer escribe con su propia conexión
+class BufferEventosTests(TransactionTestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = Path(directorio.name)
+
+    def crear_buffer(self, **opciones):
+        # Intervalo largo: el hilo sólo escribe cuando el test lo pide (vaciar/detener)
+        buffer = BufferEventos(directorio=self.directorio, intervalo=3600, **opciones)
+        self.addCleanup(buffer.detener)
+        return buffer
+
+    def escribir_diario(self, nombre, filas):
+        with open(self.directorio / nombre, 'w', encoding='utf-8') as archivo:
+            for fila in filas:
+                archivo.write(json.dumps(fila) + '\n')
+
+    def test_id_externo_nulo_recibe_uno_y_se_drena_al_cerrar(self):
+        buffer = self.crear_buffer()
+        id_externo = buffer.agregar({'tipo_evento': 'ACCESO_VALIDO', 'id_externo': None, 'fecha_hora': None})
+        self.assertTrue(id_externo)
+        self.assertEqual(Evento.objects.count(), 0)
+
+        buffer.detener()
+        self.assertTrue(Evento.objects.filter(id_externo=id_externo).exists())
+        self.assertEqual(list(self.directorio.iterdir()), [])
+
+    def test_cola_llena_desborda_al_diario(self):
+        buffer = self.crear_buffer(capacidad=1)
+        ids = [buffer.agregar({'tipo_evento': 'ACCESO_VALIDO'}) for _ in range(3)]
+        metricas = buffer.metricas()
+        self.assertEqual((metricas['en_cola'], metricas['desbordados']), (1, 2))
+
+        buffer.vaciar()
+        self.assertEqual(set(Evento.objects.values_list('id_externo', flat=True)), set(ids))
+
+    def test_reescribir_el_diario_no_duplica(self):
+        buffer = self.crear_buffer()
+        id_externo = buffer.agregar({'tipo_evento': 'ACCESO_VALIDO'})
+        buffer.vaciar()
+        # El mismo evento vuelve a aparecer en un segmento pendiente (caída antes de truncar)
+        self.escribir_diario(f'eventos-{os.getpid()}.000099.pendiente', [
+            {'tipo_evento': 'ACCESO_VALIDO', 'id_externo': id_externo},
+            {'tipo_evento': 'ACCESO_RECHAZADO', 'id_externo': 'nuevo'},
+        ])
+        buffer.vaciar()
+        self.assertEqual(Evento.objects.count(), 2)
+        self.assertEqual(buffer.duplicados, 1)
+
+    def test_recupera_diarios_de_procesos_muertos(self):
+        muerto = next(pid for pid in range(4_000_000, 3_000_000, -1) if not _proceso_vivo(pid))
+        self.escribir_diario(f'eventos-{muerto}.ndjson', [
+            {'tipo_evento': 'ACCESO_VALIDO', 'id_externo': 'huerfano-1'},
+            {'tipo_evento': 'ACCESO_VALIDO', 'id_externo': 'huerfano-2'},
+        ])
+        buffer = self.crear_buffer()
+        buffer.agregar({'tipo_evento': 'ACCESO_VALIDO', 'id_externo': 'propio'})
+        buffer.detener()
+        self.assertEqual(
+            set(Evento.objects.values_list('id_externo', flat=True)), {'huerfano-1', 'huerfano-2', 'propio'},
+        )
+        self.assertFalse((self.directorio / f'eventos-{muerto}.ndjson').exists())
+
+
+# ==============================================================================
+# VISTAS ASYNC DE DISPOSITIVOS
+# ==============================================================================
+# TransactionTestCase: con el buffer, el hilo de fondo escribe con su propia conexión
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class DispositivosAsyncTests(TransactionTestCase):
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            username='barrera', email='barrera@test.cl', password='clave-segura-123',
+            nombres='Barrera', apellidos='Test',
+        )
+        self.sensor = Sensor.objects.create(codigo_sensor='TAG1', usuario=self.usuario)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.usuario).access_token}')
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = Path(directorio.name)
+        self.buffer = BufferEventos(directorio=self.directorio, intervalo=3600)
+        self.addCleanup(self.buffer.detener)
+        parche = mock.patch('api.views.buffer_eventos', self.buffer)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def subir(self, eventos):
+        return self.client.post('/api/dispositivos/eventos/', eventos, format='json', HTTP_X_DISPOSITIVO_ID='B1')
+
+    @override_settings(EVENTOS_BUFFER_ACTIVO=False)
+    def test_registrar_sin_buffer_inserta_y_reporta(self):
+        respuesta = self.subir([
+            {'tipo_evento': 'ACCESO_VALIDO', 'codigo_sensor': 'TAG1', 'id_externo': 'ev-1'},
+            {'tipo_evento': 'NO_EXISTE'},
+        ])
+        self.assertEqual(respuesta.status_code, 200)
+        reporte = respuesta.json()
+        self.assertEqual((reporte['recibidos'], reporte['creados']), (2, 1))
+        self.assertEqual([e['indice'] for e in reporte['errores']], [1])
+        self.assertEqual(Evento.objects.get(id_externo='ev-1').sensor, self.sensor)
+        self.assertEqual(list(self.directorio.iterdir()), [])
+
+    @override_settings(EVENTOS_BUFFER_ACTIVO=True)
+    def test_registrar_con_buffer_encola_solo_campos_validados(self):
+        respuesta = self.subir([
+            {'tipo_evento': 'ACCESO_VALIDO', 'codigo_sensor': 'TAG1', 'self': 1, 'extra': 'x'},
+            {'tipo_evento': 'ACCESO_RECHAZADO', 'id_externo': 'ev-2', 'fecha_hora': '2025-03-01T10:00:00'},
+            {'tipo_evento': ['ACCESO_VALIDO']},
+        ])
+        self.assertEqual(respuesta.status_code, 202)
+        cuerpo = respuesta.json()
+        self.assertEqual(cuerpo['recibidos'], 3)
+        self.assertEqual(len(cuerpo['encolados']), 2)
+        self.assertEqual(cuerpo['encolados'][1], 'ev-2')
+        self.assertEqual([e['indice'] for e in cuerpo['errores']], [2])
+        self.assertIn('tipo_evento', cuerpo['errores'][0]['errores'])
+
+        # En el diario sólo quedan los campos de validar_fila_evento
+        with open(self.directorio / f'eventos-{os.getpid()}.ndjson', encoding='utf-8') as archivo:
+            filas = [json.loads(linea) for linea in archivo]
+        self.assertEqual(len(filas), 2)
+        self.assertNotIn('self', filas[0])
+        self.assertNotIn('extra', filas[0])
+        self.assertEqual(filas[1]['id_externo'], 'ev-2')
+
+        self.buffer.detener()
+        self.assertEqual(Evento.objects.count(), 2)
+        self.assertEqual(Evento.objects.get(id_externo=cuerpo['encolados'][0]).sensor, self.sensor)
+
+    @override_settings(EVENTOS_BUFFER_ACTIVO=True)
+    def test_validar_con_buffer_devuelve_id_externo(self):
+        respuesta = self.client.post('/api/dispositivos/validar/', {
+            'codigo_sensor': 'TAG1', 'dispositivo_id': 'B1', 'registrar': True,
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertTrue(datos['permitido'])
+        self.assertIsNone(datos['evento'])
+        self.buffer.detener()
+        self.assertEqual(Evento.objects.get(id_externo=datos['id_externo']).sensor, self.sensor)
+
+    def test_reclamar_comando(self):
+        comando = ComandoRemoto.objects.create(dispositivo_id='B1', comando='ABRIR')
+        respuesta = self.client.post('/api/dispositivos/B1/comandos/reclamar/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['id'], comando.pk)
+        self.assertEqual(self.client.post('/api/dispositivos/B1/comandos/reclamar/').status_code, 204)
+
+
+# ==============================================================================
+# SINCRONIZACIÓN DE LA APP (GET /api/sync/)
+# ==============================================================================
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], SYNC_MARGEN_SEGUNDOS=60)
+class SincronizacionTests(TestCase):
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            username='vecino', email='vecino@test.cl', password='clave-segura-123',
+            nombres='Vecino', apellidos='Test',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def sincronizar(self, token=None):
+        respuesta = self.client.get('/api/sync/', {'token': token} if token else {})
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def ids_eventos(self, datos):
+        return [evento['id'] for evento in datos['cambios']['eventos']]
+
+    def test_token_trae_solo_cambios_y_lapidas(self):
+        token = self.sincronizar()['token']
+        sensor = Sensor.objects.create(codigo_sensor='TAG1', usuario=self.usuario)
+        evento = Evento.objects.create(sensor=sensor, tipo_evento='ACCESO_VALIDO', resultado='PERMITIDO')
+
+        datos = self.sincronizar(token)
+        self.assertEqual([s['id'] for s in datos['cambios']['sensores']], [sensor.pk])
+        self.assertEqual(self.ids_eventos(datos), [evento.pk])
+
+        sensor_id = sensor.pk
+        sensor.delete()
+        datos = self.sincronizar(datos['token'])
+        self.assertEqual(datos['eliminados'], {'sensores': [sensor_id]})
+
+        datos = self.sincronizar(datos['token'])
+        self.assertEqual((self.ids_eventos(datos), datos['eliminados']), ([], {}))
+
+    def test_evento_confirmado_tarde_no_se_pierde(self):
+        token = self.sincronizar()['token']
+        primero, lento, tercero = (
+            Evento.objects.create(tipo_evento='ACCESO_VALIDO', resultado='PERMITIDO') for _ in range(3)
+        )
+        # La transacción de `lento` todavía no confirma cuando la app sincroniza
+        Evento.objects.filter(pk=lento.pk)._raw_delete('default')
+        datos = self.sincronizar(token)
+        self.assertEqual(self.ids_eventos(datos), [primero.pk, tercero.pk])
+
+        Evento.objects.bulk_create([lento])
+        datos = self.sincronizar(datos['token'])
+        self.assertEqual(self.ids_eventos(datos), [lento.pk])
+        # Ya entregado: no se repite
+        self.assertEqual(self.ids_eventos(self.sincronizar(datos['token'])), [])
+
+    def test_token_invalido_es_400(self):
+        self.assertEqual(self.client.get('/api/sync/', {'token': 'basura'}).status_code, 400)
+
+
+# ==============================================================================
+# ARCHIVO DE EVENTOS (historial y exportación leen BD + archivo)
+# ==============================================================================
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ArchivoEventosTests(TestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(EVENTOS_ARCHIVO_DIR=directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        admin = Usuario.objects.create_user(
+            username='admin', email='admin@test.cl', password='clave-segura-123',
+            nombres='Admin', apellidos='Test', rol='admin',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+        hace_40_dias = timezone.now() - timedelta(days=40)
+        viejos = [
+            Evento.objects.create(
+                tipo_evento='ACCESO_RECHAZADO' if i % 3 == 0 else 'ACCESO_VALIDO', resultado='X',
+                # Dos eventos por instante: el id desempata
+                fecha_hora=hace_40_dias.replace(hour=12) - timedelta(minutes=i // 2),
+            )
+            for i in range(7)
+        ]
+        nuevos = [Evento.objects.create(tipo_evento='ACCESO_VALIDO', resultado='X') for _ in range(2)]
+        self.orden = [e.pk for e in sorted(viejos + nuevos, key=lambda e: (e.fecha_hora, e.pk), reverse=True)]
+
+        # Bloques de 2 filas: las páginas profundas saltan entre miembros gzip
+        with mock.patch('api.archivo_eventos.FILAS_POR_BLOQUE', 2):
+            archivo_eventos.archivar(dias=30)
+        self.assertEqual(Evento.objects.count(), 2)
+
+    def test_historial_pagina_sobre_bd_y_archivo(self):
+        ids, url = [], '/api/eventos/?page_size=2'
+        while url:
+            datos = self.client.get(url).json()
+            ids += [evento['id'] for evento in datos['results']]
+            url = datos['next']
+        self.assertEqual(ids, self.orden)
+
+        rechazados = self.client.get('/api/eventos/?tipo_evento=ACCESO_RECHAZADO&page_size=50').json()
+        self.assertEqual(len(rechazados['results']), 3)
+
+    def test_exportacion_incluye_el_archivo(self):
+        respuesta = self.client.get('/api/eventos/exportar/?formato=ndjson')
+        self.assertEqual(respuesta.status_code, 200)
+        filas = [json.loads(linea) for linea in b''.join(respuesta.streaming_content).splitlines()]
+        self.assertEqual([fila['id'] for fila in filas], self.orden)
+
+
+# ==============================================================================
+# AUTENTICACIÓN JWT (usuario en cache y vistas de dispositivos)
+# ==============================================================================
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], API_AUTH_MODO='cache')
+class AutenticacionTests(TestCase):
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            username='barrera', email='barrera@test.cl', password='clave-segura-123',
+            nombres='Barrera', apellidos='Test', rol='admin',
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.usuario).access_token}')
+
+    def test_desactivar_invalida_el_usuario_en_cache(self):
+        self.assertEqual(self.client.get('/api/departamentos/').status_code, 200)
+        # Ya en cache: la petición siguiente no consulta el usuario
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/departamentos/').status_code, 200)
+
+        self.usuario.is_active = False
+        self.usuario.save()
+        self.assertEqual(self.client.get('/api/departamentos/').status_code, 401)
+
+    def test_cambio_de_rol_se_nota_al_instante(self):
+        self.assertEqual(self.client.get('/api/eventos/exportar/').status_code, 200)
+        self.usuario.rol = 'operador'
+        self.usuario.save()
+        self.assertEqual(self.client.get('/api/eventos/exportar/').status_code, 403)
+
+    def test_validar_devuelve_ids_y_numero_de_departamento(self):
+        depto = Departamento.objects.create(numero='101-B')
+        sensor = Sensor.objects.create(codigo_sensor='TAG1', usuario=self.usuario, departamento=depto)
+        respuesta = self.client.post('/api/dispositivos/validar/', {
+            'codigo_sensor': 'TAG1', 'dispositivo_id': 'B1', 'registrar': False,
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual(
+            (datos['sensor'], datos['usuario'], datos['departamento'], datos['departamento_numero']),
+            (sensor.pk, self.usuario.pk, depto.pk, '101-B'),
+        )
+
+    def test_usuario_desactivado_no_deja_long_poll_abierto(self):
+        self.usuario.is_active = False
+        self.usuario.save()
+        respuesta = self.client.get('/api/dispositivos/B1/comandos/esperar/?timeout=0')
+        self.assertEqual(respuesta.status_code, 401)
+
+
+# ==============================================================================
+# LISTA DE ACCESO OFFLINE (registro de cambios)
+# ==============================================================================
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ListaAccesoTests(TestCase):
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            username='vecino', email='vecino@test.cl', password='clave-segura-123',
+            nombres='Vecino', apellidos='Test',
+        )
+
+    def test_login_no_lee_el_usuario_previo(self):
+        Sensor.objects.create(codigo_sensor='TAG1', usuario=self.usuario)
+        version = version_actual()
+        # Solo el UPDATE de last_login: ni SELECT previo ni cambio en la lista
+        with self.assertNumQueries(1):
+            self.usuario.last_login = timezone.now()
+            self.usuario.save(update_fields=['last_login'])
+        self.assertEqual(version_actual(), version)
+
+    def test_snapshot_un_armado_por_formato_y_tasa(self):
+        Sensor.objects.create(codigo_sensor='TAG1')
+        cache = CacheSnapshot()
+        with mock.patch('api.lista_acceso._snapshot_bloom', wraps=_snapshot_bloom) as bloom, \
+             mock.patch('api.lista_acceso._snapshot_ordenado', wraps=_snapshot_ordenado) as ordenado:
+            # Barreras con distintos formatos y tasas no se desalojan entre sí
+            for _ in range(2):
+                cache.obtener(TIPO_ORDENADO)
+                for tasa in (0.001, 0.0015, 0.01, 0.0123456):
+                    cache.obtener(TIPO_BLOOM, tasa)
+            self.assertEqual(ordenado.call_count, 1)
+            # 0.0015 -> 0.001 y 0.0123456 -> 0.01: sólo dos armados de bloom
+            self.assertEqual(bloom.call_count, 2)
+
+            # Una versión nueva descarta las anteriores
+            Sensor.objects.create(codigo_sensor='TAG2')
+            version, _ = cache.obtener(TIPO_BLOOM, 0.01)
+            self.assertEqual(bloom.call_count, 3)
+            self.assertEqual(set(cache._guardado), {(TIPO_BLOOM, 0.01)})
+            self.assertEqual(version, version_actual())
+        self.assertEqual(tasa_falsos_positivos(1e-12), TASAS_FALSOS_POSITIVOS[-1])
+        self.assertEqual(tasa_falsos_positivos(float('nan')), TASAS_FALSOS_POSITIVOS[-1])
+
+    def test_compactar_conserva_la_version_y_pide_snapshot_a_los_atrasados(self):
+        for i in range(3):
+            Sensor.objects.create(codigo_sensor=f'TAG{i}')
+        version = version_actual()
+        CambioListaAcceso.objects.update(fecha=timezone.now() - timedelta(days=40))
+        Sensor.objects.create(codigo_sensor='TAG-NUEVO')
+
+        self.assertEqual(compactar_cambios(dias=30), 3)
+        self.assertEqual(version_actual(), version + 1)
+        # La barrera que aplicó `version` sigue con deltas; una más vieja baja el snapshot
+        self.assertEqual(len(cambios_desde(version)['altas']), 1)
+        self.assertIsNone(cambios_desde(version - 2))
+        # Aunque sea viejo, el último cambio no se borra (es la versión actual)
+        CambioListaAcceso.objects.update(fecha=timezone.now() - timedelta(days=40))
+        compactar_cambios(dias=30)
+        self.assertEqual(version_actual(), version + 1)
+
+
+# ==============================================================================
+# COLA DE COMANDOS REMOTOS (reclamar / confirmar)
+# ==============================================================================
+@override_settings(COMANDOS_RECLAMO_TIMEOUT=60)
+class ColaComandosTests(TestCase):
+
+    def test_reclamo_sin_confirmar_se_vuelve_a_entregar(self):
+        comando = ComandoRemoto.objects.create(dispositivo_id='B1', comando='ABRIR')
+        self.assertEqual(reclamar_comando('B1').pk, comando.pk)
+        # Dentro del plazo nadie más lo recibe
+        self.assertIsNone(reclamar_comando('B1'))
+
+        # La barrera nunca confirmó: vencido el plazo vuelve a la cola
+        ComandoRemoto.objects.filter(pk=comando.pk).update(
+            fecha_reclamo=timezone.now() - timedelta(seconds=61),
+        )
+        self.assertEqual(reclamar_comando('B1').pk, comando.pk)
+        self.assertIsNotNone(confirmar_comando('B1', comando.pk))
+        ComandoRemoto.objects.filter(pk=comando.pk).update(
+            fecha_reclamo=timezone.now() - timedelta(seconds=61),
+        )
+        # Confirmado: no se entrega nunca más
+        self.assertIsNone(reclamar_comando('B1'))
+
+    def test_reclamos_simultaneos_no_se_llevan_el_mismo(self):
+        primero = ComandoRemoto.objects.create(dispositivo_id='B1', comando='ABRIR')
+        segundo = ComandoRemoto.objects.create(dispositivo_id='B1', comando='CERRAR')
+        ahora = timezone.now
+        llamadas, otro = [], []
+
+        def otro_worker_reclama():
+            # 1ª llamada: plazo del préstamo; 2ª: justo después de elegir la fila y
+            # antes de marcarla. Ahí otra petición reclama la misma fila.
+            llamadas.append(None)
+            if len(llamadas) == 2:
+                otro.append(reclamar_comando('B1'))
+            return ahora()
+
+        with mock.patch('api.comandos.connection.features.has_select_for_update_skip_locked', False), \
+                mock.patch('api.comandos.timezone.now', side_effect=otro_worker_reclama):
+            reclamado = reclamar_comando('B1')
+        self.assertEqual(otro[0].pk, primero.pk)
+        self.assertEqual(reclamado.pk, segundo.pk)
+
+
+# ==============================================================================
+# BENCHMARK (humo: que el sembrado y los escenarios sigan funcionando)
+# ==============================================================================
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BenchmarkTests(TestCase):
+
+    def test_sembrar_y_medir(self):
+        from .benchmark import sembrar, ejecutar_benchmark, obtener_token, ClienteLocal, metricas_locales
+
+        sembrar(departamentos=5, usuarios=10, sensores=20, eventos=200, comandos=4, dispositivos=2)
+        self.assertEqual(Evento.objects.count(), 200)
+
+        token = obtener_token(ClienteLocal())
+        reporte = ejecutar_benchmark(
+            ClienteLocal, metricas_locales, token, ['validar', 'listar_eventos', 'reclamar_comando'],
+            peticiones=6, clientes=1, calentamiento=0,
+        )
+        for nombre, datos in reporte.items():
+            self.assertEqual(datos['peticiones'], 6, nombre)
+            self.assertEqual(datos['errores'], 0, nombre)
+            self.assertIsNotNone(datos['p95_ms'], nombre)
+        self.assertEqual(reporte['listar_eventos']['queries_por_peticion'], 1.0)
+
+
+# ==============================================================================
+# RÉPLICAS DE LECTURA (router y primaria pegajosa)
+# ==============================================================================
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], DB_REPLICA_PEGAJOSO=5)
+class EnrutadorReplicasTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        parche = mock.patch('api.enrutador_bd.replicas', return_value=['replica_1'])
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.router = EnrutadorReplicas()
+
+    def leer(self, usuario_id, cookies=None, en_transaccion=False):
+        """Alias al que iría una lectura hecha dentro de una petición GET."""
+        conexion = mock.Mock(in_atomic_block=en_transaccion)
+        token = permitir_replica(usuario_id, cookies)
+        try:
+            with mock.patch('api.enrutador_bd.connections', {'default': conexion}):
+                return self.router.db_for_read(Sensor) or 'default'
+        finally:
+            restaurar(token)
+
+    def test_lecturas_a_la_replica_y_escrituras_a_la_primaria(self):
+        self.assertEqual(self.leer(1), 'replica_1')
+        self.assertEqual(self.router.db_for_write(Sensor), 'default')
+        # Fuera de una petición que lo permita, o dentro de una transacción: primaria
+        self.assertIsNone(self.router.db_for_read(Sensor))
+        self.assertEqual(self.leer(1, en_transaccion=True), 'default')
+        self.assertFalse(self.router.allow_migrate('replica_1', 'api'))
+
+    def test_primaria_pegajosa_despues_de_escribir(self):
+        marcar_escritura(1)
+        self.assertEqual(self.leer(1), 'default')
+        self.assertEqual(self.leer(2), 'replica_1')   # sólo para quien escribió
+        # Vencida la marca vuelve a la réplica
+        cache.delete('api:bd_primaria:1')
+        self.assertEqual(self.leer(1), 'replica_1')
+
+    def test_cookie_lleva_la_marca_a_otro_worker(self):
+        admin = Usuario.objects.create_user(
+            username='admin', email='admin@test.cl', password='clave-segura-123',
+            nombres='Admin', apellidos='Test', rol='admin',
+        )
+        client = APIClient()
+        client.force_authenticate(admin)
+        respuesta = client.post('/api/departamentos/', {'numero': '101'}, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        cookie = respuesta.cookies[COOKIE_PRIMARIA]
+        self.assertEqual(cookie['max-age'], 5)
+        self.assertEqual(self.leer(admin.pk), 'default')
+        # Otro worker con su propio LocMemCache no tiene la marca, pero sí la cookie
+        cache.clear()
+        self.assertEqual(self.leer(admin.pk), 'replica_1')
+        self.assertEqual(self.leer(admin.pk, {COOKIE_PRIMARIA: '1'}), 'default')
+
+    def test_escritura_rechazada_no_marca_la_primaria(self):
+        admin = Usuario.objects.create_user(
+            username='admin', email='admin@test.cl', password='clave-segura-123',
+            nombres='Admin', apellidos='Test', rol='admin',
+        )
+        client = APIClient()
+        client.force_authenticate(admin)
+        respuesta = client.post('/api/departamentos/', {'piso': 'no-es-numero'}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertNotIn(COOKIE_PRIMARIA, respuesta.cookies)
+        self.assertEqual(self.leer(admin.pk), 'replica_1')
+
+
+# ==============================================================================
+# RÁFAGAS DE ACCESOS RECHAZADOS (ventana deslizante)
+# ==============================================================================
+@override_settings(RECHAZOS_VENTANA=60, RECHAZOS_UMBRAL_SENSOR=3, RECHAZOS_UMBRAL_DISPOSITIVO=4)
+class DetectorRechazosTests(TestCase):
+
+    def test_ventana_desliza_por_buckets(self):
+        ventana = VentanaDeslizante(ventana=60, buckets=12)   # buckets de 5 s
+        for segundo in (0, 10, 20):
+            ventana.sumar('B1', ahora=segundo)
+        self.assertEqual(ventana.total('B1', ahora=59), 3)
+        # A los 60 s vence sólo el bucket del segundo 0
+        self.assertEqual(ventana.total('B1', ahora=64), 2)
+        self.assertEqual(ventana.sumar('B1', ahora=75), 2)
+        # Una ventana entera sin actividad deja la clave en 0
+        self.assertEqual(ventana.total('B1', ahora=200), 0)
+        self.assertEqual(ventana.total('otra', ahora=200), 0)
+
+    def test_umbral_de_sensor_bloquea_y_se_reinicia(self):
+        detector = DetectorRechazos()
+        sensor = Sensor.objects.create(codigo_sensor='TAG1')
+        self.assertEqual(detector.registrar([sensor.pk, sensor.pk]), [])
+        self.assertEqual(detector.registrar([sensor.pk, None]), [sensor.pk])
+        # Avisado una vez, hace falta otra ráfaga completa para volver a avisar
+        self.assertEqual(detector.registrar([sensor.pk, sensor.pk]), [])
+        with self.assertLogs('api.rechazos', 'WARNING'):
+            self.assertEqual(bloquear_sensores([sensor.pk, sensor.pk]), 1)
+        sensor.refresh_from_db()
+        self.assertEqual(sensor.estado, 'bloqueado')
+        self.assertEqual(bloquear_sensores([sensor.pk]), 0)
+
+    def test_dispositivo_bloqueado_hasta_que_se_enfria_la_ventana(self):
+        detector = DetectorRechazos()
+        inicio = time.monotonic()
+        with mock.patch('api.rechazos.time.monotonic', return_value=inicio):
+            detector.registrar([None, None, None], dispositivo_id='B1')
+            self.assertFalse(detector.dispositivo_bloqueado('B1'))
+            detector.registrar([None], dispositivo_id='B1')
+            self.assertTrue(detector.dispositivo_bloqueado('B1'))
+            self.assertFalse(detector.dispositivo_bloqueado('B2'))
+        with mock.patch('api.rechazos.time.monotonic', return_value=inicio + 61):
+            self.assertFalse(detector.dispositivo_bloqueado('B1'))
+
+
+# ==============================================================================
+# MÉTRICAS (GET /api/metrics/)
+# ==============================================================================
+class MetricasTests(TestCase):
+
+    @override_settings(METRICAS_TOKEN='', DEBUG=False)
+    def test_sin_token_solo_con_debug(self):
+        self.assertEqual(APIClient().get('/api/metrics/').status_code, 403)
+        with self.settings(DEBUG=True):
+            self.assertEqual(APIClient().get('/api/metrics/').status_code, 200)
+
+    @override_settings(METRICAS_TOKEN='secreto', DEBUG=True)
+    def test_con_token_lo_exige(self):
+        self.assertEqual(APIClient().get('/api/metrics/').status_code, 401)
+        self.assertEqual(APIClient().get('/api/metrics/', HTTP_AUTHORIZATION='Bearer otro').status_code, 401)
+        respuesta = APIClient().get('/api/metrics/', HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(respuesta.status_code, 200)
+
+
+# ==============================================================================
+# ADMIN DE TABLAS GRANDES (/admin/api/evento/)
+# ==============================================================================
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], ADMIN_CONTEO_MAX=10)
+class AdminEventosTests(TestCase):
+
+    def setUp(self):
+        self.admin = Usuario.objects.create_superuser(
+            username='admin', email='admin@test.cl', password='clave-segura-123',
+            nombres='Admin', apellidos='Test', rol='admin',
+        )
+        self.client.force_login(self.admin)
+        self.inicio = timezone.make_aware(datetime(2025, 3, 1, 10))
+
+    def crear_eventos(self, cantidad):
+        # Siempre los mismos 3 días: el date_hierarchy prueba días, no filas
+        Evento.objects.bulk_create([
+            Evento(
+                sensor=Sensor.objects.create(codigo_sensor=f'TAG{Sensor.objects.count()}', usuario=self.admin),
+                usuario=self.admin, tipo_evento='ACCESO_VALIDO', resultado='PERMITIDO',
+                fecha_hora=self.inicio + timedelta(days=i % 3),
+            )
+            for i in range(cantidad)
+        ])
+
+    def queries_del_listado(self, parametros):
+        with CaptureQueriesContext(connection) as contexto:
+            respuesta = self.client.get('/admin/api/evento/', parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        sql = [query['sql'] for query in contexto.captured_queries]
+        # Ningún COUNT(*) recorre la tabla: el del paginador va sobre un subquery con LIMIT
+        for sentencia in sql:
+            if 'COUNT(' in sentencia.upper() and 'eventos_acceso' in sentencia:
+                self.assertIn('LIMIT', sentencia.upper(), sentencia)
+        return len(sql), respuesta
+
+    def test_listado_cuesta_lo_mismo_con_mas_filas(self):
+        for parametros in ({}, {'fecha_hora__year': 2025, 'fecha_hora__month': 3}):
+            with self.subTest(parametros=parametros):
+                Evento.objects.all().delete()
+                # Ambos pasan ADMIN_CONTEO_MAX: el total es estimado/acotado, no un COUNT(*) completo
+                self.crear_eventos(12)
+                pocas, _ = self.queries_del_listado(parametros)
+                self.crear_eventos(30)
+                muchas, respuesta = self.queries_del_listado(parametros)
+                self.assertEqual(pocas, muchas)
+                self.assertGreaterEqual(respuesta.context['cl'].result_count, 10)
+
+    def test_formulario_usa_autocompletar_y_no_lista_los_sensores(self):
+        self.crear_eventos(3)
+        respuesta = self.client.get('/admin/api/evento/add/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, 'admin-autocomplete')
+        self.assertNotContains(respuesta, 'TAG2')
+
+    def test_date_hierarchy_solo_muestra_dias_con_eventos(self):
+        self.crear_eventos(3)
+        _, respuesta = self.queries_del_listado({'fecha_hora__year': 2025, 'fecha_hora__month': 3})
+        dias = [fecha.day for fecha in respuesta.context['cl'].queryset.datetimes('fecha_hora', 'day')]
+        self.assertEqual(dias, [1, 2, 3])
+        self.assertContains(respuesta, 'fecha_hora__day=2')
+        self.assertNotContains(respuesta, 'fecha_hora__day=4')
+
+
+# ==============================================================================
+# READINESS (GET /api/ready/)
+# ==============================================================================
+class ReadinessTests(TestCase):
+
+    def test_ok_y_degradado(self):
+        respuesta = APIClient().get('/api/ready/')
+        self.assertEqual(respuesta.status_code, 200)
+        bd = respuesta.json()['bd']['default']
+        self.assertIn('ping_ms', bd)
+        # La conexión de este hilo cuenta como abierta y, dentro del test, en transacción
+        self.assertGreaterEqual(bd['proceso']['abiertas'], 1)
+        self.assertGreaterEqual(bd['proceso']['en_transaccion'], 1)
+        self.assertGreaterEqual(bd['proceso']['aperturas'], 1)
+
+        # Un umbral imposible de cumplir saca al worker de la rotación
+        with self.settings(SALUD_BD_PING_MAX_MS=1e-9):
+            respuesta = APIClient().get('/api/ready/')
+        self.assertEqual(respuesta.status_code, 503)
+        self.assertEqual(respuesta.json()['status'], 'degradado')
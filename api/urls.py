@@ -10,13 +10,23 @@ from rest_framework_simplejwt.views import (
 # Importamos tus vistas
 from .views import (
     health, 
+    ready,
     InfoView, 
     UsuarioViewSet, 
     DepartamentoViewSet, 
     SensorViewSet, 
     EventoViewSet, 
-    ComandoRemotoViewSet
+    ComandoRemotoViewSet,
+    validar_sensor,
+    registrar_eventos,
+    ListaAccesoView,
+    CambiosListaAccesoView,
+    reclamar_siguiente_comando,
+    ConfirmarComandoView,
+    esperar_comando,
+    SincronizacionView,
 )
+from .metricas import vista_metricas
 
 # Configuración del Router Automático
 router = routers.DefaultRouter()
@@ -35,7 +45,27 @@ urlpatterns = [
 
     # --- TUS ENDPOINTS ---
     path('health/', health, name='health'),
+    path('ready/', ready, name='ready'), # Readiness: BD, conexiones y buffer (503 si está degradado)
     path('info/', InfoView.as_view(), name='info'), # Requerimiento /api/info/
+    path('metrics/', vista_metricas, name='metricas'), # Latencia/queries por ruta (Prometheus)
+    # GET /api/sync/?token= -> Cambios y borrados desde el último token (cache offline de la app)
+    path('sync/', SincronizacionView.as_view(), name='sincronizacion'),
+
+    # --- ENDPOINTS DE DISPOSITIVOS (Barrera) ---
+    # POST /api/dispositivos/validar/ -> Envías codigo_sensor y te dice si abrir
+    path('dispositivos/validar/', validar_sensor, name='validar_sensor'),
+    # POST /api/dispositivos/eventos/ -> Sube uno o varios eventos (async)
+    path('dispositivos/eventos/', registrar_eventos, name='registrar_eventos'),
+    # GET /api/dispositivos/lista-acceso/         -> Snapshot binario de códigos permitidos (offline)
+    # GET /api/dispositivos/lista-acceso/cambios/ -> Altas/bajas desde una versión
+    path('dispositivos/lista-acceso/', ListaAccesoView.as_view(), name='lista_acceso'),
+    path('dispositivos/lista-acceso/cambios/', CambiosListaAccesoView.as_view(), name='lista_acceso_cambios'),
+    # GET /api/dispositivos/<id>/comandos/esperar/ -> Long-poll o SSE hasta que llegue un comando
+    path('dispositivos/<str:dispositivo_id>/comandos/esperar/', esperar_comando, name='esperar_comando'),
+    # POST /api/dispositivos/<id>/comandos/reclamar/       -> Toma el próximo comando pendiente
+    # POST /api/dispositivos/<id>/comandos/<pk>/confirmar/ -> Avisa que ya lo ejecutó
+    path('dispositivos/<str:dispositivo_id>/comandos/reclamar/', reclamar_siguiente_comando, name='reclamar_comando'),
+    path('dispositivos/<str:dispositivo_id>/comandos/<int:pk>/confirmar/', ConfirmarComandoView.as_view(), name='confirmar_comando'),
     
     # Incluimos el resto (CRUDs)
     path('', include(router.urls)),
@@ -1,5 +1,18 @@
-from django.http import JsonResponse
+import asyncio
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from django.utils.http import http_date, parse_http_date_safe
 from rest_framework import viewsets, permissions
+from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -12,8 +25,31 @@ from .serializers import (
     DepartamentoSerializer, 
     SensorSerializer, 
     EventoSerializer, 
-    ComandoRemotoSerializer
+    ComandoRemotoSerializer,
+    ValidarSensorSerializer,
+    DirectorioDepartamentoSerializer,
+    campos_expandidos,
+    campos_pedidos,
+    campos_visibles,
 )
+from .buffer_eventos import buffer_eventos
+from .cache import indice_sensores, evaluar_acceso, versiones
+from .autenticacion import ausuario_autenticado
+from .comandos import canal_comandos, mensaje_comando, reclamar_comando, confirmar_comando
+from .exportacion import iterar_eventos, generar_csv, generar_ndjson, comprimir_gzip
+from .filtros import filtrar_eventos, leer_filtros_eventos, parsear_fecha
+from .archivo_eventos import archivo_eventos, mezclar
+from .importacion import importar_sensores, importar_residentes
+from .ingesta import ingerir_eventos, validar_fila_evento
+from .lista_acceso import cache_snapshot, cambios_desde, tasa_falsos_positivos, TIPO_BLOOM, TIPO_ORDENADO
+from .paginacion import CursorEventosPagination
+from .resumenes import estadisticas, FILTROS_RESUMEN
+from .sincronizacion import sincronizar, TokenInvalido
+from .enrutador_bd import permitir_replica, marcar_escritura, marcar_cookie, restaurar
+from .parsers import NDJSONParser, CSVParser
+from .directorio import directorio_departamentos, cache_directorio, FILTROS_DIRECTORIO
+from .rechazos import detector_rechazos, bloquear_sensores, ThrottleRechazosDispositivo
+from .salud import estado_preparacion
 
 # ==============================================================================
 # 1. PERMISOS PERSONALIZADOS (Requerimiento 7)
@@ -33,13 +69,34 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         return request.user and request.user.is_authenticated and request.user.rol == 'admin'
 
 
+class IsAdmin(permissions.BasePermission):
+    """
+    Permiso para acciones solo de administración (exportaciones, importaciones):
+    el usuario debe ser Admin incluso para leer.
+    """
+    def has_permission(self, request, view):
+        return request.user and request.user.is_authenticated and request.user.rol == 'admin'
+
+
 # ==============================================================================
 # 2. ENDPOINTS BÁSICOS (Info y Health)
 # ==============================================================================
-def health(request):
-    """Endpoint simple para verificar que el servidor vive"""
+async def health(request):
+    """Endpoint simple para verificar que el servidor vive (async: no ocupa un hilo en ASGI)"""
     return JsonResponse({"status": "ok", "server": "django-iot"})
 
+@require_GET
+def ready(request):
+    """
+    GET /api/ready/ (readiness para el balanceador)
+    A diferencia de health, toca la BD: ida y vuelta de SELECT 1 a la primaria y
+    a las réplicas, conexiones ocupadas y cola del buffer de eventos. Responde
+    503 si algo pasa los umbrales SALUD_*, para sacar al worker de la rotación.
+    """
+    listo, datos = estado_preparacion()
+    datos["status"] = "ok" if listo else "degradado"
+    return JsonResponse(datos, status=200 if listo else 503)
+
 class InfoView(APIView):
     """
     Endpoint público requerido (/api/info/)
@@ -61,37 +118,723 @@ class InfoView(APIView):
 # ==============================================================================
 # 3. VIEWSETS (CRUDs COMPLETOS)
 # ==============================================================================
+class ExpandibleViewSetMixin:
+    """
+    Arma el queryset para que serializar la lista cueste un número FIJO de queries:
+    - select_related de las FK pedidas en ?expand= (las que el serializer anida).
+    - prefetch_related de `prefetch_fijo` (M2M que el serializer siempre muestra).
+    """
+    prefetch_fijo = ()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Con ?fields=/?omit= no se cargan las relaciones que no van en el JSON
+        expandidos = campos_visibles(campos_expandidos(
+            self.request, getattr(self.get_serializer_class(), 'expandibles', {})
+        ), self.request)
+        if expandidos:
+            queryset = queryset.select_related(*sorted(expandidos))
+        prefetch = campos_visibles(self.prefetch_fijo, self.request)
+        if prefetch:
+            queryset = queryset.prefetch_related(*sorted(prefetch))
+        return queryset
+
+
+class CamposViewSetMixin:
+    """
+    ?fields= / ?omit= (ver CamposDinamicosMixin en api/serializers.py): además de
+    recortar el JSON, list y retrieve cargan de la BD solo las columnas que se
+    muestran (.only()), más la PK y las del orden (el cursor de eventos las usa).
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields, omit = campos_pedidos(self.request)
+        if self.action not in ('list', 'retrieve') or (fields is None and not omit):
+            return queryset
+
+        modelo = queryset.model
+        columnas = {modelo._meta.pk.name}
+        columnas.update(orden.lstrip('-') for orden in (queryset.query.order_by or modelo._meta.ordering))
+        for campo in self.get_serializer().fields.values():
+            if campo.write_only or campo.source == '*':
+                continue
+            try:
+                campo_modelo = modelo._meta.get_field(campo.source.split('.')[0])
+            except FieldDoesNotExist:
+                continue
+            if campo_modelo.concrete and not campo_modelo.many_to_many:
+                columnas.add(campo_modelo.name)
+        return queryset.only(*sorted(columnas))
+
+
+class VersionadoMixin:
+    """
+    GET condicional (ETag / Last-Modified) para list y retrieve.
+    El ETag sale de las versiones de `modelos_version` (api/cache.py) + la URL:
+    si el cliente manda If-None-Match igual, respondemos 304 sin tocar la BD.
+    """
+    modelos_version = ()
+
+    def validadores(self, request):
+        estados = versiones.obtener(*self.modelos_version)
+        base = '|'.join(token for token, _ in estados)
+        base += '|' + request.get_full_path() + '|' + request.headers.get('Accept', '')
+        etag = '"%s"' % hashlib.sha1(base.encode('utf-8')).hexdigest()
+        modificado = int(max(ts for _, ts in estados))
+        return etag, modificado
+
+    def responder_condicional(self, request, vista, *args, **kwargs):
+        etag, modificado = self.validadores(request)
+        no_modificado = False
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            # Comparación débil: la compresión (api/compresion.py) devuelve el ETag como W/"..."
+            enviados = [e.strip().removeprefix('W/') for e in if_none_match.split(',')]
+            no_modificado = etag in enviados or if_none_match.strip() == '*'
+        else:
+            desde = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+            no_modificado = desde is not None and modificado <= desde
+
+        respuesta = Response(status=status.HTTP_304_NOT_MODIFIED) if no_modificado else vista(request, *args, **kwargs)
+        if respuesta.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            respuesta['ETag'] = etag
+            respuesta['Last-Modified'] = http_date(modificado)
+            respuesta['Cache-Control'] = 'private, no-cache'
+        return respuesta
+
+    def list(self, request, *args, **kwargs):
+        return self.responder_condicional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.responder_condicional(request, super().retrieve, *args, **kwargs)
+
+
+class ReplicaViewSetMixin:
+    """
+    Con réplicas configuradas (DB_REPLICAS), los GET/HEAD/OPTIONS leen de una
+    réplica (api/enrutador_bd.py). Un POST/PUT/PATCH/DELETE deja a su usuario
+    leyendo de la primaria por DB_REPLICA_PEGAJOSO segundos (marca en el cache
+    compartido y, para clientes con cookies, también en una cookie), sólo si
+    respondió 2xx: un 400/403 no escribió nada.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)  # autentica y revisa permisos
+        if request.method in permissions.SAFE_METHODS:
+            usuario_id = request.user.pk if request.user.is_authenticated else None
+            self._token_replica = permitir_replica(usuario_id, request.COOKIES)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_token_replica', None)
+        if token is not None:
+            restaurar(token)
+            self._token_replica = None
+        elif request.method not in permissions.SAFE_METHODS and 200 <= response.status_code < 300:
+            if request.user.is_authenticated:
+                marcar_escritura(request.user.pk)
+            marcar_cookie(response)
+        return super().finalize_response(request, response, *args, **kwargs)
+
 
 # CRUD DEPARTAMENTOS
-class DepartamentoViewSet(viewsets.ModelViewSet):
+class DepartamentoViewSet(ReplicaViewSetMixin, VersionadoMixin, CamposViewSetMixin, viewsets.ModelViewSet):
     queryset = Departamento.objects.all()
     serializer_class = DepartamentoSerializer
     # Solo el admin puede crear deptos, el operador solo verlos
     permission_classes = [IsAdminOrReadOnly]
+    modelos_version = (Departamento,)
+
+    @action(detail=False, methods=['get'], url_path='directorio')
+    def directorio(self, request):
+        """
+        GET /api/departamentos/directorio/?condominio=&torre=&piso=
+        Vista de edificio de la app: cada departamento con sus habitantes, sus
+        sensores activos y los totales, en una sola llamada (2 queries en total,
+        ver api/directorio.py). Se guarda en cache por condominio.
+        """
+        filtros = {campo: request.query_params[campo] for campo in FILTROS_DIRECTORIO if request.query_params.get(campo)}
+        if 'piso' in filtros:
+            try:
+                filtros['piso'] = int(filtros['piso'])
+            except ValueError:
+                return Response({"piso": ["Debe ser un número."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        datos = cache_directorio.obtener(filtros, lambda: DirectorioDepartamentoSerializer(
+            directorio_departamentos(filtros), many=True,
+        ).data)
+        return Response(datos, status=status.HTTP_200_OK)
 
 # CRUD USUARIOS
-class UsuarioViewSet(viewsets.ModelViewSet):
+class UsuarioViewSet(ReplicaViewSetMixin, VersionadoMixin, CamposViewSetMixin, ExpandibleViewSetMixin, viewsets.ModelViewSet):
     queryset = Usuario.objects.all()
     serializer_class = UsuarioSerializer
     permission_classes = [IsAdminOrReadOnly]
+    modelos_version = (Usuario, Departamento)
+    # fields='__all__' incluye groups y user_permissions: sin esto son 2 queries por usuario
+    prefetch_fijo = ('groups', 'user_permissions')
+
+    @action(detail=False, methods=['post'], url_path='importar', parser_classes=[JSONParser, CSVParser])
+    def importar(self, request):
+        """
+        POST /api/usuarios/importar/?atomico=1
+        Alta masiva de residentes (arreglo JSON o CSV con encabezados).
+        Las contraseñas se hashean en paralelo; responde con un reporte por fila.
+        """
+        filas = request.data
+        if isinstance(filas, dict):
+            filas = filas.get('usuarios')
+        if not isinstance(filas, list):
+            return Response(
+                {"detail": "Se esperaba un arreglo de usuarios."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        atomico = request.query_params.get('atomico') in ('1', 'true')
+        reporte = importar_residentes(filas, atomico=atomico)
+        codigo = status.HTTP_201_CREATED if reporte['creados'] else status.HTTP_200_OK
+        return Response(reporte, status=codigo)
 
 # CRUD SENSORES (RFID)
-class SensorViewSet(viewsets.ModelViewSet):
+class SensorViewSet(ReplicaViewSetMixin, VersionadoMixin, CamposViewSetMixin, ExpandibleViewSetMixin, viewsets.ModelViewSet):
     queryset = Sensor.objects.all()
     serializer_class = SensorSerializer
     permission_classes = [IsAdminOrReadOnly]
+    # Con ?expand= el JSON también incluye datos de usuarios y departamentos
+    modelos_version = (Sensor, Usuario, Departamento)
+
+    @action(detail=False, methods=['post'], url_path='importar', parser_classes=[JSONParser, CSVParser])
+    def importar(self, request):
+        """
+        POST /api/sensores/importar/?atomico=1
+        Alta masiva de tags (arreglo JSON o CSV con encabezados), p.ej. al entregar
+        una torre nueva. Responde con un reporte de errores por fila.
+        Con ?atomico=1 no se inserta nada si alguna fila tiene errores.
+        """
+        filas = request.data
+        if isinstance(filas, dict):
+            filas = filas.get('sensores')
+        if not isinstance(filas, list):
+            return Response(
+                {"detail": "Se esperaba un arreglo de sensores."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        atomico = request.query_params.get('atomico') in ('1', 'true')
+        reporte = importar_sensores(filas, atomico=atomico)
+        codigo = status.HTTP_201_CREATED if reporte['creados'] else status.HTTP_200_OK
+        return Response(reporte, status=codigo)
 
 # CRUD EVENTOS (Historial)
-class EventoViewSet(viewsets.ModelViewSet):
+class EventoViewSet(ReplicaViewSetMixin, CamposViewSetMixin, ExpandibleViewSetMixin, viewsets.ModelViewSet):
     queryset = Evento.objects.all()
     serializer_class = EventoSerializer
     # Aquí cambiamos la lógica un poco:
     # Quizás quieres que todos puedan ver el historial, pero NADIE pueda borrarlo por seguridad.
     # Por ahora usamos el permiso estándar definido arriba.
     permission_classes = [permissions.IsAuthenticated] 
+    # Historial paginado por cursor: ?cursor=&page_size=
+    pagination_class = CursorEventosPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # ?desde=&hasta=&tipo_evento=&resultado=&sensor=&usuario=&departamento=
+            queryset = filtrar_eventos(queryset, self.request.query_params)
+        return queryset
+
+    def filtros_archivo(self):
+        # El historial sigue con los eventos archivados (ver CursorEventosPagination)
+        return leer_filtros_eventos(self.request.query_params)
+
+    @action(detail=False, methods=['post'], url_path='lote', parser_classes=[JSONParser, NDJSONParser])
+    def lote(self, request):
+        """
+        POST /api/eventos/lote/
+        Recibe muchos eventos de una vez (arreglo JSON o NDJSON), p.ej. cuando la
+        barrera recupera la conexión. Reenviar el mismo id_externo no duplica filas.
+        """
+        filas = request.data
+        if isinstance(filas, dict):
+            filas = filas.get('eventos')
+        if not isinstance(filas, list):
+            return Response(
+                {"detail": "Se esperaba un arreglo de eventos."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        maximo = getattr(settings, 'EVENTOS_LOTE_MAX', 5000)
+        if len(filas) > maximo:
+            return Response(
+                {"detail": f"Máximo {maximo} eventos por lote."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        reporte = ingerir_eventos(filas)
+        return Response(reporte, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='estadisticas')
+    def estadisticas(self, request):
+        """
+        GET /api/eventos/estadisticas/?desde=&hasta=&agrupar=torre,tipo_evento
+        Conteos para el dashboard (p.ej. accesos por torre o rechazos de hoy),
+        calculados desde el resumen por hora, no desde los eventos crudos.
+        Filtros: ?departamento=&torre=&condominio=&tipo_evento=&resultado=
+        Sin fechas: desde las 00:00 de hoy hasta ahora.
+        """
+        params = request.query_params
+        ahora = timezone.now()
+        desde = parsear_fecha(params['desde'], 'desde') if params.get('desde') else (
+            timezone.localtime(ahora).replace(hour=0, minute=0, second=0, microsecond=0)
+        )
+        hasta = parsear_fecha(params['hasta'], 'hasta', fin_de_dia=True) if params.get('hasta') else ahora
+
+        agrupar = [campo.strip() for campo in params.get('agrupar', '').split(',') if campo.strip()]
+        filtros = {campo: params[campo] for campo in FILTROS_RESUMEN if params.get(campo)}
+
+        return Response(estadisticas(desde, hasta, agrupar, filtros), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='buffer', permission_classes=[IsAdmin])
+    def buffer(self, request):
+        """
+        GET /api/eventos/buffer/
+        Estado del buffer de eventos (EVENTOS_BUFFER_ACTIVO): largo de la cola,
+        antigüedad del evento más viejo, desbordes a disco y errores de flush.
+        """
+        datos = buffer_eventos.metricas()
+        datos["habilitado"] = settings.EVENTOS_BUFFER_ACTIVO
+        return Response(datos, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='exportar', permission_classes=[IsAdmin])
+    def exportar(self, request):
+        """
+        GET /api/eventos/exportar/?formato=csv|ndjson&gzip=1 (+ los filtros del historial)
+        Descarga el log de accesos completo para auditorías, incluidos los eventos
+        archivados. Se envía en streaming, por lotes, sin armar la lista entera en memoria.
+        """
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in ('csv', 'ndjson'):
+            return Response(
+                {"detail": "formato debe ser 'csv' o 'ndjson'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        comprimido = request.query_params.get('gzip') in ('1', 'true', 'True')
+
+        filtros = leer_filtros_eventos(request.query_params)
+        filas = mezclar(
+            iterar_eventos(Evento.objects.filter(**filtros), getattr(settings, 'EXPORTACION_LOTE', 2000)),
+            archivo_eventos.iterar(filtros),   # + lo ya movido a archivo (api/archivo_eventos.py)
+        )
+
+        if formato == 'csv':
+            contenido, tipo = generar_csv(filas), 'text/csv; charset=utf-8'
+        else:
+            contenido, tipo = generar_ndjson(filas), 'application/x-ndjson; charset=utf-8'
+        nombre = f"eventos_{timezone.localtime():%Y%m%d_%H%M%S}.{formato}"
+
+        if comprimido:
+            contenido, tipo, nombre = comprimir_gzip(contenido), 'application/gzip', nombre + '.gz'
+
+        respuesta = StreamingHttpResponse(contenido, content_type=tipo)
+        respuesta['Content-Disposition'] = f'attachment; filename="{nombre}"'
+        return respuesta
 
 # CRUD COMANDOS REMOTOS
-class ComandoRemotoViewSet(viewsets.ModelViewSet):
+class ComandoRemotoViewSet(ReplicaViewSetMixin, CamposViewSetMixin, viewsets.ModelViewSet):
     queryset = ComandoRemoto.objects.all()
     serializer_class = ComandoRemotoSerializer
-    permission_classes = [permissions.IsAuthenticated]
\ No newline at end of file
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        # Filtros opcionales: ?dispositivo_id=BARRERA_PRINCIPAL&estado=pendiente
+        queryset = super().get_queryset()
+        for campo in ('dispositivo_id', 'estado'):
+            valor = self.request.query_params.get(campo)
+            if valor:
+                queryset = queryset.filter(**{campo: valor})
+        return queryset
+
+    def update(self, request, *args, **kwargs):
+        """
+        Compatibilidad con el flujo antiguo (PUT/PATCH sobre la fila del dispositivo):
+        en vez de sobrescribir, encolamos un comando NUEVO para ese dispositivo.
+        Así dos cambios seguidos (ABRIR y luego CERRAR) no se pisan.
+        """
+        actual = self.get_object()
+        datos = {
+            'dispositivo_id': request.data.get('dispositivo_id', actual.dispositivo_id),
+            'comando': request.data.get('comando', actual.comando),
+        }
+        serializer = self.get_serializer(data=datos)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+# ==============================================================================
+# 4. ENDPOINTS PARA DISPOSITIVOS (Barrera RFID)
+# ==============================================================================
+# Las rutas de más tráfico de la barrera (validar, eventos, reclamar comando) son
+# vistas async de Django, no DRF: en ASGI (ecoapi/asgi.py) una petición que se
+# responde desde memoria no ocupa un hilo. Autentican con las mismas reglas que
+# DRF (ausuario_autenticado) y responden los errores con el mismo formato.
+def _no_autenticado():
+    return JsonResponse(
+        {"detail": "Las credenciales de autenticación no se proveyeron o son inválidas."},
+        status=status.HTTP_401_UNAUTHORIZED,
+    )
+
+
+def _dispositivo_limitado(dispositivo_id):
+    """429 si la barrera superó el umbral de rechazos (api/rechazos.py); si no, None."""
+    if not detector_rechazos.dispositivo_bloqueado(dispositivo_id):
+        return None
+    respuesta = JsonResponse(
+        {"detail": "Demasiados accesos rechazados desde este dispositivo. Reintente más tarde."},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+    )
+    respuesta['Retry-After'] = str(getattr(settings, 'RECHAZOS_VENTANA', 60))
+    return respuesta
+
+
+def _leer_json(request):
+    """(datos, respuesta_de_error): el cuerpo JSON de la petición."""
+    try:
+        return json.loads(request.body or b'{}'), None
+    except ValueError as exc:
+        return None, JsonResponse({"detail": f"JSON inválido: {exc}"}, status=status.HTTP_400_BAD_REQUEST)
+
+
+# POST /api/dispositivos/validar/
+@csrf_exempt
+@require_POST
+async def validar_sensor(request):
+    """
+    La barrera envía el codigo_sensor leído y recibe si debe abrir o no.
+    La decisión sale del índice en memoria (api/cache.py), sin consultar la BD
+    salvo la primera vez que se ve un código. Opcionalmente registra el Evento
+    (en segundo plano si EVENTOS_BUFFER_ACTIVO: la respuesta trae su id_externo).
+    Responde 429 si la barrera viene de una ráfaga de rechazos (api/rechazos.py).
+    """
+    if await ausuario_autenticado(request) is None:
+        return _no_autenticado()
+    cuerpo, error = _leer_json(request)
+    if error:
+        return error
+    entrada_serializer = ValidarSensorSerializer(data=cuerpo)
+    if not entrada_serializer.is_valid():
+        return JsonResponse(entrada_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    datos = entrada_serializer.validated_data
+    limitado = _dispositivo_limitado(datos['dispositivo_id'])
+    if limitado:
+        return limitado
+
+    entrada = await indice_sensores.aobtener(datos['codigo_sensor'])
+    permitido, motivo = evaluar_acceso(entrada)
+
+    respuesta = {
+        "permitido": permitido,
+        "motivo": motivo,
+        "codigo_sensor": datos['codigo_sensor'],
+        "sensor": entrada.sensor_id if entrada else None,
+        "usuario": entrada.usuario_id if entrada else None,
+        "departamento": entrada.departamento_id if entrada else None,
+        "departamento_numero": entrada.departamento_numero if entrada else None,
+    }
+
+    if datos['registrar'] and settings.EVENTOS_BUFFER_ACTIVO:
+        # Write-behind: el evento se guarda en segundo plano (api/buffer_eventos.py)
+        respuesta["evento"] = None
+        # El diario hace write/fsync con un lock: fuera del event loop
+        respuesta["id_externo"] = await sync_to_async(buffer_eventos.agregar, thread_sensitive=False)({
+            'sensor': entrada.sensor_id if entrada else None,
+            'usuario': entrada.usuario_id if entrada else None,
+            'tipo_evento': 'ACCESO_VALIDO' if permitido else 'ACCESO_RECHAZADO',
+            'resultado': 'PERMITIDO' if permitido else 'DENEGADO',
+        })
+    elif datos['registrar']:
+        evento = await Evento.objects.acreate(
+            sensor_id=entrada.sensor_id if entrada else None,
+            usuario_id=entrada.usuario_id if entrada else None,
+            departamento_id=entrada.departamento_id if entrada else None,
+            tipo_evento='ACCESO_VALIDO' if permitido else 'ACCESO_RECHAZADO',
+            resultado='PERMITIDO' if permitido else 'DENEGADO',
+        )
+        respuesta["evento"] = evento.pk
+
+    if datos['registrar'] and not permitido:
+        # Ráfagas de rechazos: bloqueo del sensor y throttle de la barrera
+        superados = detector_rechazos.registrar(
+            [entrada.sensor_id if entrada else None], datos['dispositivo_id'],
+        )
+        if superados:
+            await sync_to_async(bloquear_sensores)(superados)
+
+    return JsonResponse(respuesta)
+
+
+# POST /api/dispositivos/eventos/
+@csrf_exempt
+@require_POST
+async def registrar_eventos(request):
+    """
+    La barrera sube uno o varios eventos (objeto o arreglo JSON, mismos campos que
+    /api/eventos/lote/). Reenviar el mismo id_externo no duplica filas.
+    Con EVENTOS_BUFFER_ACTIVO se encolan y responde 202 con sus id_externo; si no,
+    se insertan con ingerir_eventos y responde 200 con el reporte.
+    La barrera se identifica con el header X-Dispositivo-Id (throttle de rechazos).
+    """
+    if await ausuario_autenticado(request) is None:
+        return _no_autenticado()
+    limitado = _dispositivo_limitado(request.headers.get('X-Dispositivo-Id'))
+    if limitado:
+        return limitado
+    filas, error = _leer_json(request)
+    if error:
+        return error
+    if isinstance(filas, dict):
+        filas = filas['eventos'] if isinstance(filas.get('eventos'), list) else [filas]
+    if not isinstance(filas, list):
+        return JsonResponse({"detail": "Se esperaba un evento o un arreglo de eventos."},
+                            status=status.HTTP_400_BAD_REQUEST)
+    maximo = getattr(settings, 'EVENTOS_LOTE_MAX', 5000)
+    if len(filas) > maximo:
+        return JsonResponse({"detail": f"Máximo {maximo} eventos por lote."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    if not settings.EVENTOS_BUFFER_ACTIVO:
+        reporte = await sync_to_async(ingerir_eventos)(
+            filas, dispositivo_id=request.headers.get('X-Dispositivo-Id'),
+        )
+        return JsonResponse(reporte)
+
+    # En el buffer sólo se valida el formato: las referencias se resuelven al escribir.
+    # Se encolan los campos que devuelve validar_fila_evento, no el JSON del cliente.
+    validas, errores, rechazos = [], [], []
+    for indice, fila in enumerate(filas):
+        datos, errores_fila = validar_fila_evento(fila)
+        if errores_fila:
+            errores.append({"indice": indice, "errores": errores_fila})
+            continue
+        validas.append(datos)
+    # El diario hace write/fsync con un lock: fuera del event loop, una vez por petición
+    aceptados = await sync_to_async(buffer_eventos.agregar_varias, thread_sensitive=False)(validas)
+    for datos in validas:
+        if datos['tipo_evento'] == 'ACCESO_RECHAZADO':
+            # El flush del buffer no los cuenta: se cuentan al encolar
+            if datos['sensor'] is None and datos['codigo_sensor']:
+                entrada = await indice_sensores.aobtener(datos['codigo_sensor'])
+                datos['sensor'] = entrada.sensor_id if entrada else None
+            rechazos.append(datos['sensor'])
+    superados = detector_rechazos.registrar(rechazos, request.headers.get('X-Dispositivo-Id'))
+    if superados:
+        await sync_to_async(bloquear_sensores)(superados)
+    return JsonResponse(
+        {"recibidos": len(filas), "encolados": aceptados, "errores": errores},
+        status=status.HTTP_202_ACCEPTED,
+    )
+
+
+class ListaAccesoView(APIView):
+    """
+    GET /api/dispositivos/lista-acceso/?formato=ordenado|bloom&fp=0.001
+    (fp se lleva a la tasa fija más cercana igual o más estricta).
+    Snapshot binario y versionado de los códigos permitidos, para que la barrera
+    siga decidiendo sin conexión (formato en api/lista_acceso.py).
+    La versión va en el header X-Lista-Version y como ETag.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [ThrottleRechazosDispositivo]
+
+    def get(self, request):
+        formato = request.query_params.get('formato', 'ordenado')
+        if formato not in ('ordenado', 'bloom'):
+            return Response(
+                {"detail": "formato debe ser 'ordenado' o 'bloom'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            falsos_positivos = float(request.query_params.get('fp', 0.001))
+        except ValueError:
+            falsos_positivos = 0.001
+        # Sólo se sirven unas pocas tasas fijas (TASAS_FALSOS_POSITIVOS en api/lista_acceso.py)
+        falsos_positivos = tasa_falsos_positivos(falsos_positivos)
+
+        tipo = TIPO_BLOOM if formato == 'bloom' else TIPO_ORDENADO
+        version, datos = cache_snapshot.obtener(tipo, falsos_positivos)
+
+        etag = f'"lista-{formato}-{version}"'
+        if tipo == TIPO_BLOOM:
+            etag = f'"lista-{formato}-{falsos_positivos}-{version}"'
+        if request.headers.get('If-None-Match') == etag:
+            respuesta = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            respuesta = HttpResponse(datos, content_type='application/octet-stream')
+        respuesta['ETag'] = etag
+        respuesta['X-Lista-Version'] = str(version)
+        return respuesta
+
+
+class CambiosListaAccesoView(APIView):
+    """
+    GET /api/dispositivos/lista-acceso/cambios/?desde=<version>
+    Altas/bajas desde la versión que tiene la barrera. Si responde 409, la barrera
+    debe volver a bajar el snapshot completo.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [ThrottleRechazosDispositivo]
+
+    def get(self, request):
+        try:
+            desde = int(request.query_params.get('desde', ''))
+        except ValueError:
+            return Response(
+                {"desde": ["Debe ser la versión (número) del último snapshot/delta aplicado."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        delta = cambios_desde(desde, getattr(settings, 'LISTA_ACCESO_DELTA_MAX', 10000))
+        if delta is None:
+            return Response(
+                {"detail": "Versión desconocida o demasiados cambios: descargar el snapshot completo."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(delta, status=status.HTTP_200_OK)
+
+
+# POST /api/dispositivos/<dispositivo_id>/comandos/reclamar/
+@csrf_exempt
+@require_POST
+async def reclamar_siguiente_comando(request, dispositivo_id):
+    """La barrera toma el próximo comando pendiente de su cola (200) o nada (204)."""
+    if await ausuario_autenticado(request) is None:
+        return _no_autenticado()
+    comando = await sync_to_async(reclamar_comando)(dispositivo_id)
+    if comando is None:
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+    return JsonResponse(mensaje_comando(comando))
+
+
+class ConfirmarComandoView(APIView):
+    """
+    POST /api/dispositivos/<dispositivo_id>/comandos/<pk>/confirmar/
+    La barrera avisa que ya ejecutó el comando que había reclamado.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, dispositivo_id, pk):
+        comando = confirmar_comando(dispositivo_id, pk)
+        if comando is None:
+            return Response(
+                {"detail": "No existe un comando reclamado con ese id para este dispositivo."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(mensaje_comando(comando), status=status.HTTP_200_OK)
+
+
+async def _reclamar_con_espera(dispositivo_id, cola, timeout):
+    """
+    Reclama el próximo comando; si la cola está vacía espera el aviso de uno nuevo
+    (sin tocar la BD) hasta `timeout` segundos. Devuelve el mensaje o None.
+    """
+    loop = asyncio.get_running_loop()
+    limite = loop.time() + timeout
+    while True:
+        comando = await sync_to_async(reclamar_comando)(dispositivo_id)
+        if comando is not None:
+            return mensaje_comando(comando)
+        restante = limite - loop.time()
+        if restante <= 0:
+            return None
+        try:
+            await asyncio.wait_for(cola.get(), timeout=restante)
+        except asyncio.TimeoutError:
+            return None
+
+
+# GET /api/dispositivos/<dispositivo_id>/comandos/esperar/
+@require_GET
+async def esperar_comando(request, dispositivo_id):
+    """
+    Canal de comandos remotos para la barrera (vista async, corre en ecoapi/asgi.py).
+
+    - Long-poll (por defecto): si hay un comando pendiente se reclama y se entrega
+      al tiro; si no, la conexión queda abierta hasta que llegue uno (200 + JSON)
+      o venzan ?timeout= segundos (204).
+    - SSE (Accept: text/event-stream): la conexión queda abierta y cada comando
+      reclamado llega como un evento 'comando'.
+
+    Los comandos entregados quedan 'reclamados': la barrera debe confirmarlos en
+    /comandos/<id>/confirmar/ (si no, se vuelven a entregar pasados
+    COMANDOS_RECLAMO_TIMEOUT segundos). Mientras espera no se hace ninguna query: el aviso
+    llega por canal_comandos y recién ahí se reclama en la BD.
+    """
+    # Como las demás vistas de dispositivos: un usuario desactivado no puede dejar
+    # conexiones abiertas aunque su token siga vigente
+    if await ausuario_autenticado(request) is None:
+        return _no_autenticado()
+
+    try:
+        timeout = min(float(request.GET.get('timeout', 25)), 55)
+    except ValueError:
+        timeout = 25
+
+    # Nos suscribimos ANTES de mirar la BD para no perder un comando entre medio
+    cola = canal_comandos.suscribir(dispositivo_id)
+
+    if 'text/event-stream' in request.headers.get('Accept', ''):
+        async def eventos():
+            try:
+                while True:
+                    # Vaciamos todo lo pendiente y después esperamos el próximo aviso
+                    while True:
+                        comando = await sync_to_async(reclamar_comando)(dispositivo_id)
+                        if comando is None:
+                            break
+                        yield f"event: comando\ndata: {json.dumps(mensaje_comando(comando))}\n\n"
+                    while True:
+                        try:
+                            await asyncio.wait_for(cola.get(), timeout=15)
+                            break
+                        except asyncio.TimeoutError:
+                            # Latido para que proxies y el dispositivo no corten la conexión
+                            yield ": ping\n\n"
+            finally:
+                canal_comandos.desuscribir(dispositivo_id, cola)
+
+        respuesta = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+        respuesta['Cache-Control'] = 'no-cache'
+        respuesta['X-Accel-Buffering'] = 'no'
+        return respuesta
+
+    try:
+        mensaje = await _reclamar_con_espera(dispositivo_id, cola, timeout)
+    finally:
+        canal_comandos.desuscribir(dispositivo_id, cola)
+    if mensaje is None:
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+    return JsonResponse(mensaje)
+
+
+# ==============================================================================
+# 5. SINCRONIZACIÓN OFFLINE DE LA APP
+# ==============================================================================
+class SincronizacionView(APIView):
+    """
+    GET /api/sync/?token=<token>&limite=500
+    Devuelve solo lo creado, modificado o borrado desde `token` en departamentos,
+    usuarios, sensores y eventos (ver api/sincronizacion.py), más un token nuevo.
+    Sin token es la primera sincronización. Si 'mas' es true, llamar de nuevo
+    con el token recibido hasta que sea false.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limite = min(max(int(request.query_params.get('limite', 500)), 1), 2000)
+        except ValueError:
+            limite = 500
+        try:
+            datos = sincronizar(request.query_params.get('token') or None, limite, {'request': request})
+        except TokenInvalido as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(datos, status=status.HTTP_200_OK)
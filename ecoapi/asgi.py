@@ -5,6 +5,12 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Las rutas de la barrera (health, dispositivos/validar, dispositivos/eventos,
+comandos/reclamar y comandos/esperar) son vistas async: sírvelas con un servidor
+ASGI (uvicorn, daphne) para que cada barrera conectada no ocupe un hilo, p.ej.:
+
+    uvicorn ecoapi.asgi:application --host 0.0.0.0 --port 8000
 """
 
 import os
@@ -12,5 +18,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecoapi.settings')
+# Los settings usan DB_CONN_MAX_AGE=0 por defecto bajo ASGI (ver ecoapi/settings.py)
+os.environ.setdefault('ECOAPI_ASGI', '1')
 
 application = get_asgi_application()
@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware', # <-- OBLIGATORIO AL PRINCIPIO
+    'api.metricas.MetricasMiddleware',        # Latencia y queries por ruta (/api/metrics/)
+    'api.compresion.CompresionMiddleware',    # gzip / brotli de las respuestas JSON
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -103,6 +105,42 @@ else:
         }
     }
 
+# Conexiones persistentes: MySQL no tiene pool propio en Django, así que cada
+# hilo reutiliza su conexión durante DB_CONN_MAX_AGE segundos en vez de abrir
+# una por petición (0 = cerrar al terminar cada petición). Con health checks,
+# una conexión que el servidor cerró se detecta y se reabre antes de usarla.
+# Bajo ASGI cada petición corre en un hilo nuevo y no hay reutilización: ahí
+# Django recomienda 0, así que es el valor por defecto cuando arranca ecoapi/asgi.py
+# (que define ECOAPI_ASGI). GET /api/ready/ muestra cuántas conexiones se abren.
+DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '0' if os.getenv('ECOAPI_ASGI') else '60'))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+
+# Réplicas de lectura (opcional): DB_REPLICAS=host1,host2:3307 con MySQL (mismo
+# nombre/usuario/clave que la primaria), o rutas de archivos con SQLite
+# (DB_REPLICAS=replica.sqlite3, p.ej. una copia de db.sqlite3 para probar).
+# Los GET de los viewsets leen de ellas (api/enrutador_bd.py).
+for _n, _replica in enumerate(filter(None, (r.strip() for r in os.getenv('DB_REPLICAS', '').split(','))), 1):
+    if DB_HOST:
+        _host, _, _puerto = _replica.partition(':')
+        _config = dict(DATABASES['default'], HOST=_host, PORT=_puerto or DATABASES['default']['PORT'])
+    else:
+        _config = dict(DATABASES['default'], NAME=BASE_DIR / _replica)
+    # En los tests la réplica es la misma BD de test que 'default'
+    _config['TEST'] = {'MIRROR': 'default'}
+    DATABASES[f'replica_{_n}'] = _config
+
+DATABASE_ROUTERS = ['api.enrutador_bd.EnrutadorReplicas']
+# Segundos que un usuario lee de la primaria después de escribir (retraso de la réplica).
+# La marca vive en el cache: con varios workers necesita REDIS_URL (cache compartido);
+# si no, sólo la cookie 'bd_primaria' la lleva a otro worker (clientes con cookies).
+DB_REPLICA_PEGAJOSO = int(os.getenv('DB_REPLICA_PEGAJOSO', '5'))
+
+# Umbrales de GET /api/ready/ (503 = sacar al worker del balanceador; 0 = sin límite)
+SALUD_BD_PING_MAX_MS = float(os.getenv('SALUD_BD_PING_MAX_MS', '250'))        # SELECT 1 ida y vuelta
+SALUD_BD_USO_MAX = float(os.getenv('SALUD_BD_USO_MAX', '0.9'))                # Conexiones ocupadas / max_connections (MySQL)
+SALUD_BUFFER_USO_MAX = float(os.getenv('SALUD_BUFFER_USO_MAX', '0.8'))        # Cola del buffer / capacidad
+SALUD_BUFFER_ANTIGUEDAD_MAX = float(os.getenv('SALUD_BUFFER_ANTIGUEDAD_MAX', '30'))  # Segundos del evento más viejo
+
 
 # ==============================================================================
 # CONFIGURACIÓN DE AUTENTICACIÓN Y JWT
@@ -113,11 +151,18 @@ AUTH_USER_MODEL = 'api.Usuario'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication sin el SELECT del usuario en cada petición
+        'api.autenticacion.JWTAuthenticationCacheada',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny', # Por defecto abierto, cerramos en views
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        # JSON con orjson si está instalado (si no, el de DRF)
+        'api.renderers.JSONRapidoRenderer' if os.getenv('API_JSON_RAPIDO', 'True') == 'True'
+        else 'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 # Configuración del Token JWT
@@ -125,14 +170,94 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # El token incluye 'rol' y 'estado' (para API_AUTH_MODO = 'claims')
+    'TOKEN_OBTAIN_SERIALIZER': 'api.autenticacion.TokenConRolSerializer',
 }
 
+# Cómo se resuelve request.user en cada petición con JWT:
+# - 'cache':  Usuario desde un cache en memoria (TTL corto, se invalida al guardar el usuario).
+# - 'claims': rol/estado leídos del token, cero queries (un cambio de rol se nota al renovar el token).
+API_AUTH_MODO = os.getenv('API_AUTH_MODO', 'cache')
+AUTH_USUARIO_CACHE_TTL = int(os.getenv('AUTH_USUARIO_CACHE_TTL', '30'))
+
 # ==============================================================================
 # CORS (Permisos para que Android/Arduino se conecten)
 # ==============================================================================
 CORS_ALLOW_ALL_ORIGINS = True  # Acepta conexiones de cualquier IP
 
 
+# ==============================================================================
+# DISPOSITIVOS (Barrera RFID)
+# ==============================================================================
+# Segundos que un codigo_sensor vive en el índice en memoria (api/cache.py).
+# Las señales lo invalidan al instante en este proceso; el TTL cubre los cambios
+# hechos desde otros procesos/servidores.
+SENSOR_CACHE_TTL = int(os.getenv('SENSOR_CACHE_TTL', '60'))
+
+# Ingesta por lotes (POST /api/eventos/lote/)
+EVENTOS_LOTE_MAX = int(os.getenv('EVENTOS_LOTE_MAX', '5000'))      # Eventos por petición
+EVENTOS_LOTE_TAMANO = int(os.getenv('EVENTOS_LOTE_TAMANO', '500'))  # Filas por INSERT
+
+# Cola de comandos remotos: días que se guardan los ya confirmados
+# (python manage.py compactar_comandos)
+COMANDOS_RETENCION_DIAS = int(os.getenv('COMANDOS_RETENCION_DIAS', '7'))
+# Segundos que un comando reclamado espera la confirmación antes de volver a entregarse
+COMANDOS_RECLAMO_TIMEOUT = int(os.getenv('COMANDOS_RECLAMO_TIMEOUT', '60'))
+
+# Exportación de eventos (GET /api/eventos/exportar/): filas por query
+EXPORTACION_LOTE = int(os.getenv('EXPORTACION_LOTE', '2000'))
+
+# Retención: los eventos con más de EVENTOS_RETENCION_DIAS días se mueven a
+# segmentos .ndjson.gz por día (manage.py archivar_eventos, p.ej. con un cron
+# diario). El historial y la exportación los siguen leyendo desde ahí.
+# Con varios servidores debe ser un volumen compartido.
+EVENTOS_RETENCION_DIAS = int(os.getenv('EVENTOS_RETENCION_DIAS', '180'))
+EVENTOS_ARCHIVO_DIR = os.getenv('EVENTOS_ARCHIVO_DIR', str(BASE_DIR / 'var' / 'archivo_eventos'))
+
+# Admin: el total de los listados se cuenta exacto hasta aquí (después se estima)
+ADMIN_CONTEO_MAX = int(os.getenv('ADMIN_CONTEO_MAX', '10000'))
+
+# Ráfagas de accesos rechazados (api/rechazos.py), contadas en memoria por proceso.
+# Un sensor con RECHAZOS_UMBRAL_SENSOR rechazos en RECHAZOS_VENTANA segundos queda
+# 'bloqueado'; una barrera con RECHAZOS_UMBRAL_DISPOSITIVO recibe 429. 0 = desactivado.
+RECHAZOS_VENTANA = int(os.getenv('RECHAZOS_VENTANA', '60'))
+RECHAZOS_UMBRAL_SENSOR = int(os.getenv('RECHAZOS_UMBRAL_SENSOR', '10'))
+RECHAZOS_UMBRAL_DISPOSITIVO = int(os.getenv('RECHAZOS_UMBRAL_DISPOSITIVO', '30'))
+RECHAZOS_MAX_CLAVES = int(os.getenv('RECHAZOS_MAX_CLAVES', '50000'))
+
+# Lista de acceso offline: máximo de cambios por delta antes de pedir snapshot
+LISTA_ACCESO_DELTA_MAX = int(os.getenv('LISTA_ACCESO_DELTA_MAX', '10000'))
+# Días que se guardan los cambios para el delta (python manage.py compactar_lista_acceso);
+# una barrera sin sincronizar por más tiempo que eso baja el snapshot completo
+LISTA_ACCESO_RETENCION_DIAS = int(os.getenv('LISTA_ACCESO_RETENCION_DIAS', '30'))
+
+# Importación masiva de residentes: procesos para hashear contraseñas (0 = un proceso por núcleo)
+IMPORTACION_PROCESOS = int(os.getenv('IMPORTACION_PROCESOS', '0'))
+
+# Buffer de eventos (write-behind): validar/registrar en la barrera no espera el INSERT.
+# Los eventos pasan por un diario en disco (EVENTOS_BUFFER_DIR) antes de llegar a la BD.
+EVENTOS_BUFFER_ACTIVO = os.getenv('EVENTOS_BUFFER_ACTIVO', 'False') == 'True'
+EVENTOS_BUFFER_DIR = os.getenv('EVENTOS_BUFFER_DIR', str(BASE_DIR / 'var' / 'buffer_eventos'))
+EVENTOS_BUFFER_CAPACIDAD = int(os.getenv('EVENTOS_BUFFER_CAPACIDAD', '10000'))  # Filas en memoria
+EVENTOS_BUFFER_LOTE = int(os.getenv('EVENTOS_BUFFER_LOTE', '500'))              # Filas por flush
+EVENTOS_BUFFER_INTERVALO = float(os.getenv('EVENTOS_BUFFER_INTERVALO', '1.0'))  # Segundos máx. entre flush
+EVENTOS_BUFFER_FSYNC = os.getenv('EVENTOS_BUFFER_FSYNC', 'False') == 'True'     # fsync por evento
+
+# Métricas por ruta (GET /api/metrics/, formato Prometheus)
+METRICAS_ACTIVAS = os.getenv('METRICAS_ACTIVAS', 'True') == 'True'
+METRICAS_TOKEN = os.getenv('METRICAS_TOKEN', '')                 # Vacío = sólo con DEBUG
+METRICAS_LENTO_MS = float(os.getenv('METRICAS_LENTO_MS', '0'))  # > 0: loguea peticiones lentas con su SQL
+
+# Compresión de respuestas (api/compresion.py). Brotli solo si el paquete 'brotli' está instalado.
+COMPRESION_MINIMO = int(os.getenv('COMPRESION_MINIMO', '512'))  # Bytes: menos que esto no se comprime
+COMPRESION_NIVEL_GZIP = int(os.getenv('COMPRESION_NIVEL_GZIP', '6'))
+COMPRESION_NIVEL_BROTLI = int(os.getenv('COMPRESION_NIVEL_BROTLI', '5'))
+
+# Sincronización offline de la app (GET /api/sync/)
+SYNC_EVENTOS_DIAS = int(os.getenv('SYNC_EVENTOS_DIAS', '7'))          # Eventos en la primera sincronización
+SYNC_MARGEN_SEGUNDOS = int(os.getenv('SYNC_MARGEN_SEGUNDOS', '5'))    # Transacciones en vuelo: se reenvían, no se pierden
+
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     { 'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator', },
@@ -142,6 +267,36 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# ==============================================================================
+# CACHE (versiones para ETag y otros datos compartidos)
+# ==============================================================================
+# Con varios workers/servidores conviene un cache compartido: define REDIS_URL.
+# Sin él usamos memoria local (cada proceso tiene su propio cache).
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Segundos que vive la versión de un modelo en el cache (ETag de los listados).
+# Acota cuánto puede durar un ETag viejo si el cache no es compartido.
+ETAG_VERSION_TTL = int(os.getenv('ETAG_VERSION_TTL', '300'))
+
+# Segundos que vive en cache el directorio de departamentos (GET /api/departamentos/directorio/).
+# Los cambios de habitantes/sensores lo invalidan al instante por condominio.
+DIRECTORIO_CACHE_TTL = int(os.getenv('DIRECTORIO_CACHE_TTL', '300'))
+
+
 # Internationalization
 LANGUAGE_CODE = 'es-cl' # Español Chile
 TIME_ZONE = 'America/Santiago' # Hora de Chile